@@ -0,0 +1,126 @@
+"""
+Streaming ZIP archives of stored media.
+
+``stream_zip`` yields the bytes of a ZIP built on the fly from storage
+objects, without temp files. The next few objects are fetched
+concurrently while the current one is written. Small objects are read
+whole by the prefetch threads; larger ones are streamed in chunks when
+their turn comes, so memory stays bounded by the window, not the archive.
+"""
+import posixpath
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Objects fetched ahead of the one being written
+ZIP_PREFETCH_WINDOW = 4
+# Objects up to this size are read whole by the prefetch threads
+ZIP_PREFETCH_MAX_BYTES = 8 * 1024 * 1024
+ZIP_CHUNK_SIZE = 256 * 1024
+
+
+class _ZipSink:
+    """Write-only, unseekable buffer that zipfile writes into and the stream drains."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def unique_arcname(arcname, used):
+    """``arcname``, or ``name (2).ext`` etc. if already in ``used``; records the result."""
+    candidate = arcname
+    root, ext = posixpath.splitext(arcname)
+    counter = 2
+    while candidate in used:
+        candidate = f"{root} ({counter}){ext}"
+        counter += 1
+    used.add(candidate)
+    return candidate
+
+
+def _prefetch(storage, object_name):
+    stored = storage.stat(object_name)
+    if stored is None:
+        return None, None
+    content = storage.get(object_name) if stored.size <= ZIP_PREFETCH_MAX_BYTES else None
+    return stored, content
+
+
+def stream_zip(storage, entries, window=ZIP_PREFETCH_WINDOW):
+    """
+    Yield a ZIP of ``entries``, an iterable of ``(arcname, object_name)``.
+    Entries whose object is missing or unreadable are listed in MISSING.txt
+    at the end of the archive instead of failing the download.
+    """
+    sink = _ZipSink()
+    missing = []
+    entries = iter(entries)
+    with ThreadPoolExecutor(max_workers=max(1, window)) as pool, \
+            zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        pending = deque()
+
+        def fill():
+            while len(pending) < window:
+                entry = next(entries, None)
+                if entry is None:
+                    return
+                arcname, object_name = entry
+                pending.append((arcname, object_name, pool.submit(_prefetch, storage, object_name)))
+
+        fill()
+        while pending:
+            arcname, object_name, future = pending.popleft()
+            fill()
+            try:
+                stored, content = future.result()
+            except Exception as e:
+                missing.append(f"{arcname}: {e}")
+                continue
+            if stored is None:
+                missing.append(f"{arcname}: not found")
+                continue
+
+            info = zipfile.ZipInfo(arcname, date_time=_zip_timestamp(stored.last_modified))
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = stored.size
+            try:
+                with archive.open(info, 'w', force_zip64=stored.size > zipfile.ZIP64_LIMIT) as dest:
+                    if content is not None:
+                        dest.write(content)
+                    else:
+                        for chunk in storage.iter_chunks(object_name, ZIP_CHUNK_SIZE):
+                            dest.write(chunk)
+                            yield sink.drain()
+            except Exception as e:
+                # The entry is already partly written; note it rather than
+                # abort an archive the client is halfway through receiving
+                missing.append(f"{arcname}: {e}")
+            yield sink.drain()
+
+        if missing:
+            archive.writestr('MISSING.txt', '\n'.join(missing) + '\n')
+    yield sink.drain()
+
+
+def _zip_timestamp(value):
+    if not isinstance(value, datetime) or value.year < 1980:
+        return (1980, 1, 1, 0, 0, 0)
+    return value.timetuple()[:6]
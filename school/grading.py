@@ -0,0 +1,485 @@
+"""
+Grade aggregation helpers shared by marks cards, reports and batch jobs.
+"""
+import csv
+import io
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ExamResult, Grade, Question, Student, Subject, Teacher, academic_term
+from .rankings import mark_slice_dirty
+
+try:
+    import openpyxl
+except ImportError:  # XLSX import is optional
+    openpyxl = None
+
+
+# ------------------- GRADING RULES -------------------
+# Lower bounds (percent, inclusive) of each letter grade, ascending.
+# Anything below the first bound is an F.
+GRADE_BOUNDARIES = np.array([50, 60, 70, 80, 90], dtype=np.float64)
+GRADE_LETTERS = np.array(['F', 'C', 'B', 'B+', 'A', 'A+'])
+PASS_PERCENTAGE = 35
+
+
+def _to_hundredths(value):
+    """Decimal(5,2) marks as an exact integer number of hundredths."""
+    return int(value * 100) if value else 0
+
+
+def grade_letters(percentages):
+    """Vectorized letter grade lookup for an array of percentages."""
+    return GRADE_LETTERS[np.searchsorted(GRADE_BOUNDARIES, percentages, side='right')]
+
+
+def percentages_from_hundredths(obtained, total):
+    """Element-wise obtained/total * 100 with 0 where total is 0."""
+    obtained = np.asarray(obtained, dtype=np.int64)
+    total = np.asarray(total, dtype=np.int64)
+    result = np.zeros(len(total), dtype=np.float64)
+    np.divide(obtained * 100, total, out=result, where=total > 0)
+    return result
+
+
+def _academic_year(has_class):
+    current_year = timezone.localtime().year
+    if has_class:
+        return f"{current_year}-{current_year + 1}"
+    return timezone.localtime().strftime('%Y-%Y')
+
+
+# ------------------- MARKS CARD DATA -------------------
+def load_marks_card_contexts(class_id=None, student_emails=None, exam_type=None):
+    """
+    Build marks card contexts (as consumed by pdf_templates.render_marks_card)
+    for a whole class or a list of students.
+
+    Runs exactly two queries regardless of class size: one for the roster
+    (with class and parent key) and one for every grade of every student on it.
+    Each context also carries ``student_email`` and ``parent_email``.
+    """
+    students = Student.objects.all()
+    grades = Grade.objects.all()
+    if class_id is not None:
+        students = students.filter(class_id=class_id)
+        grades = grades.filter(student__class_id=class_id)
+    if student_emails is not None:
+        students = students.filter(email__in=student_emails)
+        grades = grades.filter(student__in=student_emails)
+    if exam_type:
+        grades = grades.filter(exam_type=exam_type)
+
+    roster = students.values_list(
+        'email', 'fullname', 'student_id', 'date_of_birth', 'parent',
+        'class_id', 'class_id__class_name', 'class_id__sec',
+    ).order_by('fullname', 'email')
+
+    contexts = OrderedDict()
+    for email, fullname, student_id, dob, parent_email, cls, class_name, sec in roster:
+        contexts[email] = {
+            'student_email': email,
+            'parent_email': parent_email,
+            'student_name': fullname,
+            'roll_no': '',
+            'class_section': f"{class_name} {sec}" if cls else '',
+            'academic_year': _academic_year(cls is not None),
+            'date_of_birth': dob.strftime('%d/%m/%Y') if dob else '',
+            'admission_no': student_id or '',
+        }
+    if not contexts:
+        return []
+
+    rows = list(grades.values_list(
+        'student', 'subject__subject_name', 'marks_obtained', 'total_marks'
+    ).order_by('student', 'id'))
+
+    # Columnar view of every grade in the slice
+    index = {email: i for i, email in enumerate(contexts)}
+    rows = [row for row in rows if row[0] in index]
+    student_idx = np.fromiter((index[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+    obtained = np.fromiter((_to_hundredths(row[2]) for row in rows), dtype=np.int64, count=len(rows))
+    total = np.fromiter((_to_hundredths(row[3]) for row in rows), dtype=np.int64, count=len(rows))
+
+    percentages = percentages_from_hundredths(obtained, total)
+    letters = grade_letters(percentages)
+    passed = percentages >= PASS_PERCENTAGE
+
+    # Per-student totals, exact in hundredths
+    total_obtained = np.zeros(len(index), dtype=np.int64)
+    total_max = np.zeros(len(index), dtype=np.int64)
+    np.add.at(total_obtained, student_idx, obtained)
+    np.add.at(total_max, student_idx, total)
+    overall = percentages_from_hundredths(total_obtained, total_max)
+
+    for context in contexts.values():
+        context['subject_marks'] = []
+    for i, row in enumerate(rows):
+        contexts[row[0]]['subject_marks'].append({
+            'subject': row[1],
+            'max_marks': f"{total[i] / 100:.0f}",
+            'marks_obtained': f"{obtained[i] / 100:.0f}",
+            'percentage': f"{percentages[i]:.2f}%",
+            'grade': str(letters[i]),
+            'result': 'Pass' if passed[i] else 'Fail',
+        })
+
+    for i, context in enumerate(contexts.values()):
+        if total_max[i] > 0:
+            context['total_max_marks'] = f"{total_max[i] / 100:.0f}"
+            context['total_marks_obtained'] = f"{total_obtained[i] / 100:.0f}"
+            context['overall_percentage'] = f"{overall[i]:.2f}%"
+            context['overall_result'] = 'PASS' if overall[i] >= PASS_PERCENTAGE else 'FAIL'
+        else:
+            context['total_max_marks'] = "0"
+            context['total_marks_obtained'] = "0"
+            context['overall_percentage'] = "0.00%"
+            context['overall_result'] = 'N/A'
+
+    return list(contexts.values())
+
+
+# ------------------- GRADE ANALYTICS -------------------
+HISTOGRAM_BINS = np.linspace(0, 100, 11)
+ANALYTICS_QUANTILES = [0, 25, 50, 75, 90, 100]
+ANALYTICS_CACHE_TIMEOUT = 60 * 60  # keys carry the slice version, so this only bounds memory
+
+
+def _factorize(values):
+    """Map arbitrary (possibly None) keys to dense integer codes."""
+    values = list(values)
+    codes = {}
+    idx = np.fromiter((codes.setdefault(v, len(codes)) for v in values), dtype=np.int64, count=len(values))
+    return idx, list(codes)
+
+
+def group_statistics(percentages, groups, n_groups):
+    """
+    Score statistics for every group id in ``range(n_groups)``.
+
+    Counts, means, deviations, pass rates and histograms are computed with
+    bincount over the whole array; quantiles come from one lexsort and a
+    slice per group.
+    """
+    counts = np.bincount(groups, minlength=n_groups)
+    safe_counts = np.maximum(counts, 1)
+    means = np.bincount(groups, weights=percentages, minlength=n_groups) / safe_counts
+    deviations = percentages - means[groups]
+    stds = np.sqrt(np.bincount(groups, weights=deviations ** 2, minlength=n_groups) / safe_counts)
+    pass_rates = np.bincount(groups, weights=percentages >= PASS_PERCENTAGE, minlength=n_groups) / safe_counts * 100
+
+    n_bins = len(HISTOGRAM_BINS) - 1
+    bins = np.clip(np.searchsorted(HISTOGRAM_BINS, percentages, side='right') - 1, 0, n_bins - 1)
+    histograms = np.bincount(groups * n_bins + bins, minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+
+    ordered = percentages[np.lexsort((percentages, groups))]
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    quantiles = np.zeros((n_groups, len(ANALYTICS_QUANTILES)))
+    for g in range(n_groups):
+        if counts[g]:
+            quantiles[g] = np.percentile(ordered[bounds[g]:bounds[g + 1]], ANALYTICS_QUANTILES)
+
+    stats = []
+    for g in range(n_groups):
+        q = np.round(quantiles[g], 2)
+        stats.append({
+            'count': int(counts[g]),
+            'mean': round(float(means[g]), 2),
+            'median': float(q[2]),
+            'std': round(float(stds[g]), 2),
+            'min': float(q[0]),
+            'max': float(q[5]),
+            'p25': float(q[1]),
+            'p75': float(q[3]),
+            'p90': float(q[4]),
+            'pass_rate': round(float(pass_rates[g]), 2),
+            'histogram': histograms[g].tolist(),
+        })
+    return stats
+
+
+def grade_analytics(queryset):
+    """
+    Percentage statistics for a Grade queryset: overall and broken down by
+    class, subject and exam type. Reads the needed columns in a single query.
+    """
+    rows = list(queryset.order_by().values_list(
+        'student__class_id', 'student__class_id__class_name', 'student__class_id__sec',
+        'subject_id', 'subject__subject_name', 'exam_type',
+        'marks_obtained', 'total_marks',
+    ))
+    result = {
+        'count': len(rows),
+        'histogram_bins': HISTOGRAM_BINS.tolist(),
+        'overall': None,
+        'by_class': [],
+        'by_subject': [],
+        'by_exam_type': [],
+    }
+    if not rows:
+        return result
+
+    columns = list(zip(*rows))
+    obtained = np.fromiter((_to_hundredths(v) for v in columns[6]), dtype=np.int64, count=len(rows))
+    total = np.fromiter((_to_hundredths(v) for v in columns[7]), dtype=np.int64, count=len(rows))
+    percentages = percentages_from_hundredths(obtained, total)
+
+    result['overall'] = group_statistics(percentages, np.zeros(len(rows), dtype=np.int64), 1)[0]
+
+    class_idx, class_keys = _factorize(zip(columns[0], columns[1], columns[2]))
+    for (class_id, class_name, sec), stats in zip(class_keys, group_statistics(percentages, class_idx, len(class_keys))):
+        result['by_class'].append({'class_id': class_id, 'class_name': class_name, 'section': sec, **stats})
+
+    subject_idx, subject_keys = _factorize(zip(columns[3], columns[4]))
+    for (subject_id, subject_name), stats in zip(subject_keys, group_statistics(percentages, subject_idx, len(subject_keys))):
+        result['by_subject'].append({'subject_id': subject_id, 'subject_name': subject_name, **stats})
+
+    exam_idx, exam_keys = _factorize(columns[5])
+    for exam_type, stats in zip(exam_keys, group_statistics(percentages, exam_idx, len(exam_keys))):
+        result['by_exam_type'].append({'exam_type': exam_type, **stats})
+
+    return result
+
+
+# ------------------- BULK GRADE IMPORT -------------------
+GRADE_IMPORT_COLUMNS = ('student_id', 'subject_code', 'exam_type', 'marks_obtained', 'total_marks', 'exam_date', 'remarks')
+GRADE_IMPORT_BATCH_SIZE = 500
+MAX_MARKS = Decimal('999.99')  # Decimal(5,2)
+
+
+def _normalize_header(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def parse_grade_sheet(uploaded_file):
+    """
+    Read an uploaded CSV or XLSX sheet (marks, exam questions) into a list
+    of row dicts keyed by normalized column names. Raises ValueError for unreadable files.
+    """
+    name = (getattr(uploaded_file, 'name', '') or '').lower()
+    if name.endswith(('.xlsx', '.xlsm')):
+        if openpyxl is None:
+            raise ValueError('XLSX import requires openpyxl. Please upload a CSV file instead.')
+        try:
+            workbook = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+        except Exception as e:
+            raise ValueError(f'Could not read spreadsheet: {e}')
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [_normalize_header(h) for h in next(rows, ())]
+        parsed = [dict(zip(headers, row)) for row in rows if any(cell not in (None, '') for cell in row)]
+        workbook.close()
+        return parsed
+
+    try:
+        text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig')
+        reader = csv.DictReader(text)
+        reader.fieldnames = [_normalize_header(h) for h in (reader.fieldnames or [])]
+        return [row for row in reader if any((value or '').strip() for value in row.values() if isinstance(value, str))]
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ValueError(f'Could not read CSV file: {e}')
+
+
+def _cell(row, key, defaults):
+    value = row.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        value = defaults.get(key)
+    return value.strip() if isinstance(value, str) else value
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def import_grades(rows, defaults=None, first_row=2):
+    """
+    Validate and upsert marks rows (dicts with GRADE_IMPORT_COLUMNS).
+
+    Students and subjects are resolved with one IN query each, every row is
+    validated in memory, and all grades are written with a single upsert on
+    (student, subject, exam_type, exam_date). Nothing is written if any row
+    is invalid. Returns ``(imported_count, errors)``; ``errors`` is a list of
+    ``{'row': n, 'errors': [...]}``; rows are numbered from ``first_row``
+    (2 for a sheet with a header line).
+    """
+    defaults = {k: v for k, v in (defaults or {}).items() if v not in (None, '')}
+
+    student_ids = {str(_cell(row, 'student_id', defaults)) for row in rows if _cell(row, 'student_id', defaults)}
+    subject_codes = {str(_cell(row, 'subject_code', defaults)) for row in rows if _cell(row, 'subject_code', defaults)}
+    students = {
+        student_id: (email, class_name)
+        for student_id, email, class_name in Student.objects.filter(student_id__in=student_ids).values_list(
+            'student_id', 'email', 'class_id__class_name'
+        )
+    }
+    subjects = dict(Subject.objects.filter(subject_code__in=subject_codes).values_list('subject_code', 'id'))
+
+    teacher = defaults.get('teacher')
+    if teacher and not Teacher.objects.filter(email=teacher).exists():
+        return 0, [{'row': None, 'errors': [f'Teacher {teacher} not found']}]
+
+    valid_exam_types = {choice for choice, _ in Grade._meta.get_field('exam_type').choices}
+    grades, errors, seen = [], [], {}
+    dirty_slices = set()
+    for number, row in enumerate(rows, start=first_row):
+        row_errors = []
+        student_id = str(_cell(row, 'student_id', defaults) or '')
+        subject_code = str(_cell(row, 'subject_code', defaults) or '')
+        exam_type = _cell(row, 'exam_type', defaults)
+
+        student = students.get(student_id)
+        if student is None:
+            row_errors.append(f'Unknown student_id "{student_id}"')
+        subject_id = subjects.get(subject_code)
+        if subject_id is None:
+            row_errors.append(f'Unknown subject_code "{subject_code}"')
+        if exam_type not in valid_exam_types:
+            row_errors.append(f'exam_type must be one of {sorted(valid_exam_types)}')
+
+        try:
+            marks_obtained = Decimal(str(_cell(row, 'marks_obtained', defaults))).quantize(Decimal('0.01'))
+            total_marks = Decimal(str(_cell(row, 'total_marks', defaults))).quantize(Decimal('0.01'))
+        except (InvalidOperation, TypeError, ValueError):
+            row_errors.append('marks_obtained and total_marks must be numbers')
+        else:
+            if total_marks <= 0 or total_marks > MAX_MARKS:
+                row_errors.append(f'total_marks must be between 0 and {MAX_MARKS}')
+            if marks_obtained < 0 or marks_obtained > total_marks:
+                row_errors.append('marks_obtained must be between 0 and total_marks')
+
+        exam_date = None
+        try:
+            exam_date = _parse_date(_cell(row, 'exam_date', defaults))
+        except (TypeError, ValueError):
+            row_errors.append('exam_date is required (YYYY-MM-DD)')
+
+        if not row_errors:
+            key = (student[0], subject_id, exam_type, exam_date)
+            if key in seen:
+                row_errors.append(f'Duplicate of row {seen[key]}')
+            seen[key] = number
+
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+            continue
+
+        term = academic_term(exam_date)
+        grades.append(Grade(
+            student_id=student[0],
+            subject_id=subject_id,
+            teacher_id=teacher,
+            exam_type=exam_type,
+            marks_obtained=marks_obtained,
+            total_marks=total_marks,
+            exam_date=exam_date,
+            term=term,
+            remarks=_cell(row, 'remarks', defaults) or None,
+        ))
+        dirty_slices.add((student[1], exam_type, term))
+
+    if errors:
+        return 0, errors
+    if not grades:
+        return 0, [{'row': None, 'errors': ['No rows to import']}]
+
+    update_fields = ['marks_obtained', 'total_marks', 'term', 'remarks', 'updated_at']
+    if teacher:
+        update_fields.append('teacher')
+    with transaction.atomic():
+        Grade.objects.bulk_create(
+            grades,
+            batch_size=GRADE_IMPORT_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['student', 'subject', 'exam_type', 'exam_date'],
+            update_fields=update_fields,
+        )
+        # bulk_create bypasses the Grade signals, so refresh rankings here
+        for slice_key in dirty_slices:
+            mark_slice_dirty(*slice_key)
+    return len(grades), []
+
+
+# ------------------- EXAM GRADES -------------------
+EXAM_GRADE_TYPE = 'Quiz'
+EXAM_TOTAL_MARKS = Decimal('100.00')
+
+
+def apply_exam_result_delta(exam_id, student_id, correct=0, answered=0, total_questions=None):
+    """
+    Adjust a student's ExamResult by the given deltas with a single UPDATE
+    (F() expressions, so concurrent submissions do not lose counts). The row
+    is created on the student's first submission.
+    """
+    changes = {
+        'correct': F('correct') + correct,
+        'answered': F('answered') + answered,
+        'updated_at': timezone.now(),
+    }
+    if total_questions is not None:
+        changes['total_questions'] = total_questions
+    results = ExamResult.objects.filter(exam_id=exam_id, student_id=student_id)
+    if results.update(**changes):
+        return
+    if total_questions is None:
+        total_questions = Question.objects.filter(exam_id=exam_id).count()
+    try:
+        with transaction.atomic():
+            ExamResult.objects.create(
+                exam_id=exam_id, student_id=student_id,
+                correct=max(correct, 0), answered=max(answered, 0), total_questions=total_questions,
+            )
+    except IntegrityError:
+        # Another submission created the row first
+        results.update(**changes)
+
+
+def refresh_exam_question_counts(exam_id):
+    """
+    Point every ExamResult of an exam at its current number of questions.
+    Call it whenever questions are added to or removed from the exam.
+    """
+    total_questions = Question.objects.filter(exam_id=exam_id).count()
+    return ExamResult.objects.filter(exam_id=exam_id).exclude(total_questions=total_questions).update(
+        total_questions=total_questions, updated_at=timezone.now(),
+    )
+
+
+def record_exam_grade(exam, student):
+    """
+    Write (or update) the Grade for a student's MCQ exam in-process, scored
+    from the student's ExamResult.
+
+    Call it inside the transaction that saved the answers so the answers and
+    the grade commit or roll back together. Returns the Grade, or None when
+    there is nothing to score.
+    """
+    if student is None:
+        return None
+    result = ExamResult.objects.filter(exam=exam, student=student).values_list('correct', 'total_questions').first()
+    if result is None or not result[1]:
+        return None
+    correct_answers, total_questions = result
+    marks_obtained = (Decimal(correct_answers) * EXAM_TOTAL_MARKS / total_questions).quantize(Decimal('0.01'))
+
+    grade, _ = Grade.objects.update_or_create(
+        student=student,
+        subject_id=exam.sub_id,
+        exam_type=EXAM_GRADE_TYPE,
+        exam_date=timezone.localdate(),
+        defaults={
+            'teacher_id': exam.sub_teacher_id,
+            'marks_obtained': marks_obtained,
+            'total_marks': EXAM_TOTAL_MARKS,
+            'remarks': f'MCQ Exam Results - {correct_answers}/{total_questions} correct',
+        },
+    )
+    return grade
@@ -0,0 +1,284 @@
+"""
+Batch issuing of ID cards.
+
+Card data is collected in the parent process with one query. PDFs are
+rendered in a process pool (rendering is CPU bound), uploaded to MinIO
+from a bounded thread pool, and the IDCard URLs are saved together at the
+end. Progress is reported per card as it finishes.
+
+Every card carries a fingerprint of what is printed on it, so cards whose
+inputs have not changed are neither re-rendered nor re-uploaded.
+"""
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from io import BytesIO
+
+import requests
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from reportlab.lib.utils import ImageReader
+
+from .models import IDCard, User
+from .images import fetch_profile_picture
+from .photo_cache import normalize_photo_url
+from .pdf_templates import ID_CARD_TEMPLATE_VERSION, id_card_data, render_id_card
+
+
+# Longest side of a profile photo on a printed sheet (~300 dpi on a full-size card)
+PRINT_PHOTO_PX = 360
+# Stored picture variant used on cards; larger than any card photo slot
+CARD_PHOTO_VARIANT_PX = 512
+
+# Card fields that end up on the printed card
+FINGERPRINT_FIELDS = ('name', 'position', 'phone', 'id_no', 'dob', 'barcode_value')
+
+# Reverse one-to-one profiles and the relations id_card_data reads
+ID_CARD_USER_RELATIONS = ('student__class_id', 'teacher__department', 'principal', 'management', 'admin', 'parent')
+
+
+def id_card_users(role=None, class_id=None, emails=None):
+    """Users to issue cards for, with every profile id_card_data needs preloaded."""
+    users = User.objects.select_related(*ID_CARD_USER_RELATIONS).order_by('email')
+    if role:
+        users = users.filter(role=role)
+    if class_id:
+        users = users.filter(student__class_id=class_id)
+    if emails:
+        users = users.filter(email__in=emails)
+    return users
+
+
+def id_card_object_name(email):
+    identifier = email.replace('@', '_').replace('.', '_') if email else 'unknown'
+    return f"id_cards/{identifier}.pdf"
+
+
+def photo_version(url):
+    """
+    Cheap version token for a profile picture: the ETag (or Last-Modified and
+    size) from a HEAD request. Empty when there is no usable picture.
+    """
+    url = normalize_photo_url(url)
+    if url is None:
+        return ''
+    try:
+        response = requests.head(url, timeout=10, allow_redirects=True)
+    except requests.RequestException:
+        return ''
+    if response.status_code != 200:
+        return ''
+    headers = response.headers
+    return headers.get('ETag') or f"{headers.get('Last-Modified', '')}|{headers.get('Content-Length', '')}"
+
+
+def id_card_fingerprint(data, photo_token=None):
+    """SHA-256 over the card fields, the photo version and the template version."""
+    if photo_token is None:
+        photo_token = photo_version(data.get('photo_url'))
+    payload = [ID_CARD_TEMPLATE_VERSION, photo_token] + [str(data.get(field) or '') for field in FINGERPRINT_FIELDS]
+    return hashlib.sha256(json.dumps(payload).encode('utf-8')).hexdigest()
+
+
+def fetch_profile_photo(url):
+    """
+    Profile picture bytes through the shared photo cache (the 512 px variant
+    when stored), or None if unavailable.
+    """
+    return fetch_profile_picture(url, CARD_PHOTO_VARIANT_PX)
+
+
+def load_card_photo(url):
+    """Profile picture for a card as an ImageReader, or None if unavailable or unreadable."""
+    content = fetch_profile_photo(url)
+    if not content:
+        return None
+    try:
+        return ImageReader(BytesIO(content))
+    except Exception:
+        return None
+
+
+def photo_missing(data, photo):
+    """True when the card should show a profile picture but ``photo`` could not be loaded."""
+    return photo is None and normalize_photo_url(data.get('photo_url')) is not None
+
+
+def render_card_pdf(data, known_fingerprint='', force=False):
+    """
+    Fingerprint and render one card; runs in a worker process. Returns
+    ``(fingerprint, pdf_bytes)``, with ``pdf_bytes`` None when the card is
+    unchanged since ``known_fingerprint`` and ``force`` is not set. The
+    fingerprint is empty when the picture could not be drawn, so the card
+    is rendered again next time. Render errors propagate.
+    """
+    fingerprint = id_card_fingerprint(data)
+    if not force and known_fingerprint and fingerprint == known_fingerprint:
+        return fingerprint, None
+    photo = load_card_photo(data.get('photo_url'))
+    if photo_missing(data, photo):
+        fingerprint = ''
+    return fingerprint, render_id_card(data, photo).getvalue()
+
+
+def upload_id_card(storage, email, pdf_bytes):
+    """Upload one rendered card and return its public URL."""
+    return storage.put(id_card_object_name(email), BytesIO(pdf_bytes), len(pdf_bytes), content_type='application/pdf')
+
+
+def save_id_card_urls(issued):
+    """
+    Record {email: (url, fingerprint)} on IDCard rows: one bulk_update plus
+    one bulk_create.
+    """
+    if not issued:
+        return 0
+    now = timezone.now()
+    with transaction.atomic():
+        existing = list(IDCard.objects.filter(user_id__in=list(issued)))
+        for id_card in existing:
+            id_card.id_card_url, id_card.fingerprint = issued[id_card.user_id]
+            id_card.updated_at = now
+        IDCard.objects.bulk_update(existing, ['id_card_url', 'fingerprint', 'updated_at'], batch_size=500)
+        known = {id_card.user_id for id_card in existing}
+        IDCard.objects.bulk_create(
+            [IDCard(user_id=email, id_card_url=url, fingerprint=fingerprint)
+             for email, (url, fingerprint) in issued.items() if email not in known],
+            batch_size=500,
+        )
+    return len(issued)
+
+
+def issue_id_cards(users, storage, workers=None, upload_workers=8, force=False):
+    """
+    Render and upload cards for ``users``, yielding a progress dict as each
+    card finishes and a final summary once the URLs are saved. Cards whose
+    fingerprint matches the stored one are skipped unless ``force`` is set.
+    At most a few cards per worker are in flight, so memory stays bounded.
+    """
+    users = list(users)
+    stored = {
+        user_id: fingerprint
+        for user_id, fingerprint, url in IDCard.objects.filter(
+            user_id__in=[user.email for user in users]
+        ).values_list('user_id', 'fingerprint', 'id_card_url')
+        if url
+    }
+    cards = [(user.email, id_card_data(user)) for user in users]
+    total = len(cards)
+    workers = workers or os.cpu_count() or 1
+    window = max(workers, upload_workers) * 2
+    pending = iter(cards)
+    issued, failed, unchanged, done = {}, 0, 0, 0
+
+    # Worker processes must not inherit open database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as render_pool, \
+            ThreadPoolExecutor(max_workers=upload_workers) as upload_pool:
+        in_flight = {}
+
+        def fill():
+            for email, data in pending:
+                future = render_pool.submit(render_card_pdf, data, stored.get(email, ''), force)
+                in_flight[future] = ('render', email, None)
+                if len(in_flight) >= window:
+                    return
+
+        fill()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, email, fingerprint = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed += 1
+                    done += 1
+                    yield {'email': email, 'status': 'failed', 'stage': stage, 'error': str(e),
+                           'done': done, 'total': total}
+                    continue
+                if stage == 'render':
+                    fingerprint, pdf_bytes = result
+                    if pdf_bytes is None:
+                        unchanged += 1
+                        done += 1
+                        yield {'email': email, 'status': 'unchanged', 'done': done, 'total': total}
+                        continue
+                    future = upload_pool.submit(upload_id_card, storage, email, pdf_bytes)
+                    in_flight[future] = ('upload', email, fingerprint)
+                else:
+                    issued[email] = (result, fingerprint)
+                    done += 1
+                    yield {'email': email, 'status': 'issued', 'url': result, 'done': done, 'total': total}
+            fill()
+
+    saved = save_id_card_urls(issued)
+    yield {'status': 'complete', 'saved': saved, 'unchanged': unchanged, 'failed': failed, 'total': total}
+
+
+def fetch_print_photo(url):
+    """
+    Download a profile picture and downscale it to print resolution as a
+    JPEG; returns an ImageReader or None if unavailable.
+    """
+    content = fetch_profile_photo(url)
+    if not content:
+        return None
+    try:
+        with Image.open(BytesIO(content)) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            image.thumbnail((PRINT_PHOTO_PX, PRINT_PHOTO_PX))
+            buffer = BytesIO()
+            image.save(buffer, 'JPEG', quality=85)
+    except Exception:
+        # Unreadable pictures are left off the card
+        return None
+    buffer.seek(0)
+    return ImageReader(buffer)
+
+
+def sheet_cards(users, fetch_workers=8, window=None):
+    """
+    Yield ``(data, photo)`` for each user, in order, for sheet imposition.
+    Photos are downloaded concurrently for a bounded look-ahead window of
+    cards (``window``, default twice ``fetch_workers``); cards sharing a
+    photo within the window share one download, and a photo is released
+    once its last card in the window has been handed out, so memory does
+    not grow with the number of cards.
+    """
+    window = window or fetch_workers * 2
+    users = iter(users)
+    pending = deque()
+    # photo URL -> [future, cards in the window still to be handed out]
+    photos = {}
+    with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
+
+        def fill():
+            while len(pending) < window:
+                user = next(users, None)
+                if user is None:
+                    return
+                data = id_card_data(user)
+                url = data.get('photo_url')
+                if url:
+                    entry = photos.get(url)
+                    if entry is None:
+                        entry = photos[url] = [pool.submit(fetch_print_photo, url), 0]
+                    entry[1] += 1
+                pending.append((data, url))
+
+        fill()
+        while pending:
+            data, url = pending.popleft()
+            photo = None
+            if url:
+                entry = photos[url]
+                photo = entry[0].result()
+                entry[1] -= 1
+                if not entry[1]:
+                    del photos[url]
+            fill()
+            yield data, photo
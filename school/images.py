@@ -0,0 +1,205 @@
+"""
+Profile picture processing.
+
+An uploaded picture is decoded once, turned upright from its EXIF
+orientation and stored as the original plus downscaled variants next to
+it, in WebP and JPEG. The original's name carries a digest of its bytes,
+which marks it as having variants:
+
+    images/<identifier>/profile-<digest>.jpg
+    images/<identifier>/profile-<digest>_64.webp, ..._64.jpg, ... _512.jpg
+
+Variant URLs are derived from the original's URL, so no extra columns are
+needed; clients fetch the smallest variant they render. Pictures stored
+before the pipeline existed, files Pillow cannot read and foreign URLs
+have no digest and so advertise no variants.
+"""
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .photo_cache import fetch_photo, normalize_photo_url
+
+
+# Longest side of each variant, in pixels
+PROFILE_VARIANT_SIZES = (64, 256, 512)
+# (extension, Pillow format, content type, save options)
+PROFILE_VARIANT_FORMATS = (
+    ('webp', 'WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', 'image/jpeg', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+ORIGINAL_JPEG_QUALITY = 90
+EXIF_ORIENTATION = 0x0112
+# Name of an original stored with its variants: <root>-<digest>.jpg
+PROCESSED_NAME = re.compile(r'^.+/profile-[0-9a-f]{16}\.jpg$')
+
+
+def processed_object_name(object_name, original):
+    """Name for the processed ``original`` bytes of the picture at ``object_name``."""
+    root, _ = os.path.splitext(object_name)
+    return f"{root}-{hashlib.sha256(original).hexdigest()[:16]}.jpg"
+
+
+def variant_object_name(object_name, size, ext):
+    root, _ = os.path.splitext(object_name)
+    return f"{root}_{size}.{ext}"
+
+
+def variant_object_names(object_name):
+    return [
+        variant_object_name(object_name, size, ext)
+        for size in PROFILE_VARIANT_SIZES for ext, _, _, _ in PROFILE_VARIANT_FORMATS
+    ]
+
+
+def _bucket_object_name(url):
+    """Object name for a URL in our bucket (with or without scheme), else None."""
+    url = normalize_photo_url(url)
+    if url is None:
+        return None
+    base = settings.BASE_BUCKET_URL.split('://', 1)[-1]
+    path = url.split('://', 1)[-1].split('?', 1)[0]
+    if not path.startswith(base) or len(path) <= len(base):
+        return None
+    return path[len(base):]
+
+
+def profile_picture_variants(url):
+    """
+    ``{'64': {'webp': url, 'jpg': url}, ...}`` for a picture stored by the
+    upload pipeline, or None for anything else (placeholders, foreign URLs,
+    pictures without variants).
+    """
+    object_name = _bucket_object_name(url)
+    if object_name is None or not PROCESSED_NAME.match(object_name):
+        return None
+    root = normalize_photo_url(url).split('?', 1)[0][:-len('.jpg')]
+    return {
+        str(size): {ext: f"{root}_{size}.{ext}" for ext, _, _, _ in PROFILE_VARIANT_FORMATS}
+        for size in PROFILE_VARIANT_SIZES
+    }
+
+
+def fetch_profile_picture(url, size=None):
+    """
+    Picture bytes through the photo cache: the JPEG variant of ``size`` when
+    one exists, otherwise the original. None if unavailable.
+    """
+    variants = profile_picture_variants(url) if size else None
+    if variants and str(size) in variants:
+        content = fetch_photo(variants[str(size)]['jpg'])
+        if content:
+            return content
+    return fetch_photo(url)
+
+
+def _to_rgb(image):
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, pil_format, options):
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def process_profile_picture(content):
+    """
+    Upright JPEG original and its variants from uploaded bytes:
+    ``(original_bytes, [(size, ext, content_type, bytes), ...])``. Upright
+    JPEG uploads are kept byte for byte. Raises ValueError for non-images.
+    """
+    try:
+        image = Image.open(BytesIO(content))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f'Not a readable image: {e}')
+
+    upright = image.format == 'JPEG' and image.getexif().get(EXIF_ORIENTATION, 1) == 1
+    rgb = _to_rgb(ImageOps.exif_transpose(image))
+    original = content if upright else _encode(rgb, 'JPEG', {'quality': ORIGINAL_JPEG_QUALITY})
+
+    # Each variant is downscaled from the next larger one, which is cheaper
+    # than resampling the full-size picture every time
+    variants = []
+    current = rgb
+    for size in sorted(PROFILE_VARIANT_SIZES, reverse=True):
+        current = current.copy()
+        current.thumbnail((size, size), Image.LANCZOS)
+        for ext, pil_format, content_type, options in PROFILE_VARIANT_FORMATS:
+            variants.append((size, ext, content_type, _encode(current, pil_format, options)))
+    return original, variants
+
+
+def store_profile_picture(storage, object_name, content, content_type=None, upload_workers=4, keep_previous=False):
+    """
+    Store an uploaded picture and its variants; returns the original's URL.
+    Readable pictures are stored under processed_object_name(); files Pillow
+    cannot read are stored at ``object_name`` as uploaded, without variants.
+    Unless ``keep_previous`` is set, earlier pictures at ``object_name`` and
+    their variants are then removed.
+    """
+    try:
+        original, variants = process_profile_picture(content)
+    except ValueError:
+        url = storage.put(object_name, BytesIO(content), len(content),
+                          content_type=content_type or 'application/octet-stream')
+        if not keep_previous:
+            delete_previous_profile_pictures(storage, object_name, url)
+        return url
+
+    stored_name = processed_object_name(object_name, original)
+    uploads = [(stored_name, 'image/jpeg', original)] + [
+        (variant_object_name(stored_name, size, ext), variant_type, data)
+        for size, ext, variant_type, data in variants
+    ]
+
+    def put(upload):
+        name, upload_type, data = upload
+        return storage.put(name, BytesIO(data), len(data), content_type=upload_type)
+
+    with ThreadPoolExecutor(max_workers=upload_workers) as pool:
+        list(pool.map(put, uploads))
+    url = storage.url_for(stored_name)
+    if not keep_previous:
+        delete_previous_profile_pictures(storage, object_name, url)
+    return url
+
+
+def upload_object_name(object_name):
+    """The images/<id>/profile.jpg name a stored picture was uploaded under."""
+    if PROCESSED_NAME.match(object_name):
+        return object_name.rsplit('-', 1)[0] + '.jpg'
+    return object_name
+
+
+def delete_previous_profile_pictures(storage, object_name, current_url):
+    """
+    Remove every picture stored for ``object_name`` (and its variants)
+    other than the one at ``current_url``. Staged direct uploads are kept.
+    """
+    root, _ = os.path.splitext(object_name)
+    current = storage.object_name_for_url(current_url)
+    keep = {current}
+    if current and PROCESSED_NAME.match(current):
+        keep.update(variant_object_names(current))
+    try:
+        stale = [
+            obj.name for obj in storage.list(root)
+            if obj.name not in keep and (obj.name == object_name or obj.name.startswith((f"{root}-", f"{root}_")))
+        ]
+        if stale:
+            storage.remove_many(stale)
+    except Exception:
+        # Leftovers are collected by gc_media
+        pass
@@ -0,0 +1,255 @@
+"""
+The marks card and ID card renderers as they were before school.pdf_templates,
+kept only so benchmark_pdf_templates can measure against them. The drawing
+code is unchanged apart from taking its inputs as arguments instead of
+loading them from the database and MinIO.
+"""
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.colors import Color
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+try:
+    import barcode
+    from barcode.writer import ImageWriter
+except ImportError:
+    barcode = None
+    ImageWriter = None
+
+
+def baseline_marks_card(context):
+    """Build a marks card PDF the way send_marks_card did; returns the bytes."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
+    elements = []
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle', parent=styles['Heading1'], fontSize=20, spaceAfter=5,
+        alignment=TA_CENTER, textColor=colors.HexColor('#2C5AA0')
+    )
+    subtitle_style = ParagraphStyle(
+        'CustomSubtitle', parent=styles['Heading2'], fontSize=16, spaceAfter=20,
+        alignment=TA_CENTER, textColor=colors.HexColor('#2C5AA0')
+    )
+    school_style = ParagraphStyle(
+        'SchoolInfo', parent=styles['Normal'], fontSize=10, spaceAfter=5,
+        alignment=TA_CENTER, textColor=colors.HexColor('#555555')
+    )
+    normal_style = ParagraphStyle('CustomNormal', parent=styles['Normal'], fontSize=10, spaceAfter=5)
+
+    elements.append(Spacer(1, 5))
+    elements.append(Paragraph("GREENWOOD PUBLIC SCHOOL", title_style))
+    elements.append(Paragraph("123, MG Road, Bengaluru - 560001 | Ph: (080) 2345 6789", school_style))
+    elements.append(Paragraph("ANNUAL EXAMINATION MARKS CARD", subtitle_style))
+    elements.append(Spacer(1, 20))
+
+    student_data = [
+        ['Student Name:', context['student_name'], 'Roll No:', context['roll_no'] or 'N/A'],
+        ['Class & Section:', context['class_section'] or 'N/A', 'Academic Year:', context['academic_year']],
+        ['Date of Birth:', context['date_of_birth'] or 'N/A', 'Admission No:', context['admission_no'] or 'N/A']
+    ]
+    student_table = Table(student_data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 2*inch])
+    student_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FFFFFF')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 0.3, colors.HexColor('#CCCCCC')),
+        ('BOX', (0, 0), (-1, -1), 0.3, colors.HexColor('#CCCCCC')),
+        ('INNERGRID', (0, 0), (-1, -1), 0.3, colors.HexColor('#CCCCCC')),
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F0F5FF')),
+        ('BACKGROUND', (2, 0), (2, -1), colors.HexColor('#F0F5FF')),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#2C5AA0')),
+        ('TEXTCOLOR', (2, 0), (2, -1), colors.HexColor('#2C5AA0')),
+    ]))
+    elements.append(student_table)
+    elements.append(Spacer(1, 20))
+
+    marks_header = Paragraph("Academic Performance", subtitle_style)
+    marks_header.style.alignment = TA_LEFT
+    marks_header.style.fontSize = 13
+    marks_header.style.textColor = colors.HexColor('#2C5AA0')
+    elements.append(marks_header)
+
+    marks_data = [['Subject', 'Max Marks', 'Marks Obtained', 'Percentage', 'Grade', 'Result']]
+    for subject in context['subject_marks']:
+        marks_data.append([
+            subject['subject'], subject['max_marks'], subject['marks_obtained'],
+            subject['percentage'], subject['grade'], subject['result']
+        ])
+    marks_data.append([
+        'Total', context['total_max_marks'], context['total_marks_obtained'],
+        context['overall_percentage'], '', context['overall_result']
+    ])
+    marks_table = Table(marks_data, colWidths=[2*inch, 1*inch, 1*inch, 1*inch, 0.7*inch, 0.8*inch])
+    marks_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2C5AA0')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#FFFFFF')),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#FFFFFF')),
+        ('GRID', (0, 0), (-1, -1), 0.3, colors.HexColor('#CCCCCC')),
+        ('BOX', (0, 0), (-1, -1), 0.3, colors.HexColor('#CCCCCC')),
+        ('INNERGRID', (0, 0), (-1, -1), 0.3, colors.HexColor('#CCCCCC')),
+        ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
+        ('FONTNAME', (-1, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (0, -1), (0, -1), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#F0F5FF')),
+        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#2C5AA0')),
+    ]))
+    elements.append(marks_table)
+    elements.append(Spacer(1, 25))
+
+    summary_para = Paragraph(f"Overall Percentage: {context['overall_percentage']}", normal_style)
+    summary_para.style.textColor = colors.HexColor('#2C5AA0')
+    summary_para.style.fontSize = 11
+    elements.append(summary_para)
+    elements.append(Spacer(1, 10))
+
+    footer_table = Table([['Class Teacher', 'Principal'], ['', '']], colWidths=[3*inch, 3*inch])
+    footer_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, 0), 0.3, colors.HexColor('#CCCCCC')),
+        ('BOX', (0, 0), (-1, 0), 0.3, colors.HexColor('#CCCCCC')),
+        ('LINEBELOW', (0, 0), (-1, 0), 0.3, colors.HexColor('#CCCCCC')),
+        ('LINEAFTER', (0, 0), (0, 0), 0.3, colors.HexColor('#CCCCCC')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#666666')),
+    ]))
+    elements.append(footer_table)
+    elements.append(Spacer(1, 20))
+
+    result_color = '#32A852' if context['overall_result'] == 'PASS' else '#C70039'
+    result_text = f"Final Result: <font color='{result_color}'><b>{context['overall_result']}</b></font>"
+    result_para = Paragraph(result_text, subtitle_style)
+    result_para.style.alignment = TA_CENTER
+    result_para.style.fontSize = 16
+    result_para.style.textColor = colors.HexColor('#2C5AA0')
+    elements.append(result_para)
+
+    doc.build(elements)
+    pdf_content = buffer.getvalue()
+    buffer.close()
+    return pdf_content
+
+
+def baseline_id_card(data, photo_bytes=None):
+    """Draw an ID card the way IDCardViewSet did; returns a rewound BytesIO."""
+    width_points = 330 * 0.75
+    height_points = 450 * 0.75
+    pdf_buffer = BytesIO()
+    c = canvas.Canvas(pdf_buffer, pagesize=(width_points, height_points))
+
+    background_color = Color(0.913, 0.929, 0.945)  # #e9edf1
+    header_color = Color(0.027, 0.153, 0.235)     # #07273C
+    text_color = Color(0, 0, 0)                    # #000000
+    gray_text = Color(0.467, 0.467, 0.467)        # #777777
+
+    c.setFillColor(background_color)
+    c.rect(0, 0, width_points, height_points, fill=1)
+
+    header_height = 120 * 0.75
+    c.setFillColor(header_color)
+    c.rect(0, height_points - header_height, width_points, header_height, fill=1)
+
+    c.setFillColor(Color(1, 1, 1))
+    c.setFont("Helvetica-Bold", 15)
+    c.drawCentredString(width_points/2, height_points - 35*0.75, 'SCHOOL NAME')
+
+    profile_size = 110 * 0.75
+    profile_x = width_points // 2 - profile_size // 2
+    profile_y = height_points - 60*0.75 - profile_size
+
+    border_width = 5 * 0.75
+    c.setFillColor(Color(1, 1, 1))
+    c.rect(profile_x - border_width, profile_y - border_width,
+           profile_size + 2*border_width, profile_size + 2*border_width, fill=1)
+
+    if photo_bytes:
+        try:
+            c.drawImage(ImageReader(BytesIO(photo_bytes)), profile_x, profile_y, profile_size, profile_size)
+        except Exception:
+            pass
+
+    name_y = profile_y - 40*0.75
+    c.setFillColor(text_color)
+    c.setFont("Helvetica-Bold", 15)
+
+    user_name = data['name']
+    max_name_width = width_points - 40
+    name_lines = []
+    if c.stringWidth(user_name, "Helvetica-Bold", 15) > max_name_width:
+        current_line = ""
+        for word in user_name.split(' '):
+            test_line = current_line + " " + word if current_line else word
+            if c.stringWidth(test_line, "Helvetica-Bold", 15) <= max_name_width:
+                current_line = test_line
+            else:
+                if current_line:
+                    name_lines.append(current_line)
+                    current_line = word
+                else:
+                    name_lines.append(word)
+        if current_line:
+            name_lines.append(current_line)
+    else:
+        name_lines = [user_name]
+
+    line_height = 18
+    total_name_height = len(name_lines) * line_height
+    current_name_y = name_y + (total_name_height - line_height) / 2
+    for i, line in enumerate(name_lines):
+        c.drawCentredString(width_points/2, current_name_y - i * line_height, line)
+
+    position_y = name_y - (total_name_height - line_height) / 2 - 15*0.75
+    c.setFillColor(gray_text)
+    c.setFont("Helvetica", 12)
+    c.drawCentredString(width_points/2, position_y, data['position'])
+
+    info_padding = 35 * 0.75
+    c.setFont("Helvetica-Bold", 10)
+    c.setFillColor(text_color)
+    current_y = position_y - 18*0.75
+    for label, value in (('DOB:', data['dob']), ('Phone:', data['phone']), ('ID No:', data['id_no'])):
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(info_padding, current_y, label)
+        c.setFont("Helvetica", 10)
+        c.drawRightString(width_points - info_padding, current_y, value)
+        current_y -= 25*0.75
+
+    # Raster Code128 barcode via python-barcode, as before
+    try:
+        if barcode is not None and ImageWriter is not None:
+            code128 = barcode.get_barcode_class('code128')
+            barcode_instance = code128(data['barcode_value'], writer=ImageWriter())
+            barcode_buffer = BytesIO()
+            barcode_instance.write(barcode_buffer, options={'write_text': False})
+            barcode_buffer.seek(0)
+            barcode_width = 160 * 0.75
+            c.drawImage(ImageReader(barcode_buffer), width_points // 2 - barcode_width // 2,
+                        current_y - 45*0.75, barcode_width, 45 * 0.75)
+    except Exception:
+        pass
+
+    c.setFillColor(header_color)
+    c.rect(0, 0, width_points, 45 * 0.75, fill=1)
+
+    c.save()
+    pdf_buffer.seek(0)
+    return pdf_buffer
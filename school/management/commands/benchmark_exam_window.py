@@ -0,0 +1,218 @@
+import json
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from school.models import Class, Exam, FormerMember, Question, Student, Subject, Teacher, User
+from school.views import get_all_mcq_answers, submit_multiple_mcq_answers
+
+
+DEFAULT_BUDGET = Path(__file__).with_name('exam_window_budget.json')
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate an exam window: seed N students and an M-question exam, drive concurrent "
+        "submit_multiple_mcq PATCHes and get_all_mcq reads, and report throughput, latency "
+        "percentiles and queries per request. Runs against the configured database "
+        "(SQLite or PostgreSQL); seeded rows are removed afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=100, help='Students sitting the exam')
+        parser.add_argument('--questions', type=int, default=50, help='Questions in the exam')
+        parser.add_argument('--chunk', type=int, default=10, help='Answers sent per PATCH request')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client threads')
+        parser.add_argument('--reads', type=int, default=50, help='Paginated get_all_mcq requests')
+        parser.add_argument('--page-size', type=int, default=100, help='page_size for get_all_mcq reads')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for student answers')
+        parser.add_argument('--budget', default=str(DEFAULT_BUDGET),
+                            help='JSON budget file; exceeding any limit fails the command')
+        parser.add_argument('--no-budget', action='store_true', help='Report only, do not check a budget')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded exam, students and answers')
+
+    # ------------------- seeding -------------------
+    def _seed(self, tag, students, questions):
+        teacher_email = f'{tag}.teacher@bench.local'
+        student_emails = [f'{tag}.s{i:05d}@bench.local' for i in range(students)]
+        password = make_password(None)
+
+        # bulk_create skips the User signals, so role rows are created here
+        User.objects.bulk_create(
+            [User(email=teacher_email, role='Teacher', password=password)]
+            + [User(email=email, role='Student', password=password) for email in student_emails]
+        )
+        teacher = Teacher.objects.create(email_id=teacher_email, fullname='Bench Teacher')
+        klass = Class.objects.create(class_name=f'Bench-{tag}', sec='A')
+        subject = Subject.objects.create(subject_name='Bench Subject', subject_code=f'B-{tag}')
+        Student.objects.bulk_create([
+            Student(email_id=email, fullname=f'Bench Student {i}', class_id=klass)
+            for i, email in enumerate(student_emails)
+        ])
+        exam = Exam.objects.create(title=f'Bench exam {tag}', class_id=klass, sub=subject, sub_teacher=teacher)
+        Question.objects.bulk_create([
+            Question(exam=exam, question=f'Question {i}', option_1='A', option_2='B',
+                     option_3='C', option_4='D', correct_option=(i % 4) + 1)
+            for i in range(questions)
+        ])
+        question_ids = list(exam.questions.values_list('id', flat=True))
+        return exam, klass, subject, student_emails + [teacher_email], question_ids
+
+    def _cleanup(self, klass, subject, emails):
+        # Deleting the class removes the exam, questions, responses and results
+        klass.delete()
+        subject.delete()
+        for start in range(0, len(emails), 500):
+            User.objects.filter(email__in=emails[start:start + 500]).delete()
+        FormerMember.objects.filter(email__in=emails).delete()
+
+    # ------------------- load -------------------
+    def _timed(self, view, request):
+        """Run one request on this thread's connection; returns (ms, queries, ok)."""
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = view(request)
+            elapsed = (time.perf_counter() - start) * 1000
+        return elapsed, len(queries.captured_queries), response.status_code < 400
+
+    def _run(self, label, jobs, concurrency):
+        """Run (view, request) jobs on worker threads and collect their timings."""
+        pending = queue.SimpleQueue()
+        for index, job in enumerate(jobs):
+            pending.put((index, job))
+        results = [None] * len(jobs)
+
+        def worker():
+            # Each thread uses (and finally closes) its own database connection
+            try:
+                while True:
+                    try:
+                        index, job = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        results[index] = self._timed(*job)
+                    except Exception:
+                        results[index] = (0.0, 0, False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+        latencies = np.array([r[0] for r in results])
+        queries = np.array([r[1] for r in results])
+        errors = sum(1 for r in results if not r[2])
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(results) else (0, 0, 0)
+        stats = {
+            'requests': len(results),
+            'errors': errors,
+            'throughput': len(results) / wall if wall else 0.0,
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+            'queries_per_request': float(queries.mean()) if len(results) else 0.0,
+            'max_queries': int(queries.max()) if len(results) else 0,
+        }
+        self.stdout.write(
+            f"  {label:<8} {stats['requests']:6d} req  {stats['errors']:4d} err  "
+            f"{stats['throughput']:8.1f} req/s  p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  p99 {p99:7.1f} ms  "
+            f"{stats['queries_per_request']:5.1f} queries/req (max {stats['max_queries']})"
+        )
+        return stats
+
+    def _check_budget(self, path, results):
+        try:
+            budget = json.loads(Path(path).read_text())
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read budget file {path}: {e}')
+
+        # "min_<stat>" is a lower bound, any other key an upper bound on that stat
+        breaches = []
+        for scenario, limits in budget.items():
+            stats = results.get(scenario)
+            if stats is None:
+                continue
+            for key, limit in limits.items():
+                lower = key.startswith('min_')
+                stat = key[4:] if lower else key
+                if stat not in stats:
+                    raise CommandError(f'Unknown budget key {scenario}.{key}')
+                value = stats[stat]
+                if (value < limit) if lower else (value > limit):
+                    bound = '>=' if lower else '<='
+                    breaches.append(f'{scenario}.{stat} = {value:.1f} (budget {bound} {limit})')
+        if breaches:
+            raise CommandError('Exam window budget exceeded:\n  ' + '\n  '.join(breaches))
+        self.stdout.write(self.style.SUCCESS(f'Within budget ({path})'))
+
+    def handle(self, *args, **options):
+        students, question_count = options['students'], options['questions']
+        chunk = max(1, options['chunk'])
+        if students < 1 or question_count < 1:
+            raise CommandError('--students and --questions must be at least 1')
+
+        tag = uuid.uuid4().hex[:8]
+        vendor = connection.vendor
+        self.stdout.write(f"Seeding {students} students and {question_count} questions ({vendor})")
+        exam, klass, subject, emails, question_ids = self._seed(tag, students, question_count)
+
+        rng = np.random.default_rng(options['seed'])
+        factory = APIRequestFactory()
+        results = {}
+        try:
+            # Each student submits the exam in chunks, in order; students are
+            # interleaved so every wave hits the database at once
+            submits = [[] for _ in range(students)]
+            for s, email in enumerate(emails[:students]):
+                answers = rng.integers(1, 5, size=question_count)
+                for start in range(0, question_count, chunk):
+                    payload = {
+                        'exam_id': exam.id,
+                        'student_email': email,
+                        'answers': [
+                            {'id': question_ids[i], 'student_answer': int(answers[i])}
+                            for i in range(start, min(start + chunk, question_count))
+                        ],
+                    }
+                    submits[s].append(payload)
+            waves = max(len(chunks) for chunks in submits)
+            submit_jobs = [
+                (submit_multiple_mcq_answers,
+                 factory.patch('/api/submit_multiple_mcq/', submits[s][w], format='json'))
+                for w in range(waves) for s in range(students) if w < len(submits[s])
+            ]
+            pages = max(1, -(-(question_count * (students + 1)) // options['page_size']))
+            read_jobs = [
+                (get_all_mcq_answers,
+                 factory.get('/api/get_all_mcq/', {'page': (i % pages) + 1, 'page_size': options['page_size']}))
+                for i in range(options['reads'])
+            ]
+
+            self.stdout.write(f"Driving {len(submit_jobs)} submissions and {len(read_jobs)} reads "
+                              f"with {options['concurrency']} threads")
+            results['submit'] = self._run('submit', submit_jobs, options['concurrency'])
+            if read_jobs:
+                results['read'] = self._run('read', read_jobs, options['concurrency'])
+        finally:
+            if options['keep']:
+                self.stdout.write(f"Kept exam {exam.id} ({klass})")
+            else:
+                self._cleanup(klass, subject, emails)
+
+        if not options['no_budget']:
+            self._check_budget(options['budget'], results)
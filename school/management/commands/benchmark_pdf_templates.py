@@ -0,0 +1,104 @@
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from school.pdf_templates import render_id_card, render_id_card_sheets, render_marks_card
+
+from . import _pdf_baseline
+from ._pdf_baseline import baseline_id_card, baseline_marks_card
+
+
+SAMPLE_MARKS_CONTEXT = {
+    'student_name': 'Benchmark Student',
+    'roll_no': '12',
+    'class_section': '10 A',
+    'academic_year': '2025-2026',
+    'date_of_birth': '01/06/2010',
+    'admission_no': 'STU-0012',
+    'subject_marks': [
+        {'subject': name, 'max_marks': '100', 'marks_obtained': '78',
+         'percentage': '78.00%', 'grade': 'B+', 'result': 'Pass'}
+        for name in ('English', 'Mathematics', 'Science', 'Social Studies', 'Kannada', 'Computer Science')
+    ],
+    'total_max_marks': '600',
+    'total_marks_obtained': '468',
+    'overall_percentage': '78.00%',
+    'overall_result': 'PASS',
+}
+
+SAMPLE_CARD_DATA = {
+    'name': 'Benchmark Student',
+    'position': 'Student - 10 A',
+    'phone': '+91 9876543210',
+    'id_no': 'STU-0012',
+    'dob': '06/01/2010',
+    'photo_url': '',
+    'barcode_value': 'benchmark.student@example.com',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure marks card and ID card rendering throughput of the shared PDF templates "
+        "against the renderers they replaced"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200, help='Cards rendered per measurement')
+
+    def _rate(self, label, count, fn):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        rate = count / elapsed if elapsed else float('inf')
+        self.stdout.write(f"  {label:<40} {rate:10.1f} cards/sec  ({elapsed:.3f}s)")
+        return rate
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if _pdf_baseline.barcode is None:
+            # Without it the old renderer skips the barcode and looks faster than it was
+            raise CommandError('The baseline ID card renderer needs python-barcode; pip install python-barcode')
+        sizes = {}
+
+        def marks_before():
+            for _ in range(count):
+                baseline_marks_card(SAMPLE_MARKS_CONTEXT)
+
+        def marks_after():
+            for _ in range(count):
+                render_marks_card(SAMPLE_MARKS_CONTEXT)
+
+        def cards_before():
+            sizes['before'] = sum(len(baseline_id_card(SAMPLE_CARD_DATA).getvalue()) for _ in range(count))
+
+        def cards_after():
+            sizes['after'] = sum(len(render_id_card(SAMPLE_CARD_DATA).getvalue()) for _ in range(count))
+
+        def sheets_after():
+            buffer = BytesIO()
+            render_id_card_sheets(((SAMPLE_CARD_DATA, None) for _ in range(count)), buffer)
+            sizes['sheets'] = buffer.tell()
+
+        # Warm up imports, fonts and the style cache
+        baseline_marks_card(SAMPLE_MARKS_CONTEXT)
+        render_marks_card(SAMPLE_MARKS_CONTEXT)
+        baseline_id_card(SAMPLE_CARD_DATA)
+        render_id_card(SAMPLE_CARD_DATA)
+
+        self.stdout.write(f"Marks cards ({count} per run)")
+        before = self._rate('before: send_marks_card renderer', count, marks_before)
+        after = self._rate('after: render_marks_card', count, marks_after)
+        self.stdout.write(f"  speedup x{after / before:.2f}")
+
+        self.stdout.write(f"ID cards, one PDF per card ({count} per run)")
+        before = self._rate('before: IDCardViewSet renderer', count, cards_before)
+        after = self._rate('after: render_id_card', count, cards_after)
+        self.stdout.write(f"  speedup x{after / before:.2f}, "
+                          f"size {sizes['before'] // 1024} KB -> {sizes['after'] // 1024} KB")
+
+        self.stdout.write(f"ID cards for a class print run ({count} cards)")
+        after = self._rate('after: render_id_card_sheets', count, sheets_after)
+        self.stdout.write(f"  speedup x{after / before:.2f} over one PDF per card, "
+                          f"size {sizes['before'] // 1024} KB -> {sizes['sheets'] // 1024} KB")
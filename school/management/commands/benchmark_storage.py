@@ -0,0 +1,60 @@
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from school.storage import LocalStorage, MemoryStorage, get_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure media upload throughput through the shared storage backend. Uses the configured "
+        "backend by default (MinIO in production); --backend memory or local runs without a server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=['configured', 'memory', 'local'], default='configured')
+        parser.add_argument('--count', type=int, default=200, help='Objects uploaded')
+        parser.add_argument('--size-kb', type=int, default=256, help='Size of each object in KB')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent uploads')
+        parser.add_argument('--keep', action='store_true', help='Keep the uploaded objects')
+
+    def handle(self, *args, **options):
+        if options['backend'] == 'memory':
+            storage = MemoryStorage(settings.BASE_BUCKET_URL)
+        elif options['backend'] == 'local':
+            storage = LocalStorage(tempfile.mkdtemp(prefix='storage-bench-'), settings.BASE_BUCKET_URL)
+        else:
+            storage = get_storage()
+            if storage is None:
+                raise CommandError('MinIO client not available; install the minio package')
+
+        payload = os.urandom(options['size_kb'] * 1024)
+        prefix = f"benchmarks/{uuid.uuid4().hex[:8]}/"
+        names = [f"{prefix}object-{i:05d}.bin" for i in range(options['count'])]
+
+        def upload(name):
+            storage.put(name, BytesIO(payload), len(payload))
+
+        storage.metrics.reset()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(upload, names))
+        elapsed = time.perf_counter() - start
+
+        total_mb = len(names) * len(payload) / (1024 * 1024)
+        put = storage.metrics.snapshot().get('put', {})
+        self.stdout.write(
+            f"{storage.name}: {len(names)} uploads of {options['size_kb']} KB with {options['concurrency']} threads "
+            f"in {elapsed:.2f}s -> {len(names) / elapsed:.1f} objects/s, {total_mb / elapsed:.1f} MB/s "
+            f"(avg {put.get('avg_ms', 0)} ms, max {put.get('max_ms', 0)} ms, {put.get('errors', 0)} errors)"
+        )
+
+        if not options['keep']:
+            for name in names:
+                storage.remove(name)
@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from school.images import (
+    PROCESSED_NAME, PROFILE_VARIANT_SIZES, delete_previous_profile_pictures, store_profile_picture,
+    upload_object_name, variant_object_name,
+)
+from school.models import Admin, FormerMember, Management, Parent, Principal, Student, Teacher
+from school.storage import get_storage
+
+
+PROFILE_MODELS = (Student, Teacher, Principal, Management, Admin, Parent, FormerMember)
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the resized profile picture variants for pictures uploaded before the image "
+        "pipeline existed. Each such picture is stored again under its processed name and the "
+        "rows referencing it are pointed there. Processed pictures whose variants exist are "
+        "skipped unless --force."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Pictures processed concurrently')
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that already exist')
+        parser.add_argument('--dry-run', action='store_true', help='Only count pictures missing variants')
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        if storage is None:
+            raise CommandError('MinIO client not available; install the minio package')
+
+        # object name -> stored URL values referencing it
+        references = {}
+        for model in PROFILE_MODELS:
+            urls = (model.objects.exclude(profile_picture__isnull=True).exclude(profile_picture='')
+                    .values_list('profile_picture', flat=True).iterator(chunk_size=2000))
+            for url in urls:
+                object_name = storage.object_name_for_url(url)
+                if object_name and (object_name.endswith('/profile.jpg') or PROCESSED_NAME.match(object_name)):
+                    references.setdefault(object_name, set()).add(url)
+
+        largest = max(PROFILE_VARIANT_SIZES)
+
+        def process(object_name):
+            if PROCESSED_NAME.match(object_name) and not options['force'] \
+                    and storage.stat(variant_object_name(object_name, largest, 'jpg')) is not None:
+                return 'skipped', None
+            if options['dry_run']:
+                return 'missing', None
+            url = store_profile_picture(storage, upload_object_name(object_name), storage.get(object_name),
+                                        upload_workers=2, keep_previous=True)
+            return 'built', url
+
+        counts = {'built': 0, 'skipped': 0, 'missing': 0, 'failed': 0}
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            futures = {pool.submit(process, name): name for name in sorted(references)}
+            for future, object_name in futures.items():
+                try:
+                    outcome, url = future.result()
+                except Exception as e:
+                    counts['failed'] += 1
+                    self.stdout.write(self.style.ERROR(f"  {object_name}: {e}"))
+                    continue
+                counts[outcome] += 1
+                if url is None or storage.object_name_for_url(url) == object_name:
+                    continue
+                # Repoint the rows first; only then remove the old objects
+                for model in PROFILE_MODELS:
+                    model.objects.filter(profile_picture__in=references[object_name]).update(profile_picture=url)
+                delete_previous_profile_pictures(storage, upload_object_name(object_name), url)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(references)} stored pictures: {counts['built']} built, {counts['skipped']} already had variants, "
+            f"{counts['missing']} missing (dry run), {counts['failed']} failed"
+        ))
@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import connection as db_connection
+
+from school.outbox import RateLimiter, claim_due_messages, deliver, lease_batch_size, prune_outbox
+
+
+# Seconds between deletions of old Sent and Failed messages
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued OutboxMessage emails over one persistent SMTP connection, rate limited, "
+        "retrying failures with exponential backoff. Sent and Failed messages older than "
+        "--retention-days are deleted. Runs until stopped, or with --once until nothing is due."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once no message is due')
+        parser.add_argument('--batch-size', type=int, default=100, help='Messages claimed per batch')
+        parser.add_argument('--rate', type=float, default=settings.OUTBOX_RATE_PER_SECOND,
+                            help='Maximum messages sent per second (0 for no limit)')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when nothing is due')
+        parser.add_argument('--retention-days', type=int, default=settings.OUTBOX_RETENTION_DAYS,
+                            help='Days to keep Sent and Failed messages (0 to keep them all)')
+
+    def handle(self, *args, **options):
+        rate_limiter = RateLimiter(options['rate'])
+        mail_connection = get_connection()
+        batch_size = lease_batch_size(options['batch_size'], options['rate'])
+        total_sent = total_failed = 0
+        next_prune = 0.0
+        try:
+            while True:
+                if options['retention_days'] > 0 and time.monotonic() >= next_prune:
+                    pruned = prune_outbox(options['retention_days'])
+                    if pruned:
+                        self.stdout.write(f"Deleted {pruned} messages older than {options['retention_days']} days")
+                    next_prune = time.monotonic() + PRUNE_INTERVAL
+                lease_deadline = time.monotonic() + settings.OUTBOX_LEASE_SECONDS
+                messages = claim_due_messages(batch_size)
+                if not messages:
+                    # Do not hold an idle SMTP session; the server would drop it anyway
+                    mail_connection.close()
+                    if options['once']:
+                        break
+                    db_connection.close_if_unusable_or_obsolete()
+                    time.sleep(options['interval'])
+                    continue
+                sent, failed = deliver(messages, mail_connection, rate_limiter, lease_deadline)
+                total_sent += sent
+                total_failed += failed
+                self.stdout.write(f"Sent {sent}, failed {failed} of {len(messages)} claimed")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            mail_connection.close()
+        self.stdout.write(self.style.SUCCESS(f"Outbox drained: {total_sent} sent, {total_failed} failed attempts"))
@@ -0,0 +1,109 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from school.images import profile_picture_variants
+from school.storage import REMOVE_BATCH_SIZE, get_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete (or, with --dry-run, report) media objects that no database row references. "
+        "Every URLField of the school models counts as a reference, as do the resized variants "
+        "of referenced profile pictures. The bucket listing is "
+        "streamed and deletes are sent in batches; objects younger than --min-age-hours are "
+        "kept so in-flight uploads are not collected."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report unreferenced objects without deleting')
+        parser.add_argument('--prefix', action='append', default=[],
+                            help='Only scan objects under this prefix (repeatable; default: whole bucket)')
+        parser.add_argument('--min-age-hours', type=float, default=24,
+                            help='Keep unreferenced objects modified within this many hours')
+        parser.add_argument('--batch-size', type=int, default=REMOVE_BATCH_SIZE,
+                            help=f'Objects per delete request (max {REMOVE_BATCH_SIZE})')
+        parser.add_argument('--list', action='store_true', help='Print every unreferenced object name')
+
+    def _url_fields(self):
+        for model in apps.get_app_config('school').get_models():
+            for field in model._meta.get_fields():
+                if isinstance(field, models.URLField):
+                    yield model, field.name
+
+    def _referenced_names(self, storage):
+        """Object names referenced by any URLField, read in chunks."""
+        # Stored URLs may lack the scheme or differ from BASE_BUCKET_URL in it
+        base = storage.base_url.split('://', 1)[-1]
+        referenced = set()
+        for model, field_name in self._url_fields():
+            values = (
+                model.objects.exclude(**{f'{field_name}__isnull': True}).exclude(**{field_name: ''})
+                .values_list(field_name, flat=True).iterator(chunk_size=2000)
+            )
+            for url in values:
+                variants = profile_picture_variants(url) or {}
+                urls = [url] + [variant for formats in variants.values() for variant in formats.values()]
+                for url in urls:
+                    url = url.split('://', 1)[-1].split('?', 1)[0]
+                    if url.startswith(base) and len(url) > len(base):
+                        referenced.add(url[len(base):])
+        return referenced
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        if storage is None:
+            raise CommandError('MinIO client not available; install the minio package')
+        batch_size = max(1, min(options['batch_size'], REMOVE_BATCH_SIZE))
+        cutoff = datetime.now(dt_timezone.utc) - timedelta(hours=options['min_age_hours'])
+        dry_run = options['dry_run']
+
+        start = time.perf_counter()
+        referenced = self._referenced_names(storage)
+        self.stdout.write(f"{len(referenced)} referenced objects in the database")
+
+        scanned = kept_recent = unreferenced = unreferenced_bytes = deleted = 0
+        failed = []
+        batch = []
+
+        def flush():
+            nonlocal deleted
+            if batch and not dry_run:
+                errors = storage.remove_many(batch)
+                failed.extend(errors)
+                deleted += len(batch) - len(errors)
+            batch.clear()
+
+        for prefix in options['prefix'] or ['']:
+            for obj in storage.list(prefix):
+                scanned += 1
+                if obj.name in referenced:
+                    continue
+                if obj.last_modified is not None and obj.last_modified > cutoff:
+                    kept_recent += 1
+                    continue
+                unreferenced += 1
+                unreferenced_bytes += obj.size or 0
+                if options['list']:
+                    self.stdout.write(f"  {obj.name}")
+                batch.append(obj.name)
+                if len(batch) >= batch_size:
+                    flush()
+        flush()
+
+        elapsed = time.perf_counter() - start
+        summary = (
+            f"Scanned {scanned} objects in {elapsed:.1f}s: {unreferenced} unreferenced "
+            f"({unreferenced_bytes / (1024 * 1024):.1f} MB), {kept_recent} unreferenced but too recent"
+        )
+        if dry_run:
+            self.stdout.write(self.style.WARNING(summary + ' (dry run, nothing deleted)'))
+            return
+        self.stdout.write(self.style.SUCCESS(f"{summary}; deleted {deleted}"))
+        if failed:
+            self.stdout.write(self.style.ERROR(f"{len(failed)} objects could not be deleted"))
+            for name in failed[:20]:
+                self.stdout.write(f"  {name}")
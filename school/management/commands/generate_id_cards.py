@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from school.id_cards import id_card_users, issue_id_cards
+from school.storage import get_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Issue ID cards in bulk for a role, a class and/or a list of emails. Cards are rendered "
+        "in a process pool, uploaded to MinIO from a thread pool and saved in one batch; "
+        "cards whose contents are unchanged are skipped unless --force is given. Progress "
+        "is printed as each card finishes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--role', help='Only users with this role, e.g. Student')
+        parser.add_argument('--class-id', type=int, help='Only students of this class')
+        parser.add_argument('--email', nargs='+', dest='emails', help='Only these users')
+        parser.add_argument('--workers', type=int, help='Render processes (default: CPU count)')
+        parser.add_argument('--upload-workers', type=int, default=8, help='Concurrent MinIO uploads')
+        parser.add_argument('--force', action='store_true', help='Regenerate cards even if unchanged')
+        parser.add_argument('--json', action='store_true', help='Print progress as JSON lines')
+
+    def handle(self, *args, **options):
+        if not (options.get('role') or options.get('class_id') or options.get('emails')):
+            raise CommandError('Give at least one of --role, --class-id or --email')
+        storage = get_storage()
+        if storage is None:
+            raise CommandError('MinIO client not available; install the minio package')
+
+        users = id_card_users(options.get('role'), options.get('class_id'), options.get('emails'))
+        for event in issue_id_cards(users, storage, options.get('workers'), options['upload_workers'],
+                                    force=options['force']):
+            if options['json']:
+                self.stdout.write(json.dumps(event))
+            elif event['status'] == 'complete':
+                style = self.style.SUCCESS if not event['failed'] else self.style.WARNING
+                self.stdout.write(style(
+                    f"{event['saved']} of {event['total']} ID cards issued, "
+                    f"{event['unchanged']} unchanged, {event['failed']} failed"
+                ))
+            elif event['status'] == 'failed':
+                self.stdout.write(self.style.ERROR(
+                    f"[{event['done']}/{event['total']}] {event['email']}: {event['stage']} failed: {event['error']}"
+                ))
+            elif event['status'] == 'unchanged':
+                self.stdout.write(f"[{event['done']}/{event['total']}] {event['email']} unchanged")
+            else:
+                self.stdout.write(f"[{event['done']}/{event['total']}] {event['email']} -> {event['url']}")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from school.models import Grade
+from school.rankings import recompute_level_rankings
+
+
+class Command(BaseCommand):
+    help = "Recompute ClassRanking rows for every (grade level, exam_type, term) slice, or a filtered subset"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--class-name', help='Only this grade level')
+        parser.add_argument('--exam-type', help='Only this exam type')
+        parser.add_argument('--term', help='Only this term, e.g. 2025-2026')
+
+    def handle(self, *args, **options):
+        grades = Grade.objects.filter(student__class_id__isnull=False)
+        if options.get('class_name'):
+            grades = grades.filter(student__class_id__class_name=options['class_name'])
+        if options.get('exam_type'):
+            grades = grades.filter(exam_type=options['exam_type'])
+        if options.get('term'):
+            grades = grades.filter(term=options['term'])
+
+        slices = grades.values_list('student__class_id__class_name', 'exam_type', 'term').distinct().order_by()
+        total = 0
+        for class_name, exam_type, term in slices:
+            count = recompute_level_rankings(class_name, exam_type, term)
+            total += count
+            self.stdout.write(f"{class_name} / {exam_type} / {term}: {count} students ranked")
+        self.stdout.write(self.style.SUCCESS(f"{total} ranking rows written"))
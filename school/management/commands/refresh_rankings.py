@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection as db_connection
+
+from school.rankings import drain_ranking_queue
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-rank the ClassRanking slices queued by grade and class changes. Runs until stopped, "
+        "or with --once until nothing is due."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once no slice is due')
+        parser.add_argument('--batch-size', type=int, default=500, help='Queue rows claimed per batch')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait between polls; changes within it share one refresh')
+
+    def handle(self, *args, **options):
+        total_refreshed = total_failed = 0
+        try:
+            while True:
+                refreshed, failed = drain_ranking_queue(max(1, options['batch_size']))
+                total_refreshed += refreshed
+                total_failed += failed
+                if refreshed or failed:
+                    self.stdout.write(f"Refreshed {refreshed} slices, {failed} failed")
+                if options['once']:
+                    break
+                db_connection.close_if_unusable_or_obsolete()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Rankings refreshed: {total_refreshed} slices, {total_failed} failed attempts"
+        ))
@@ -0,0 +1,70 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from school.grading import load_marks_card_contexts
+from school.models import Class
+from school.outbox import outbox_message, queue_emails
+from school.pdf_templates import marks_card_styles, render_marks_card
+
+
+# Marks cards rendered before their emails are written to the outbox
+QUEUE_BATCH_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = (
+        "Render marks cards for a whole class and queue them for email through the outbox "
+        "(delivered by drain_outbox), or write them to a directory"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('class_id', type=int, help='Primary key of the class')
+        parser.add_argument('--exam-type', help='Only include grades of this exam type')
+        parser.add_argument('--output-dir', help='Write PDFs here instead of emailing them')
+
+    def handle(self, *args, **options):
+        class_id = options['class_id']
+        if not Class.objects.filter(pk=class_id).exists():
+            raise CommandError(f"Class {class_id} not found")
+
+        contexts = load_marks_card_contexts(class_id=class_id, exam_type=options.get('exam_type'))
+        if not contexts:
+            self.stdout.write("No students in this class")
+            return
+
+        output_dir = options.get('output_dir')
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        styles = marks_card_styles()
+        done = 0
+        messages = []
+        for context in contexts:
+            pdf_content = render_marks_card(context, styles=styles)
+
+            if output_dir:
+                with open(os.path.join(output_dir, f"{context['student_email']}.pdf"), 'wb') as f:
+                    f.write(pdf_content)
+                done += 1
+                continue
+
+            attachment = (f"marks_card_{context['student_name']}.pdf", pdf_content, 'application/pdf')
+            messages.append(outbox_message(
+                f"Marks Card for {context['student_name']}", 'Please find attached your marks card.',
+                [context['student_email']], attachments=[attachment],
+            ))
+            if context['parent_email']:
+                messages.append(outbox_message(
+                    f"Marks Card for your child {context['student_name']}",
+                    'Please find attached the marks card for your child.',
+                    [context['parent_email']], attachments=[attachment],
+                ))
+            if len(messages) >= QUEUE_BATCH_SIZE:
+                done += len(queue_emails(messages))
+                messages = []
+        if messages:
+            done += len(queue_emails(messages))
+
+        action = 'written' if output_dir else 'queued for email'
+        self.stdout.write(self.style.SUCCESS(f"{len(contexts)} marks cards rendered, {done} {action}"))
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_grade_terms(apps, schema_editor):
+    Grade = apps.get_model('school', 'Grade')
+    start_month = getattr(settings, 'ACADEMIC_YEAR_START_MONTH', 6)
+    batch = []
+    for grade in Grade.objects.only('id', 'exam_date', 'created_at').iterator(chunk_size=2000):
+        day = grade.exam_date or timezone.localtime(grade.created_at).date()
+        start_year = day.year if day.month >= start_month else day.year - 1
+        grade.term = f"{start_year}-{start_year + 1}"
+        batch.append(grade)
+        if len(batch) >= 2000:
+            Grade.objects.bulk_update(batch, ['term'])
+            batch = []
+    if batch:
+        Grade.objects.bulk_update(batch, ['term'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0002_alter_mcq_answers_unique_constraint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grade',
+            name='term',
+            field=models.CharField(blank=True, db_index=True, max_length=20),
+        ),
+        migrations.RunPython(backfill_grade_terms, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ClassRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('class_name', models.CharField(max_length=50)),
+                ('exam_type', models.CharField(max_length=50)),
+                ('term', models.CharField(max_length=20)),
+                ('total_obtained', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('total_max', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('percentage', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('rank', models.PositiveIntegerField()),
+                ('percentile', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('level_rank', models.PositiveIntegerField()),
+                ('level_percentile', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('class_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='school.class')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='school.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['class_id', 'exam_type', 'term', 'rank'], name='ranking_section_idx'), models.Index(fields=['class_name', 'exam_type', 'term', 'level_rank'], name='ranking_level_idx')],
+                'constraints': [models.UniqueConstraint(fields=('student', 'exam_type', 'term'), name='unique_ranking_per_student_slice')],
+            },
+        ),
+    ]
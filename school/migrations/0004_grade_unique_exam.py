@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:39
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# Conflicting groups listed in the error before it is truncated
+REPORTED_DUPLICATES = 50
+
+
+def check_duplicate_grades(apps, schema_editor):
+    """
+    Refuse to add unique_grade_per_exam while several grades share a
+    (student, subject, exam_type, exam_date). Which of them holds the real
+    marks is for an operator to decide, so nothing is deleted here; the
+    error lists the conflicting rows.
+    """
+    Grade = apps.get_model('school', 'Grade')
+    duplicates = list(
+        Grade.objects.filter(exam_date__isnull=False)
+        .values('student', 'subject', 'exam_type', 'exam_date')
+        .annotate(rows=Count('id'))
+        .filter(rows__gt=1)
+        .order_by('student', 'subject', 'exam_type', 'exam_date')
+    )
+    if not duplicates:
+        return
+
+    lines = []
+    for group in duplicates[:REPORTED_DUPLICATES]:
+        grades = Grade.objects.filter(
+            student=group['student'], subject=group['subject'],
+            exam_type=group['exam_type'], exam_date=group['exam_date'],
+        ).order_by('id').values_list('id', 'marks_obtained', 'total_marks')
+        rows = ', '.join(f"id={pk} ({obtained}/{total})" for pk, obtained, total in grades)
+        lines.append(
+            f"  student={group['student']} subject={group['subject']} exam_type={group['exam_type']} "
+            f"exam_date={group['exam_date']}: {rows}"
+        )
+    if len(duplicates) > REPORTED_DUPLICATES:
+        lines.append(f"  ... and {len(duplicates) - REPORTED_DUPLICATES} more")
+    raise RuntimeError(
+        f"Cannot add unique_grade_per_exam: {len(duplicates)} (student, subject, exam_type, exam_date) "
+        "groups have more than one grade. Keep one grade in each - delete or re-date the others - "
+        "and run migrate again:\n" + "\n".join(lines)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0003_grade_term_classranking'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_grades, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='grade',
+            constraint=models.UniqueConstraint(fields=('student', 'subject', 'exam_type', 'exam_date'), name='unique_grade_per_exam'),
+        ),
+    ]
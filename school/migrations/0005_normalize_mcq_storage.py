@@ -0,0 +1,132 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+QUESTION_FIELDS = ('question', 'option_1', 'option_2', 'option_3', 'option_4', 'correct_option')
+# First id of responses created after the split. Questions are numbered
+# below it, so the two tables never hand out the same id.
+RESPONSE_ID_START = 10 ** 12
+
+
+def _advance_sequences(schema_editor, model_classes, value):
+    """Make the next generated id of each model's table greater than ``value``."""
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        for model in model_classes:
+            table = model._meta.db_table
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, %s)", [table, max(value, 1), value > 0]
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute("DELETE FROM sqlite_sequence WHERE name = %s", [table])
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, value])
+            elif connection.vendor == 'mysql':
+                cursor.execute(f"ALTER TABLE {connection.ops.quote_name(table)} AUTO_INCREMENT = {int(value) + 1}")
+
+
+def split_mcq_answers(apps, schema_editor):
+    """
+    Move MCQ_Answers rows into Question (template rows, student is NULL) and
+    QuestionResponse (student rows), keeping the original ids so clients that
+    stored MCQ ids keep working. A student row is attached to the exam's
+    question with the same text; if that question no longer exists, it is
+    recreated from the student's copy so no answer is lost.
+
+    New questions continue after the highest MCQ_Answers id and new
+    responses from RESPONSE_ID_START, so an MCQ id, legacy or new, always
+    names exactly one question or response.
+    """
+    MCQ_Answers = apps.get_model('school', 'MCQ_Answers')
+    Question = apps.get_model('school', 'Question')
+    QuestionResponse = apps.get_model('school', 'QuestionResponse')
+
+    legacy_max = MCQ_Answers.objects.aggregate(top=models.Max('id'))['top'] or 0
+    next_id = legacy_max
+    question_ids = {}
+    batch = []
+    for row in MCQ_Answers.objects.filter(student__isnull=True).order_by('id').iterator(chunk_size=BATCH_SIZE):
+        question_ids.setdefault((row.exam_id, row.question), row.id)
+        batch.append(Question(id=row.id, exam_id=row.exam_id, **{f: getattr(row, f) for f in QUESTION_FIELDS}))
+        if len(batch) >= BATCH_SIZE:
+            Question.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Question.objects.bulk_create(batch)
+
+    batch = []
+    for row in MCQ_Answers.objects.filter(student__isnull=False).order_by('id').iterator(chunk_size=BATCH_SIZE):
+        key = (row.exam_id, row.question)
+        if key not in question_ids:
+            next_id += 1
+            orphan = Question.objects.create(
+                id=next_id, exam_id=row.exam_id, **{f: getattr(row, f) for f in QUESTION_FIELDS}
+            )
+            question_ids[key] = orphan.id
+        batch.append(QuestionResponse(
+            id=row.id,
+            exam_id=row.exam_id,
+            student_id=row.student_id,
+            question_id=question_ids[key],
+            answer=row.student_answer,
+            result=row.result,
+        ))
+        if len(batch) >= BATCH_SIZE:
+            QuestionResponse.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        QuestionResponse.objects.bulk_create(batch)
+
+    _advance_sequences(schema_editor, [Question], next_id)
+    _advance_sequences(schema_editor, [QuestionResponse], max(next_id, RESPONSE_ID_START - 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0004_grade_unique_exam'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Question',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('option_1', models.TextField()),
+                ('option_2', models.TextField()),
+                ('option_3', models.TextField()),
+                ('option_4', models.TextField()),
+                ('correct_option', models.PositiveSmallIntegerField(choices=[(1, 'Option 1'), (2, 'Option 2'), (3, 'Option 3'), (4, 'Option 4')])),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='questions', to='school.exam')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answer', models.PositiveSmallIntegerField(blank=True, choices=[(1, 'Option 1'), (2, 'Option 2'), (3, 'Option 3'), (4, 'Option 4')], null=True)),
+                ('result', models.BooleanField(default=False)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='school.exam')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='school.question')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mcq_responses', to='school.student')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='questionresponse',
+            index=models.Index(fields=['exam', 'student'], name='response_exam_student_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='questionresponse',
+            constraint=models.UniqueConstraint(fields=('student', 'question'), name='unique_response_per_question'),
+        ),
+        migrations.RunPython(split_mcq_answers, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='MCQ_Answers',
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_exam_results(apps, schema_editor):
+    """One ExamResult per (exam, student) that already has responses."""
+    Question = apps.get_model('school', 'Question')
+    QuestionResponse = apps.get_model('school', 'QuestionResponse')
+    ExamResult = apps.get_model('school', 'ExamResult')
+
+    question_counts = dict(
+        Question.objects.values('exam').annotate(n=Count('id')).values_list('exam', 'n').order_by()
+    )
+    totals = (
+        QuestionResponse.objects.values('exam', 'student')
+        .annotate(answered=Count('id', filter=Q(answer__isnull=False)), correct=Count('id', filter=Q(result=True)))
+        .order_by()
+    )
+    ExamResult.objects.bulk_create([
+        ExamResult(
+            exam_id=row['exam'],
+            student_id=row['student'],
+            correct=row['correct'],
+            answered=row['answered'],
+            total_questions=question_counts.get(row['exam'], 0),
+        )
+        for row in totals
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0005_normalize_mcq_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('answered', models.PositiveIntegerField(default=0)),
+                ('total_questions', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='school.exam')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_results', to='school.student')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('exam', 'student'), name='unique_result_per_exam_student')],
+            },
+        ),
+        migrations.RunPython(backfill_exam_results, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0006_exam_result'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idcard',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
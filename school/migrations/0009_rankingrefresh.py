@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0008_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('class_name', models.CharField(max_length=50)),
+                ('exam_type', models.CharField(max_length=50)),
+                ('term', models.CharField(max_length=20)),
+                ('student_id', models.CharField(blank=True, default='', max_length=254)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['next_attempt_at'], name='ranking_refresh_due_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.db.models import Sum
+from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.utils import timezone
 from datetime import datetime
@@ -392,6 +393,13 @@ class StudentAttendance(models.Model):
 
 
 # ------------------- GRADE/MARKS -------------------
+def academic_term(day):
+    """Academic year label (e.g. '2025-2026') that a date falls in."""
+    start_month = getattr(settings, 'ACADEMIC_YEAR_START_MONTH', 6)
+    start_year = day.year if day.month >= start_month else day.year - 1
+    return f"{start_year}-{start_year + 1}"
+
+
 class Grade(models.Model):
     student: Student = models.ForeignKey(Student, on_delete=models.CASCADE, to_field='email', related_name='grades')  # type: ignore[assignment]
     subject: Subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='grades')  # type: ignore[assignment]
@@ -407,12 +415,27 @@ class Grade(models.Model):
     total_marks = models.DecimalField(max_digits=5, decimal_places=2)
     exam_date = models.DateField(null=True, blank=True)
     remarks = models.TextField(null=True, blank=True)
+    term = models.CharField(max_length=20, blank=True, db_index=True)  # academic year, derived from exam_date
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # One mark per student, subject and sitting; used as the bulk import upsert key
+            models.UniqueConstraint(fields=['student', 'subject', 'exam_type', 'exam_date'], name='unique_grade_per_exam'),
+        ]
+
     def __str__(self):
         return f"{self.student.fullname} - {self.subject.subject_name} - {self.exam_type}"
 
+    def save(self, *args, **kwargs):
+        # Term follows the exam date; undated grades belong to the current term
+        if self.exam_date:
+            self.term = academic_term(self.exam_date)
+        elif not self.term:
+            self.term = academic_term(timezone.localdate())
+        super().save(*args, **kwargs)
+
     @property
     def percentage(self):
         if self.total_marks > 0:  # type: ignore[operator]
@@ -420,6 +443,63 @@ class Grade(models.Model):
         return 0
 
 
+# ------------------- CLASS RANKING -------------------
+class ClassRanking(models.Model):
+    """
+    Materialized rank of a student within their section and grade level for
+    one (exam_type, term) slice. Maintained by school.rankings.
+    """
+    student: Student = models.ForeignKey(Student, on_delete=models.CASCADE, to_field='email', related_name='rankings')  # type: ignore[assignment]
+    class_id: Class = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='rankings')  # type: ignore[assignment]
+    class_name = models.CharField(max_length=50)  # grade level, shared by all sections
+    exam_type = models.CharField(max_length=50)
+    term = models.CharField(max_length=20)
+    total_obtained = models.DecimalField(max_digits=9, decimal_places=2)
+    total_max = models.DecimalField(max_digits=9, decimal_places=2)
+    percentage = models.DecimalField(max_digits=6, decimal_places=2)
+    rank = models.PositiveIntegerField()  # dense rank within the section
+    percentile = models.DecimalField(max_digits=5, decimal_places=2)
+    level_rank = models.PositiveIntegerField()  # dense rank within the grade level
+    level_percentile = models.DecimalField(max_digits=5, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'exam_type', 'term'], name='unique_ranking_per_student_slice'),
+        ]
+        indexes = [
+            models.Index(fields=['class_id', 'exam_type', 'term', 'rank'], name='ranking_section_idx'),
+            models.Index(fields=['class_name', 'exam_type', 'term', 'level_rank'], name='ranking_level_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.class_name} {self.exam_type} {self.term}: #{self.level_rank}"
+
+
+class RankingRefresh(models.Model):
+    """
+    A ranking slice whose grades changed, queued in the same transaction as
+    the change and drained by the refresh_rankings worker (see
+    school.rankings). An empty ``student_id`` means the whole slice.
+    """
+    class_name = models.CharField(max_length=50)
+    exam_type = models.CharField(max_length=50)
+    term = models.CharField(max_length=20)
+    student_id = models.CharField(max_length=254, blank=True, default='')
+    # Due time of the next attempt; also leases claimed rows
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='ranking_refresh_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.class_name} {self.exam_type} {self.term}: {self.student_id or 'all'}"
+
+
 # ------------------- FEE STRUCTURE -------------------
 class FeeStructure(models.Model):
     class_id = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='fee_structures', null=True, blank=True)
@@ -983,6 +1063,8 @@ class TransportDetails(models.Model):
 class IDCard(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, to_field='email', related_name='id_card')
     id_card_url = models.URLField(null=True, blank=True)
+    # Hash of everything printed on the card; unchanged cards are not re-rendered
+    fingerprint = models.CharField(max_length=64, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -999,21 +1081,106 @@ class Exam(models.Model):
     def __str__(self):
         return f"Exam {self.sub.subject_name} for {self.class_id.class_name} {self.class_id.sec}"
 
-# ------------------- MCQ ANSWERS -------------------
-class MCQ_Answers(models.Model):
-    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='mcq_answers')
-    student = models.ForeignKey(Student, on_delete=models.CASCADE, to_field='email', related_name='mcq_answers', null=True, blank=True)
+# ------------------- MCQ QUESTIONS -------------------
+MCQ_OPTION_CHOICES = [(1, 'Option 1'), (2, 'Option 2'), (3, 'Option 3'), (4, 'Option 4')]
+
+
+class Question(models.Model):
+    """A multiple-choice question of an exam, stored once and shared by every student."""
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='questions')
     question = models.TextField()
     option_1 = models.TextField()
     option_2 = models.TextField()
     option_3 = models.TextField()
     option_4 = models.TextField()
-    correct_option = models.IntegerField(choices=[(1, 'Option 1'), (2, 'Option 2'), (3, 'Option 3'), (4, 'Option 4')])
-    student_answer = models.IntegerField(choices=[(1, 'Option 1'), (2, 'Option 2'), (3, 'Option 3'), (4, 'Option 4')], null=True, blank=True)
+    correct_option = models.PositiveSmallIntegerField(choices=MCQ_OPTION_CHOICES)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Exam {self.exam_id} - Question: {self.question[:50]}..."
+
+
+# ------------------- MCQ RESPONSES -------------------
+class QuestionResponse(models.Model):
+    """
+    One student's answer to one question (named to avoid clashing with DRF's
+    Response). Ids are numbered from 10**12 (see migration 0005) so they never
+    collide with Question ids in the legacy MCQ endpoints.
+    """
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='responses')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, to_field='email', related_name='mcq_responses')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='responses')
+    answer = models.PositiveSmallIntegerField(choices=MCQ_OPTION_CHOICES, null=True, blank=True)
     result = models.BooleanField(default=False)
 
     class Meta:
-        unique_together = ('exam', 'student', 'question')
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'question'], name='unique_response_per_question'),
+        ]
+        indexes = [
+            models.Index(fields=['exam', 'student'], name='response_exam_student_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - Question {self.question_id}: {self.answer}"
+
+
+# ------------------- EXAM RESULT -------------------
+class ExamResult(models.Model):
+    """
+    Running MCQ score of one student in one exam, maintained incrementally
+    as responses are written (see grading.apply_exam_result_delta).
+    """
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='results')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, to_field='email', related_name='exam_results')
+    correct = models.PositiveIntegerField(default=0)
+    answered = models.PositiveIntegerField(default=0)
+    total_questions = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['exam', 'student'], name='unique_result_per_exam_student'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - Exam {self.exam_id}: {self.correct}/{self.total_questions}"
+
+
+# ------------------- EMAIL OUTBOX -------------------
+class OutboxMessage(models.Model):
+    """
+    An email queued by a request and delivered by the drain_outbox worker
+    (see outbox.py), so request latency does not depend on SMTP.
+    """
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Sent', 'Sent'),
+        ('Failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True, default='')
+    html_body = models.TextField(blank=True, default='')
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(default=list)
+    # [{"filename": ..., "mimetype": ..., "content": base64}]
+    attachments = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # Due time for the next delivery attempt; also leases claimed messages
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
 
     def __str__(self):
-        return f"MCQ for Exam {self.exam.exam_id} - Question: {self.question[:50]}..."
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
@@ -0,0 +1,179 @@
+"""
+Durable email outbox.
+
+Requests queue mail with ``queue_email`` / ``queue_emails`` instead of
+talking to SMTP; the rows commit together with the request's own writes.
+The ``drain_outbox`` command delivers due messages over one persistent
+SMTP connection with ``send_messages``, at a bounded rate, and retries
+failures with exponential backoff until OUTBOX_MAX_ATTEMPTS.
+
+Claimed messages are leased by pushing ``next_attempt_at`` forward, so a
+worker that dies mid-batch leaves them to be picked up again later. A batch
+is sized to be sent well within the lease, and a worker stops sending once
+its lease has run out, so messages are not delivered twice.
+
+Once a message is Sent or finally Failed its body and attachments are
+blanked - bodies can carry live password-reset links - and the remaining
+row is deleted after OUTBOX_RETENTION_DAYS by ``prune_outbox``.
+"""
+import base64
+import smtplib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+
+def outbox_message(subject, body, to, from_email=None, html_body='', attachments=()):
+    """Unsaved OutboxMessage; ``attachments`` are ``(filename, content_bytes, mimetype)``."""
+    return OutboxMessage(
+        subject=subject[:255],
+        body=body or '',
+        html_body=html_body or '',
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+        attachments=[
+            {'filename': filename, 'mimetype': mimetype, 'content': base64.b64encode(content).decode('ascii')}
+            for filename, content, mimetype in attachments
+        ],
+    )
+
+
+def queue_email(subject, body, to, from_email=None, html_body='', attachments=()):
+    message = outbox_message(subject, body, to, from_email, html_body, attachments)
+    message.save()
+    return message
+
+
+def queue_emails(messages):
+    """Save many unsaved outbox messages in one statement per 500."""
+    return OutboxMessage.objects.bulk_create(list(messages), batch_size=500)
+
+
+def retry_delay(attempts):
+    """Seconds before retry number ``attempts``: exponential, capped."""
+    return min(settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), settings.OUTBOX_RETRY_MAX_SECONDS)
+
+
+def lease_batch_size(batch_size, rate):
+    """
+    Messages to claim per batch: ``batch_size``, capped so that sending them
+    at ``rate`` per second takes at most half of OUTBOX_LEASE_SECONDS.
+    """
+    if rate and rate > 0:
+        batch_size = min(batch_size, int(settings.OUTBOX_LEASE_SECONDS * rate / 2))
+    return max(1, batch_size)
+
+
+def claim_due_messages(limit):
+    """
+    Lease up to ``limit`` due messages to this worker. Rows locked by another
+    worker are skipped where the database supports it (PostgreSQL).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(status='Pending', next_attempt_at__lte=now)
+            .order_by('id').values_list('id', flat=True)[:limit]
+        )
+        OutboxMessage.objects.filter(id__in=ids).update(
+            next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+        )
+    return list(OutboxMessage.objects.filter(id__in=ids).order_by('id'))
+
+
+def _email(message, connection):
+    email = EmailMultiAlternatives(
+        message.subject, message.body, message.from_email, message.to, connection=connection
+    )
+    if message.html_body:
+        email.attach_alternative(message.html_body, 'text/html')
+    for attachment in message.attachments:
+        email.attach(attachment['filename'], base64.b64decode(attachment['content']), attachment['mimetype'])
+    return email
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / per_second`` seconds apart."""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second and per_second > 0 else 0.0
+        self._next = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+PAYLOAD_FIELDS = ['body', 'html_body', 'attachments']
+
+
+def _clear_payload(message):
+    """Drop the content of a finished message; subject and recipients stay for the record."""
+    message.body = ''
+    message.html_body = ''
+    message.attachments = []
+
+
+def deliver(messages, connection, rate_limiter, lease_deadline=None):
+    """
+    Send claimed messages over ``connection`` and record each outcome.
+    Stops at ``lease_deadline`` (a ``time.monotonic()`` value), leaving the
+    rest for whichever worker claims them next. Returns ``(sent, failed)``.
+    """
+    sent = failed = 0
+    for message in messages:
+        rate_limiter.wait()
+        if lease_deadline is not None and time.monotonic() >= lease_deadline:
+            break
+        message.attempts += 1
+        try:
+            # No-op while the connection is open; reconnects after an error
+            connection.open()
+            if not connection.send_messages([_email(message, connection)]):
+                raise smtplib.SMTPException('Message was not accepted')
+        except Exception as e:
+            failed += 1
+            message.last_error = f'{type(e).__name__}: {e}'[:2000]
+            update_fields = ['attempts', 'last_error', 'status', 'next_attempt_at']
+            if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS or isinstance(e, smtplib.SMTPRecipientsRefused):
+                message.status = 'Failed'
+                _clear_payload(message)
+                update_fields += PAYLOAD_FIELDS
+            else:
+                message.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(message.attempts))
+            message.save(update_fields=update_fields)
+            # Start the next message on a fresh connection
+            try:
+                connection.close()
+            except Exception:
+                pass
+            continue
+        sent += 1
+        message.status = 'Sent'
+        message.sent_at = timezone.now()
+        message.last_error = ''
+        _clear_payload(message)
+        message.save(update_fields=['attempts', 'last_error', 'status', 'sent_at'] + PAYLOAD_FIELDS)
+    return sent, failed
+
+
+def prune_outbox(retention_days, chunk_size=1000):
+    """Delete Sent and Failed messages created more than ``retention_days`` ago."""
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    finished = OutboxMessage.objects.filter(status__in=['Sent', 'Failed'], created_at__lt=cutoff)
+    deleted = 0
+    while True:
+        ids = list(finished.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += OutboxMessage.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,507 @@
+"""
+Reusable PDF templates for marks cards and ID cards.
+
+All static ReportLab objects (style sheets, paragraph and table styles,
+colours and card geometry) are built once per process and shared between
+renders, so each card only pays for filling in its own data.
+"""
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.graphics.barcode.code128 import Code128
+from reportlab.lib import colors
+from reportlab.lib.colors import Color
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+
+# ------------------- MARKS CARD TEMPLATE -------------------
+SCHOOL_NAME = "GREENWOOD PUBLIC SCHOOL"
+SCHOOL_ADDRESS = "123, MG Road, Bengaluru - 560001 | Ph: (080) 2345 6789"
+MARKS_CARD_TITLE = "ANNUAL EXAMINATION MARKS CARD"
+
+PRIMARY_COLOR = colors.HexColor('#2C5AA0')
+BORDER_COLOR = colors.HexColor('#CCCCCC')
+HIGHLIGHT_COLOR = colors.HexColor('#F0F5FF')
+
+
+def _build_marks_card_styles():
+    """Build every paragraph and table style used by the marks card."""
+    styles = getSampleStyleSheet()
+
+    title = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        spaceAfter=5,
+        alignment=TA_CENTER,
+        textColor=PRIMARY_COLOR
+    )
+    subtitle = ParagraphStyle(
+        'CustomSubtitle',
+        parent=styles['Heading2'],
+        fontSize=16,
+        spaceAfter=20,
+        alignment=TA_CENTER,
+        textColor=PRIMARY_COLOR
+    )
+    school = ParagraphStyle(
+        'SchoolInfo',
+        parent=styles['Normal'],
+        fontSize=10,
+        spaceAfter=5,
+        alignment=TA_CENTER,
+        textColor=colors.HexColor('#555555')
+    )
+    # Variants are separate styles so rendering never mutates shared state
+    section_heading = ParagraphStyle(
+        'SectionHeading',
+        parent=subtitle,
+        fontSize=13,
+        alignment=TA_LEFT
+    )
+    summary = ParagraphStyle(
+        'Summary',
+        parent=styles['Normal'],
+        fontSize=11,
+        spaceAfter=5,
+        textColor=PRIMARY_COLOR
+    )
+    result = ParagraphStyle(
+        'FinalResult',
+        parent=subtitle,
+        fontSize=16,
+        alignment=TA_CENTER
+    )
+
+    student_table = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FFFFFF')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 0.3, BORDER_COLOR),
+        ('BOX', (0, 0), (-1, -1), 0.3, BORDER_COLOR),
+        ('INNERGRID', (0, 0), (-1, -1), 0.3, BORDER_COLOR),
+        ('BACKGROUND', (0, 0), (0, -1), HIGHLIGHT_COLOR),
+        ('BACKGROUND', (2, 0), (2, -1), HIGHLIGHT_COLOR),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+        ('TEXTCOLOR', (0, 0), (0, -1), PRIMARY_COLOR),
+        ('TEXTCOLOR', (2, 0), (2, -1), PRIMARY_COLOR),
+    ])
+    marks_table = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), PRIMARY_COLOR),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#FFFFFF')),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#FFFFFF')),
+        ('GRID', (0, 0), (-1, -1), 0.3, BORDER_COLOR),
+        ('BOX', (0, 0), (-1, -1), 0.3, BORDER_COLOR),
+        ('INNERGRID', (0, 0), (-1, -1), 0.3, BORDER_COLOR),
+        ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
+        ('FONTNAME', (-1, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (0, -1), (0, -1), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, -1), (-1, -1), HIGHLIGHT_COLOR),
+        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TEXTCOLOR', (0, -1), (-1, -1), PRIMARY_COLOR),
+    ])
+    footer_table = TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, 0), 0.3, BORDER_COLOR),
+        ('BOX', (0, 0), (-1, 0), 0.3, BORDER_COLOR),
+        ('LINEBELOW', (0, 0), (-1, 0), 0.3, BORDER_COLOR),
+        ('LINEAFTER', (0, 0), (0, 0), 0.3, BORDER_COLOR),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#666666')),
+    ])
+
+    return {
+        'title': title,
+        'subtitle': subtitle,
+        'school': school,
+        'section_heading': section_heading,
+        'summary': summary,
+        'result': result,
+        'student_table': student_table,
+        'marks_table': marks_table,
+        'footer_table': footer_table,
+    }
+
+
+@lru_cache(maxsize=None)
+def marks_card_styles():
+    """Process-wide marks card styles. Callers must treat them as read-only."""
+    return _build_marks_card_styles()
+
+
+def render_marks_card(context, styles=None) -> bytes:
+    """
+    Render a marks card PDF from a context dict (see send_marks_card for the keys)
+    and return the PDF bytes.
+    """
+    if styles is None:
+        styles = marks_card_styles()
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=72
+    )
+    elements = [Spacer(1, 5)]
+
+    # Header
+    elements.append(Paragraph(SCHOOL_NAME, styles['title']))
+    elements.append(Paragraph(SCHOOL_ADDRESS, styles['school']))
+    elements.append(Paragraph(MARKS_CARD_TITLE, styles['subtitle']))
+    elements.append(Spacer(1, 20))
+
+    # Student information
+    student_data = [
+        ['Student Name:', context['student_name'], 'Roll No:', context['roll_no'] or 'N/A'],
+        ['Class & Section:', context['class_section'] or 'N/A', 'Academic Year:', context['academic_year']],
+        ['Date of Birth:', context['date_of_birth'] or 'N/A', 'Admission No:', context['admission_no'] or 'N/A']
+    ]
+    student_table = Table(student_data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 2*inch])
+    student_table.setStyle(styles['student_table'])
+    elements.append(student_table)
+    elements.append(Spacer(1, 20))
+
+    # Marks table
+    elements.append(Paragraph("Academic Performance", styles['section_heading']))
+    marks_data = [
+        ['Subject', 'Max Marks', 'Marks Obtained', 'Percentage', 'Grade', 'Result']
+    ]
+    for subject in context['subject_marks']:
+        marks_data.append([
+            subject['subject'],
+            subject['max_marks'],
+            subject['marks_obtained'],
+            subject['percentage'],
+            subject['grade'],
+            subject['result']
+        ])
+    marks_data.append([
+        'Total',
+        context['total_max_marks'],
+        context['total_marks_obtained'],
+        context['overall_percentage'],
+        '',
+        context['overall_result']
+    ])
+    marks_table = Table(marks_data, colWidths=[2*inch, 1*inch, 1*inch, 1*inch, 0.7*inch, 0.8*inch])
+    marks_table.setStyle(styles['marks_table'])
+    elements.append(marks_table)
+    elements.append(Spacer(1, 25))
+
+    # Performance summary
+    elements.append(Paragraph(f"Overall Percentage: {context['overall_percentage']}", styles['summary']))
+    elements.append(Spacer(1, 10))
+
+    # Signatures
+    footer_table = Table([['Class Teacher', 'Principal'], ['', '']], colWidths=[3*inch, 3*inch])
+    footer_table.setStyle(styles['footer_table'])
+    elements.append(footer_table)
+    elements.append(Spacer(1, 20))
+
+    # Final result
+    result_color = '#32A852' if context['overall_result'] == 'PASS' else '#C70039'
+    result_text = f"Final Result: <font color='{result_color}'><b>{context['overall_result']}</b></font>"
+    elements.append(Paragraph(result_text, styles['result']))
+
+    doc.build(elements)
+    pdf_content = buffer.getvalue()
+    buffer.close()
+    return pdf_content
+
+
+# ------------------- ID CARD TEMPLATE -------------------
+# Card geometry follows the HTML template (330px wide, 1px = 0.75pt)
+PX = 0.75
+CARD_WIDTH = 330 * PX
+CARD_HEIGHT = 450 * PX
+CARD_COMPANY_NAME = 'SCHOOL NAME'
+
+BACKGROUND_COLOR = Color(0.913, 0.929, 0.945)  # #e9edf1
+HEADER_COLOR = Color(0.027, 0.153, 0.235)      # #07273C
+TEXT_COLOR = Color(0, 0, 0)                    # #000000
+GRAY_TEXT = Color(0.467, 0.467, 0.467)         # #777777
+WHITE = Color(1, 1, 1)
+
+HEADER_HEIGHT = 120 * PX
+FOOTER_HEIGHT = 45 * PX
+PROFILE_SIZE = 110 * PX
+PROFILE_BORDER = 5 * PX
+PROFILE_X = CARD_WIDTH // 2 - PROFILE_SIZE // 2
+PROFILE_Y = CARD_HEIGHT - 60 * PX - PROFILE_SIZE
+NAME_FONT = ("Helvetica-Bold", 15)
+NAME_MAX_WIDTH = CARD_WIDTH - 40
+NAME_LINE_HEIGHT = 18
+INFO_PADDING = 35 * PX
+INFO_LINE_SPACING = 25 * PX
+BARCODE_WIDTH = 160 * PX
+BARCODE_HEIGHT = 45 * PX
+BARCODE_QUIET_MODULES = 10  # Code128 quiet zone on each side, in bar modules
+
+# Form XObject holding the fixed card chrome; defined once per PDF document
+CHROME_FORM = 'idCardChrome'
+
+# Bump whenever the card layout changes so stored cards are regenerated
+ID_CARD_TEMPLATE_VERSION = 2
+
+
+def _draw_card_chrome(c):
+    """Draw everything on the card that does not depend on the cardholder."""
+    # Background
+    c.setFillColor(BACKGROUND_COLOR)
+    c.rect(0, 0, CARD_WIDTH, CARD_HEIGHT, fill=1)
+
+    # Header band with company name
+    c.setFillColor(HEADER_COLOR)
+    c.rect(0, CARD_HEIGHT - HEADER_HEIGHT, CARD_WIDTH, HEADER_HEIGHT, fill=1)
+    c.setFillColor(WHITE)
+    c.setFont("Helvetica-Bold", 15)
+    c.drawCentredString(CARD_WIDTH/2, CARD_HEIGHT - 35*PX, CARD_COMPANY_NAME)
+
+    # White border behind the profile picture
+    c.setFillColor(WHITE)
+    c.rect(PROFILE_X - PROFILE_BORDER, PROFILE_Y - PROFILE_BORDER,
+           PROFILE_SIZE + 2*PROFILE_BORDER, PROFILE_SIZE + 2*PROFILE_BORDER, fill=1)
+
+    # Footer band
+    c.setFillColor(HEADER_COLOR)
+    c.rect(0, 0, CARD_WIDTH, FOOTER_HEIGHT, fill=1)
+
+
+def _ensure_chrome_form(c):
+    if not c.hasForm(CHROME_FORM):
+        c.beginForm(CHROME_FORM, 0, 0, CARD_WIDTH, CARD_HEIGHT)
+        _draw_card_chrome(c)
+        c.endForm()
+
+
+def _wrap_name(c, name):
+    """Split a long name into lines that fit the card width."""
+    font_name, font_size = NAME_FONT
+    if c.stringWidth(name, font_name, font_size) <= NAME_MAX_WIDTH:
+        return [name]
+    lines = []
+    current_line = ""
+    for word in name.split(' '):
+        test_line = current_line + " " + word if current_line else word
+        if c.stringWidth(test_line, font_name, font_size) <= NAME_MAX_WIDTH:
+            current_line = test_line
+        elif current_line:
+            lines.append(current_line)
+            current_line = word
+        else:
+            # A single word wider than the card gets a line of its own
+            lines.append(word)
+    if current_line:
+        lines.append(current_line)
+    return lines
+
+
+def _draw_barcode(c, value, x, y):
+    """
+    Draw a Code128 barcode of ``value`` as vector bars on a white box of
+    BARCODE_WIDTH x BARCODE_HEIGHT with its lower-left corner at (x, y).
+    """
+    bars = Code128(value, barWidth=1, barHeight=BARCODE_HEIGHT, quiet=True,
+                   lquiet=BARCODE_QUIET_MODULES, rquiet=BARCODE_QUIET_MODULES)
+    c.setFillColor(WHITE)
+    c.rect(x, y, BARCODE_WIDTH, BARCODE_HEIGHT, stroke=0, fill=1)
+    c.saveState()
+    c.translate(x, y)
+    # Bars are laid out one point per module; stretch them to the box width
+    c.scale(BARCODE_WIDTH / bars.width, 1)
+    bars.drawOn(c, 0, 0)
+    c.restoreState()
+
+
+def draw_id_card(c, data, photo=None, x=0, y=0, scale=1.0, use_form=False):
+    """
+    Draw one ID card on canvas ``c`` with its lower-left corner at (x, y).
+
+    ``data`` is the dict produced by ``id_card_data``; ``photo`` is an
+    ImageReader (or anything drawImage accepts) for the profile picture.
+    The fixed chrome is drawn inline; pass ``use_form=True`` when many cards
+    share one document so it is written once as a form XObject instead.
+    """
+    if use_form:
+        _ensure_chrome_form(c)
+
+    c.saveState()
+    c.translate(x, y)
+    if scale != 1.0:
+        c.scale(scale, scale)
+
+    if use_form:
+        c.doForm(CHROME_FORM)
+    else:
+        _draw_card_chrome(c)
+
+    if photo is not None:
+        try:
+            c.drawImage(photo, PROFILE_X, PROFILE_Y, PROFILE_SIZE, PROFILE_SIZE)
+        except Exception:
+            # If the profile picture cannot be decoded, continue without it
+            pass
+
+    # Name, wrapped and centred under the photo
+    name_y = PROFILE_Y - 40*PX
+    c.setFillColor(TEXT_COLOR)
+    c.setFont(*NAME_FONT)
+    name_lines = _wrap_name(c, data['name'])
+    total_name_height = len(name_lines) * NAME_LINE_HEIGHT
+    current_name_y = name_y + (total_name_height - NAME_LINE_HEIGHT) / 2
+    for i, line in enumerate(name_lines):
+        c.drawCentredString(CARD_WIDTH/2, current_name_y - i * NAME_LINE_HEIGHT, line)
+
+    position_y = name_y - (total_name_height - NAME_LINE_HEIGHT) / 2 - 15*PX
+    c.setFillColor(GRAY_TEXT)
+    c.setFont("Helvetica", 12)
+    c.drawCentredString(CARD_WIDTH/2, position_y, data['position'])
+
+    # Info rows: bold label on the left, value on the right
+    c.setFillColor(TEXT_COLOR)
+    current_y = position_y - 18*PX
+    for label, value in (('DOB:', data['dob']), ('Phone:', data['phone']), ('ID No:', data['id_no'])):
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(INFO_PADDING, current_y, label)
+        c.setFont("Helvetica", 10)
+        c.drawRightString(CARD_WIDTH - INFO_PADDING, current_y, value)
+        current_y -= INFO_LINE_SPACING
+
+    # Barcode of the cardholder's email
+    if data.get('barcode_value'):
+        try:
+            _draw_barcode(c, data['barcode_value'], CARD_WIDTH // 2 - BARCODE_WIDTH // 2, current_y - 45*PX)
+        except Exception:
+            # If the value cannot be encoded, continue without the barcode
+            pass
+
+    c.restoreState()
+
+
+def render_id_card(data, photo=None) -> BytesIO:
+    """Render a single ID card PDF and return it as a rewound BytesIO."""
+    pdf_buffer = BytesIO()
+    c = canvas.Canvas(pdf_buffer, pagesize=(CARD_WIDTH, CARD_HEIGHT))
+    draw_id_card(c, data, photo)
+    c.save()
+    pdf_buffer.seek(0)
+    return pdf_buffer
+
+
+def id_card_data(user):
+    """Collect the per-user fields printed on an ID card."""
+    data = {
+        'name': getattr(user, 'email', 'Unknown User'),
+        'position': getattr(user, 'role', 'Unknown Role'),
+        'phone': '',
+        'id_no': '',
+        'dob': '',
+        'photo_url': '',
+        'barcode_value': getattr(user, 'email', ''),
+    }
+
+    def _dob(profile):
+        return profile.date_of_birth.strftime('%m/%d/%Y') if profile.date_of_birth else 'MM/DD/YEAR'
+
+    if hasattr(user, 'student') and user.student:
+        student = user.student
+        data.update(name=student.fullname, dob=_dob(student), phone=student.phone or '+91 9876543210',
+                    id_no=student.student_id or 'RST-0012', photo_url=student.profile_picture or '')
+        if student.class_id:
+            data['position'] = f"Student - {student.class_id.class_name} {student.class_id.sec}"
+    elif hasattr(user, 'teacher') and user.teacher:
+        teacher = user.teacher
+        data.update(name=teacher.fullname, dob=_dob(teacher), phone=teacher.phone or '+91 9876543210',
+                    id_no=teacher.teacher_id or 'RST-0012', photo_url=teacher.profile_picture or '')
+        if teacher.department:
+            data['position'] = f"Teacher - {teacher.department.department_name}"
+    elif hasattr(user, 'principal') and user.principal:
+        principal = user.principal
+        data.update(name=principal.fullname, dob=_dob(principal), phone=principal.phone or '+91 9876543210',
+                    id_no='PRN-001', photo_url=principal.profile_picture or '', position='Principal')
+    elif hasattr(user, 'management') and user.management:
+        management = user.management
+        data.update(name=management.fullname, dob=_dob(management), phone=management.phone or '+91 9876543210',
+                    id_no='MGT-001', photo_url=management.profile_picture or '')
+        if management.designation:
+            data['position'] = f"Management - {management.designation}"
+    elif hasattr(user, 'admin') and user.admin:
+        admin = user.admin
+        data.update(name=admin.fullname, phone=admin.phone or '+91 9876543210',
+                    id_no='ADM-001', photo_url=admin.profile_picture or '', position='Admin')
+    elif hasattr(user, 'parent') and user.parent:
+        parent = user.parent
+        data.update(name=parent.fullname, dob=_dob(parent), phone=parent.phone or '+91 9876543210',
+                    id_no='PRT-001', photo_url=parent.profile_picture or '', position='Parent')
+    return data
+
+
+# ------------------- ID CARD SHEETS -------------------
+# Print-shop imposition: several cards per A4 page, laid out row by row
+SHEET_PAGE = A4
+SHEET_MARGIN = 24
+SHEET_GUTTER = 8
+SHEET_COLUMNS = 3
+SHEET_ROWS = 3
+CUT_GUIDE_COLOR = Color(0.7, 0.7, 0.7)
+
+
+def sheet_slots(columns=SHEET_COLUMNS, rows=SHEET_ROWS):
+    """
+    Card scale and lower-left corners of every slot on one sheet, filled
+    left to right from the top row. The grid is centred on the page.
+    """
+    page_width, page_height = SHEET_PAGE
+    cell_width = (page_width - 2*SHEET_MARGIN - (columns - 1)*SHEET_GUTTER) / columns
+    cell_height = (page_height - 2*SHEET_MARGIN - (rows - 1)*SHEET_GUTTER) / rows
+    scale = min(cell_width / CARD_WIDTH, cell_height / CARD_HEIGHT)
+    card_width, card_height = CARD_WIDTH * scale, CARD_HEIGHT * scale
+    left = (page_width - columns*card_width - (columns - 1)*SHEET_GUTTER) / 2
+    top = (page_height + rows*card_height + (rows - 1)*SHEET_GUTTER) / 2
+    slots = [
+        (left + col*(card_width + SHEET_GUTTER), top - (row + 1)*card_height - row*SHEET_GUTTER)
+        for row in range(rows) for col in range(columns)
+    ]
+    return scale, slots
+
+
+def render_id_card_sheets(cards, out, columns=SHEET_COLUMNS, rows=SHEET_ROWS):
+    """
+    Impose ``(data, photo)`` pairs onto A4 sheets with ``draw_id_card`` and
+    write a single PDF to the file-like ``out``. Returns the card count.
+    """
+    scale, slots = sheet_slots(columns, rows)
+    card_width, card_height = CARD_WIDTH * scale, CARD_HEIGHT * scale
+    c = canvas.Canvas(out, pagesize=SHEET_PAGE)
+    count = 0
+    for data, photo in cards:
+        if count and count % len(slots) == 0:
+            c.showPage()
+        x, y = slots[count % len(slots)]
+        draw_id_card(c, data, photo, x=x, y=y, scale=scale, use_form=True)
+        # Hairline cut guide around the card
+        c.setStrokeColor(CUT_GUIDE_COLOR)
+        c.setLineWidth(0.25)
+        c.rect(x, y, card_width, card_height, stroke=1, fill=0)
+        count += 1
+    c.save()
+    return count
+
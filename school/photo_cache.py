@@ -0,0 +1,301 @@
+"""
+Two-tier cache for profile photos fetched over HTTP (MinIO public URLs).
+
+- Memory: a per-process LRU of photo bytes, bounded by total size. Entries
+  younger than PHOTO_CACHE_MAX_AGE are served without touching the network.
+- Disk: a directory shared by every worker process. Photo bytes are stored
+  once per content hash under ``blobs/`` and each URL has a small index
+  entry under ``urls/`` holding its ETag / Last-Modified and blob hash. The
+  directory is bounded by size; least recently used blobs are evicted
+  together with the index entries pointing at them.
+
+Older entries are revalidated with a conditional GET, so an unchanged photo
+costs a 304 instead of a download. If the server cannot be reached, the
+cached copy is served. Counters for every outcome are kept per process.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import requests
+from django.conf import settings
+
+
+PHOTO_FETCH_TIMEOUT = 10
+
+
+def normalize_photo_url(url):
+    """Absolute URL for a stored profile picture, or None for placeholders."""
+    if not url or not url.strip() or url == 'profile.jpg':
+        return None
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _atomic_write(path, data):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class PhotoCache:
+    """Memory + disk cache of photo bytes keyed by URL and validated by ETag."""
+
+    def __init__(self, directory, max_disk_bytes, max_memory_bytes, max_age):
+        self.directory = str(directory)
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # url -> entry dict
+        self._memory_bytes = 0
+        self._disk_bytes = None  # estimate, measured on first write
+        self.counters = Counter()
+        os.makedirs(os.path.join(self.directory, 'blobs'), exist_ok=True)
+        os.makedirs(os.path.join(self.directory, 'urls'), exist_ok=True)
+
+    # ------------------- public API -------------------
+    def get(self, url):
+        """Photo bytes for ``url``, or None if it is unavailable."""
+        url = normalize_photo_url(url)
+        if url is None:
+            return None
+
+        entry = self._memory_get(url)
+        if entry is not None and time.time() - entry['validated_at'] < self.max_age:
+            self._count('memory_hits')
+            return entry['content']
+        if entry is None:
+            entry = self._disk_get(url)
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            response = requests.get(url, headers=headers, timeout=PHOTO_FETCH_TIMEOUT)
+        except requests.RequestException:
+            if entry is not None:
+                # Storage unreachable: the cached copy is better than nothing
+                self._count('stale_hits')
+                return entry['content']
+            self._count('errors')
+            return None
+
+        if response.status_code == 304 and entry is not None:
+            self._count('revalidated')
+            entry['validated_at'] = time.time()
+            self._memory_put(url, entry)
+            return entry['content']
+        if response.status_code != 200:
+            self._count('errors')
+            return None
+
+        self._count('misses' if entry is None else 'changed')
+        entry = {
+            'content': response.content,
+            'etag': response.headers.get('ETag', ''),
+            'last_modified': response.headers.get('Last-Modified', ''),
+            'validated_at': time.time(),
+        }
+        self._memory_put(url, entry)
+        self._disk_put(url, entry)
+        return entry['content']
+
+    def stats(self):
+        """Hit/miss counters for this process plus current tier sizes."""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_bytes
+            stats['disk_bytes'] = self._disk_bytes
+        lookups = sum(stats.get(key, 0) for key in ('memory_hits', 'revalidated', 'stale_hits', 'misses', 'changed'))
+        hits = sum(stats.get(key, 0) for key in ('memory_hits', 'revalidated', 'stale_hits'))
+        stats['hit_rate'] = round(hits / lookups, 4) if lookups else None
+        return stats
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    # ------------------- memory tier -------------------
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def _memory_get(self, url):
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is not None:
+                self._memory.move_to_end(url)
+            return entry
+
+    def _memory_put(self, url, entry):
+        size = len(entry['content'])
+        if size > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(url, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous['content'])
+            self._memory[url] = entry
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted['content'])
+                self.counters['memory_evictions'] += 1
+
+    # ------------------- disk tier -------------------
+    def _index_path(self, url):
+        return os.path.join(self.directory, 'urls', _sha256(url.encode('utf-8')) + '.json')
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, 'blobs', digest)
+
+    def _disk_get(self, url):
+        try:
+            with open(self._index_path(url), 'r', encoding='utf-8') as index_file:
+                index = json.load(index_file)
+            blob_path = self._blob_path(index['blob'])
+            with open(blob_path, 'rb') as blob:
+                content = blob.read()
+        except FileNotFoundError:
+            # Blob evicted (possibly by another process): drop its index entry
+            self._remove_index(url)
+            return None
+        except (OSError, ValueError, KeyError):
+            return None
+        if _sha256(content) != index['blob']:
+            return None
+        os.utime(blob_path)  # recently used, for eviction
+        self._count('disk_hits')
+        # Loaded entries are always revalidated before use
+        return {'content': content, 'etag': index.get('etag', ''),
+                'last_modified': index.get('last_modified', ''), 'validated_at': 0}
+
+    def _remove_index(self, url):
+        try:
+            os.remove(self._index_path(url))
+        except OSError:
+            pass
+
+    def _disk_put(self, url, entry):
+        digest = _sha256(entry['content'])
+        blob_path = self._blob_path(digest)
+        try:
+            if not os.path.exists(blob_path):
+                _atomic_write(blob_path, entry['content'])
+                self._track_disk(len(entry['content']))
+            index = {'url': url, 'blob': digest, 'etag': entry['etag'], 'last_modified': entry['last_modified']}
+            _atomic_write(self._index_path(url), json.dumps(index).encode('utf-8'))
+        except OSError:
+            self._count('disk_errors')
+
+    def _track_disk(self, added):
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._measure_disk()
+            else:
+                self._disk_bytes += added
+            over = self._disk_bytes > self.max_disk_bytes
+        if over:
+            self._evict_disk()
+
+    def _measure_disk(self):
+        blobs = os.path.join(self.directory, 'blobs')
+        total = 0
+        for entry in os.scandir(blobs):
+            if entry.is_file():
+                total += entry.stat().st_size
+        return total
+
+    def _evict_disk(self):
+        """Delete least recently used blobs until the directory is at 90% of its limit."""
+        blobs = []
+        for entry in os.scandir(os.path.join(self.directory, 'blobs')):
+            if entry.is_file():
+                stat = entry.stat()
+                blobs.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in blobs)
+        target = self.max_disk_bytes * 0.9
+        kept = {os.path.basename(path) for _, _, path in blobs}
+        evicted = 0
+        for _, size, path in sorted(blobs):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            kept.discard(os.path.basename(path))
+            total -= size
+            evicted += 1
+        index_evictions = self._evict_index(kept)
+        with self._lock:
+            self._disk_bytes = total
+            self.counters['disk_evictions'] += evicted
+            self.counters['index_evictions'] += index_evictions
+
+    def _evict_index(self, blobs):
+        """Delete index entries whose blob is not among ``blobs``; returns how many."""
+        removed = 0
+        for entry in os.scandir(os.path.join(self.directory, 'urls')):
+            if not entry.is_file() or not entry.name.endswith('.json'):
+                continue
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as index_file:
+                    blob = json.load(index_file).get('blob')
+            except (OSError, ValueError, AttributeError):
+                blob = None
+            # A blob written by another process since the scan is still live
+            if blob in blobs or (blob and os.path.exists(self._blob_path(blob))):
+                continue
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+            removed += 1
+        return removed
+
+
+_photo_cache = None
+_photo_cache_lock = threading.Lock()
+
+
+def get_photo_cache():
+    """The process-wide PhotoCache, configured from settings."""
+    global _photo_cache
+    if _photo_cache is None:
+        with _photo_cache_lock:
+            if _photo_cache is None:
+                _photo_cache = PhotoCache(
+                    settings.PHOTO_CACHE_DIR,
+                    settings.PHOTO_CACHE_MAX_BYTES,
+                    settings.PHOTO_CACHE_MEMORY_BYTES,
+                    settings.PHOTO_CACHE_MAX_AGE,
+                )
+    return _photo_cache
+
+
+def fetch_photo(url):
+    """Photo bytes for ``url`` through the shared cache, or None."""
+    return get_photo_cache().get(url)
@@ -0,0 +1,315 @@
+"""
+Maintenance of the ClassRanking materialization.
+
+Rankings are kept per (grade level, exam_type, term) slice, because
+level-wide ranks depend on every section of the level. Grade signals queue
+a RankingRefresh row for the student whose grades changed, in the same
+transaction as the change, so a refresh is never lost to a crash or a
+restart. The refresh_rankings worker claims due rows the way drain_outbox
+claims mail, coalesces them into one refresh per slice and deletes them
+once the slice is re-ranked. Only the marked students' totals are
+re-aggregated and only ranking rows whose rank or percentile moved are
+written. Bulk changes mark the whole slice, which is then rebuilt from the
+grades.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import ClassRanking, Grade, RankingRefresh, Student
+
+
+logger = logging.getLogger(__name__)
+
+# Above this many changed students in one slice, rebuild the slice instead
+INCREMENTAL_MAX_STUDENTS = 50
+
+RANK_FIELDS = ('rank', 'percentile', 'level_rank', 'level_percentile')
+
+# Claimed queue rows are leased for this long; failed slices are retried
+# after RETRY_SECONDS
+LEASE_SECONDS = 300
+RETRY_SECONDS = 60
+
+
+def _dense_ranks_and_percentiles(percentages):
+    """
+    Dense rank (1 = best) and percentile (share of the group scoring at or
+    below each student) for one group of percentages.
+    """
+    distinct, inverse = np.unique(-percentages, return_inverse=True)
+    ranks = inverse + 1
+    ordered = np.sort(percentages)
+    at_or_below = np.searchsorted(ordered, percentages, side='right')
+    percentiles = at_or_below * 100.0 / len(percentages)
+    return ranks, percentiles
+
+
+def _percentages(obtained, maximum):
+    percentages = np.zeros(len(obtained))
+    np.divide(obtained * 100, maximum, out=percentages, where=maximum > 0)
+    return np.round(percentages, 2)
+
+
+def _rank_slice(percentages, section_ids):
+    """``{field: values}`` for RANK_FIELDS: section-wide and level-wide ranks and percentiles."""
+    level_ranks, level_percentiles = _dense_ranks_and_percentiles(percentages)
+    ranks = np.zeros(len(percentages), dtype=np.int64)
+    percentiles = np.zeros(len(percentages))
+    for section in np.unique(section_ids):
+        members = section_ids == section
+        ranks[members], percentiles[members] = _dense_ranks_and_percentiles(percentages[members])
+    return {'rank': ranks, 'percentile': percentiles, 'level_rank': level_ranks, 'level_percentile': level_percentiles}
+
+
+def _rank_values(ranked, i):
+    return {
+        'rank': int(ranked['rank'][i]),
+        'percentile': Decimal(f"{ranked['percentile'][i]:.2f}"),
+        'level_rank': int(ranked['level_rank'][i]),
+        'level_percentile': Decimal(f"{ranked['level_percentile'][i]:.2f}"),
+    }
+
+
+def _slice_totals(class_name, exam_type, term, student_ids=None):
+    """``[(student, class_id, obtained, maximum)]`` for a slice, optionally for some students only."""
+    grades = Grade.objects.filter(student__class_id__class_name=class_name, exam_type=exam_type, term=term)
+    if student_ids is not None:
+        grades = grades.filter(student__in=student_ids)
+    return list(
+        grades.values_list('student', 'student__class_id').annotate(
+            obtained=Sum('marks_obtained'), maximum=Sum('total_marks')
+        ).order_by()
+    )
+
+
+def _upsert_rankings(rankings):
+    ClassRanking.objects.bulk_create(
+        rankings,
+        update_conflicts=True,
+        unique_fields=['student', 'exam_type', 'term'],
+        update_fields=['class_id', 'class_name', 'total_obtained', 'total_max', 'percentage',
+                       'rank', 'percentile', 'level_rank', 'level_percentile', 'updated_at'],
+    )
+
+
+def recompute_level_rankings(class_name, exam_type, term):
+    """Rebuild every ClassRanking row of one grade-level slice."""
+    totals = _slice_totals(class_name, exam_type, term)
+
+    with transaction.atomic():
+        stale = ClassRanking.objects.filter(class_name=class_name, exam_type=exam_type, term=term)
+        if not totals:
+            stale.delete()
+            return 0
+
+        percentages = _percentages(
+            np.array([float(row[2] or 0) for row in totals]), np.array([float(row[3] or 0) for row in totals])
+        )
+        ranked = _rank_slice(percentages, np.array([row[1] for row in totals]))
+        rankings = [
+            ClassRanking(
+                student_id=row[0],
+                class_id_id=row[1],
+                class_name=class_name,
+                exam_type=exam_type,
+                term=term,
+                total_obtained=row[2] or Decimal('0'),
+                total_max=row[3] or Decimal('0'),
+                percentage=Decimal(f"{percentages[i]:.2f}"),
+                **_rank_values(ranked, i),
+            )
+            for i, row in enumerate(totals)
+        ]
+        _upsert_rankings(rankings)
+        # Students who left the level (or lost all grades in the slice)
+        stale.exclude(student__in=[row[0] for row in totals]).delete()
+    return len(rankings)
+
+
+def update_student_rankings(class_name, exam_type, term, student_ids):
+    """
+    Re-rank one slice after the grades of ``student_ids`` changed. Only
+    those students' totals are aggregated; the rest of the slice is read
+    from ClassRanking, and only rows whose values change are written.
+    Returns the number of rows written or deleted.
+    """
+    student_ids = set(student_ids)
+    totals = {row[0]: row for row in _slice_totals(class_name, exam_type, term, student_ids)}
+
+    with transaction.atomic():
+        # Locking the slice serializes concurrent re-ranks of it (PostgreSQL)
+        stored = list(
+            ClassRanking.objects.select_for_update()
+            .filter(class_name=class_name, exam_type=exam_type, term=term)
+            .values_list('id', 'student_id', 'class_id', 'percentage', *RANK_FIELDS)
+        )
+        if not stored:
+            # Nothing materialized yet; the others' totals are not known here
+            return recompute_level_rankings(class_name, exam_type, term)
+
+        kept = [row for row in stored if row[1] not in student_ids]
+        changed = [totals[student] for student in sorted(totals)]
+        percentages = np.concatenate([
+            np.array([float(row[3]) for row in kept]),
+            _percentages(np.array([float(row[2] or 0) for row in changed]),
+                         np.array([float(row[3] or 0) for row in changed])),
+        ])
+        section_ids = np.array([row[2] for row in kept] + [row[1] for row in changed])
+        ranked = _rank_slice(percentages, section_ids) if len(percentages) else None
+
+        now = timezone.now()
+        moved = []
+        for i, row in enumerate(kept):
+            values = _rank_values(ranked, i)
+            if tuple(values[field] for field in RANK_FIELDS) != row[4:]:
+                moved.append(ClassRanking(id=row[0], updated_at=now, **values))
+        if len(moved) > len(kept) // 2:
+            # A new student shifts every percentile; one upsert of the
+            # slice is cheaper than updating most rows one by one
+            return recompute_level_rankings(class_name, exam_type, term)
+        ClassRanking.objects.bulk_update(moved, list(RANK_FIELDS) + ['updated_at'], batch_size=500)
+
+        _upsert_rankings([
+            ClassRanking(
+                student_id=row[0],
+                class_id_id=row[1],
+                class_name=class_name,
+                exam_type=exam_type,
+                term=term,
+                total_obtained=row[2] or Decimal('0'),
+                total_max=row[3] or Decimal('0'),
+                percentage=Decimal(f"{percentages[len(kept) + i]:.2f}"),
+                **_rank_values(ranked, len(kept) + i),
+            )
+            for i, row in enumerate(changed)
+        ])
+        # Changed students with no grades left in the slice
+        dropped, _ = ClassRanking.objects.filter(
+            class_name=class_name, exam_type=exam_type, term=term,
+            student__in=student_ids - set(totals),
+        ).delete()
+    return len(moved) + len(changed) + dropped
+
+
+def _merge(slices, key, student_ids):
+    """Add ``student_ids`` (None for the whole slice) to ``slices[key]``."""
+    if student_ids is None or slices.get(key, set()) is None:
+        slices[key] = None
+    else:
+        slices.setdefault(key, set()).update(student_ids)
+
+
+def _refresh_slice(key, student_ids):
+    if student_ids is None or len(student_ids) > INCREMENTAL_MAX_STUDENTS:
+        recompute_level_rankings(*key)
+    else:
+        update_student_rankings(*key, student_ids)
+
+
+def refresh_slices(slices):
+    """
+    Refresh ``{slice: student_ids}``. Returns the slices that failed, which
+    are logged and left for the caller to retry.
+    """
+    failed = {}
+    for key, student_ids in slices.items():
+        try:
+            _refresh_slice(key, student_ids)
+        except Exception:
+            logger.exception("Could not refresh class rankings for %s", key)
+            failed[key] = student_ids
+    return failed
+
+
+def claim_dirty_slices(limit):
+    """
+    Lease up to ``limit`` due RankingRefresh rows to this worker. Returns
+    ``(slices, row_ids)``: ``{slice: student_ids}`` (None for a whole
+    slice) and ``{slice: [queue row ids]}``.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            RankingRefresh.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now)
+            .order_by('id').values_list('id', 'class_name', 'exam_type', 'term', 'student_id')[:limit]
+        )
+        RankingRefresh.objects.filter(id__in=[row[0] for row in rows]).update(
+            next_attempt_at=now + timedelta(seconds=LEASE_SECONDS)
+        )
+    slices, row_ids = {}, {}
+    for row_id, class_name, exam_type, term, student_id in rows:
+        key = (class_name, exam_type, term)
+        row_ids.setdefault(key, []).append(row_id)
+        _merge(slices, key, {student_id} if student_id else None)
+    return slices, row_ids
+
+
+def drain_ranking_queue(batch_size=500):
+    """
+    Refresh every due queued slice, ``batch_size`` queue rows at a time.
+    Refreshed rows are deleted; failed slices are retried after
+    RETRY_SECONDS. Returns ``(refreshed, failed)`` slice counts.
+    """
+    refreshed = failed = 0
+    while True:
+        slices, row_ids = claim_dirty_slices(batch_size)
+        if not slices:
+            return refreshed, failed
+        failures = refresh_slices(slices)
+        RankingRefresh.objects.filter(
+            id__in=[row_id for key, ids in row_ids.items() if key not in failures for row_id in ids]
+        ).delete()
+        if failures:
+            RankingRefresh.objects.filter(id__in=[row_id for key in failures for row_id in row_ids[key]]).update(
+                next_attempt_at=timezone.now() + timedelta(seconds=RETRY_SECONDS)
+            )
+        refreshed += len(slices) - len(failures)
+        failed += len(failures)
+
+
+def _drain_inline():
+    drain_ranking_queue()
+
+
+def mark_slice_dirty(class_name, exam_type, term, student_id=None):
+    """
+    Queue a refresh of one grade-level slice: for the given student only,
+    or for the whole slice when ``student_id`` is None. The queue row
+    commits or rolls back with the current transaction; the
+    refresh_rankings worker coalesces repeated marks into one refresh per
+    slice. With RANKING_REFRESH_INLINE the queue is drained right after
+    the commit instead.
+    """
+    if not class_name or not exam_type or not term:
+        return
+    RankingRefresh.objects.create(class_name=class_name, exam_type=exam_type, term=term, student_id=student_id or '')
+    if settings.RANKING_REFRESH_INLINE:
+        # Ranking errors are logged rather than failing the committed request
+        transaction.on_commit(_drain_inline, robust=True)
+
+
+def mark_grade_dirty(grade, exam_type=None, term=None):
+    """Mark a grade's student in the slice the grade belongs to (or belonged to, via the overrides)."""
+    class_name = Student.objects.filter(pk=grade.student_id).values_list(
+        'class_id__class_name', flat=True
+    ).first()
+    mark_slice_dirty(class_name, exam_type or grade.exam_type, term or grade.term, grade.student_id)
+
+
+def mark_student_moved(student_id, previous_class_name, class_name):
+    """
+    Mark a student who changed class in every slice they have grades in,
+    under both the grade level they left and the one they joined.
+    """
+    slices = Grade.objects.filter(student=student_id).values_list('exam_type', 'term').distinct().order_by()
+    for exam_type, term in slices:
+        for level in {previous_class_name, class_name}:
+            mark_slice_dirty(level, exam_type, term, student_id)
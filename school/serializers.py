@@ -1,16 +1,30 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from .models import (
     User, Student, Teacher, Principal, Management, Admin, Parent,
     Department, Subject, Attendance, StudentAttendance, Grade, FeeStructure,
     FeePayment, Timetable, FormerMember, Document, Notice, Issue, Holiday, Award,
-    Assignment, SubmittedAssignment, Leave, Task, Project, Program, Activity, Report, FinanceTransaction, TransportDetails, Class, IDCard, Exam, MCQ_Answers
+    Assignment, SubmittedAssignment, Leave, Task, Project, Program, Activity, Report, FinanceTransaction, TransportDetails, Class, IDCard, Exam, Question, QuestionResponse, ClassRanking
 )
+from .grading import apply_exam_result_delta, refresh_exam_question_counts
+from .images import profile_picture_variants
 
 UserModel = get_user_model()
 
 
+class ProfilePictureVariantsField(serializers.ReadOnlyField):
+    """Resized variant URLs of a stored profile picture (see images.profile_picture_variants)."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'profile_picture')
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return profile_picture_variants(value)
+
+
 # ------------------- USER SERIALIZERS -------------------
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -77,6 +91,7 @@ class StudentSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(source='email.email', read_only=True)
     # class_name and section are direct fields now
     parent_name = serializers.CharField(source='parent.fullname', read_only=True, allow_null=True)
+    profile_picture_variants = ProfilePictureVariantsField()
 
     class Meta:
         model = Student
@@ -86,6 +101,7 @@ class StudentSerializer(serializers.ModelSerializer):
 class StudentCreateSerializer(serializers.ModelSerializer):
     # Override profile_picture to accept both files and URLs
     profile_picture = serializers.CharField(required=False, allow_blank=True)
+    profile_picture_variants = ProfilePictureVariantsField()
     
     class Meta:
         model = Student
@@ -119,6 +135,7 @@ class TeacherSerializer(serializers.ModelSerializer):
     department_name = serializers.CharField(source='department.department_name', read_only=True, allow_null=True)
     subject_list = SubjectSerializer(source='subjects', many=True, read_only=True)
     class_name = serializers.CharField(source='class_id.class_name', read_only=True, allow_null=True)
+    profile_picture_variants = ProfilePictureVariantsField()
 
     class Meta:
         model = Teacher
@@ -127,6 +144,7 @@ class TeacherSerializer(serializers.ModelSerializer):
 
 class TeacherCreateSerializer(serializers.ModelSerializer):
     subjects = serializers.PrimaryKeyRelatedField(queryset=Subject.objects.all(), many=True, required=False)
+    profile_picture_variants = ProfilePictureVariantsField()
     
     class Meta:
         model = Teacher
@@ -155,6 +173,7 @@ class TeacherCreateSerializer(serializers.ModelSerializer):
 # ------------------- PRINCIPAL SERIALIZER -------------------
 class PrincipalSerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source='email', read_only=True)
+    profile_picture_variants = ProfilePictureVariantsField()
 
     class Meta:
         model = Principal
@@ -165,6 +184,7 @@ class PrincipalSerializer(serializers.ModelSerializer):
 class ManagementSerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source='email', read_only=True)
     department_name = serializers.CharField(source='department.department_name', read_only=True, allow_null=True)
+    profile_picture_variants = ProfilePictureVariantsField()
 
     class Meta:
         model = Management
@@ -174,6 +194,7 @@ class ManagementSerializer(serializers.ModelSerializer):
 # ------------------- ADMIN SERIALIZER -------------------
 class AdminSerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source='email', read_only=True)
+    profile_picture_variants = ProfilePictureVariantsField()
 
     class Meta:
         model = Admin
@@ -184,6 +205,7 @@ class AdminSerializer(serializers.ModelSerializer):
 class ParentSerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source='email', read_only=True)
     children_list = StudentSerializer(source='children', many=True, read_only=True)
+    profile_picture_variants = ProfilePictureVariantsField()
 
     class Meta:
         model = Parent
@@ -320,6 +342,22 @@ class GradeCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Grade
         fields = '__all__'
+        extra_kwargs = {
+            'term': {'read_only': True},
+            # Part of the unique key, but undated grades are still allowed
+            'exam_date': {'required': False, 'default': None},
+        }
+
+
+# ------------------- CLASS RANKING SERIALIZER -------------------
+class ClassRankingSerializer(serializers.ModelSerializer):
+    student_name = serializers.CharField(source='student.fullname', read_only=True)
+    student_id = serializers.CharField(source='student.student_id', read_only=True)
+    section = serializers.CharField(source='class_id.sec', read_only=True)
+
+    class Meta:
+        model = ClassRanking
+        fields = '__all__'
 
 
 # ------------------- FEE STRUCTURE SERIALIZER -------------------
@@ -366,6 +404,8 @@ class TimetableCreateSerializer(serializers.ModelSerializer):
 
 # ------------------- FORMER MEMBER SERIALIZER -------------------
 class FormerMemberSerializer(serializers.ModelSerializer):
+    profile_picture_variants = ProfilePictureVariantsField()
+
     class Meta:
         model = FormerMember
         fields = '__all__'
@@ -796,14 +836,14 @@ class ExamSerializer(serializers.ModelSerializer):
     section = serializers.CharField(source='class_id.sec', read_only=True)
     subject_name = serializers.CharField(source='sub.subject_name', read_only=True)
     teacher_name = serializers.CharField(source='sub_teacher.fullname', read_only=True)
-    sub_teacher_email = serializers.EmailField(source='sub_teacher.email.email', read_only=True)
+    sub_teacher_email = serializers.EmailField(source='sub_teacher_id', read_only=True)
     mcq_answers = serializers.SerializerMethodField()
     
     def get_mcq_answers(self, obj):
-        # Import here to avoid circular imports
-        from .models import MCQ_Answers
-        mcq_answers = MCQ_Answers.objects.filter(exam=obj, student__isnull=True)  # Only template questions
-        return MCQAnswersSerializer(mcq_answers, many=True).data
+        # Template questions, in the legacy MCQ answer shape. exam_details is
+        # built once here instead of once per question.
+        context = {'exam_details': exam_details(obj)}
+        return QuestionSerializer(obj.questions.all(), many=True, context=context).data
     
     class Meta:
         model = Exam
@@ -837,17 +877,14 @@ class ExamCreateSerializer(serializers.ModelSerializer):
         # Extract questions data
         questions_data = validated_data.pop('questions', [])
         
-        # Create the exam
-        exam = Exam.objects.create(**validated_data)
-        
-        # Create MCQ records for each question
-        # Initially, these won't have student answers
-        for question_data in questions_data:
-            MCQ_Answers.objects.create(exam=exam, **question_data)
+        # Create the exam and its questions together
+        with transaction.atomic():
+            exam = Exam.objects.create(**validated_data)
+            create_questions(exam, [_question_fields(question_data) for question_data in questions_data])
             
         # If no questions were provided, create a default one
         if not questions_data:
-            MCQ_Answers.objects.create(
+            Question.objects.create(
                 exam=exam,
                 question="Default question - please update",
                 option_1="Option 1",
@@ -861,56 +898,157 @@ class ExamCreateSerializer(serializers.ModelSerializer):
 
 
 # ------------------- MCQ ANSWERS SERIALIZERS -------------------
-class MCQAnswersSerializer(serializers.ModelSerializer):
+# Questions and responses are stored separately, but the MCQ endpoints keep
+# the original one-row-per-answer shape: id, question, option_1..4,
+# correct_option, student_answer, result, exam_details, student_email.
+QUESTION_FIELDS = ('question', 'option_1', 'option_2', 'option_3', 'option_4', 'correct_option')
+
+
+def _question_fields(data):
+    """Keep only the question columns of an incoming question dict."""
+    return {field: data[field] for field in QUESTION_FIELDS if field in data}
+
+
+def create_questions(exam, rows, batch_size=500):
+    """
+    Insert question dicts for an exam with a single bulk insert and update
+    the question count of the exam's results.
+    """
+    with transaction.atomic():
+        questions = Question.objects.bulk_create(
+            [Question(exam=exam, **row) for row in rows], batch_size=batch_size
+        )
+        if questions:
+            refresh_exam_question_counts(exam.id)
+    return questions
+
+
+def exam_details(exam):
+    """Compact exam summary embedded in every MCQ row."""
+    if exam is None:
+        return None
+    return {
+        'id': exam.id,
+        'title': exam.title,
+        'class_id': exam.class_id_id,
+        'sub': exam.sub_id,
+        'sub_teacher_email': exam.sub_teacher_id,
+    }
+
+
+class QuestionSerializer(serializers.ModelSerializer):
+    """A template question; student fields are always empty."""
+    student_answer = serializers.SerializerMethodField()
+    result = serializers.SerializerMethodField()
     exam_details = serializers.SerializerMethodField()
-    student_email = serializers.EmailField(source='student.email', read_only=True)
-    
+    student_email = serializers.SerializerMethodField()
+
     class Meta:
-        model = MCQ_Answers
+        model = Question
         fields = ['id', 'question', 'option_1', 'option_2', 'option_3', 'option_4', 'correct_option', 'student_answer', 'result', 'exam_details', 'student_email']
-        read_only_fields = ['exam']  # Exclude exam field from serialization to avoid circular reference
-    
+
+    def get_student_answer(self, obj):
+        return None
+
+    def get_result(self, obj):
+        return False
+
     def get_exam_details(self, obj):
-        # Simplified exam details to avoid circular reference
-        if obj.exam:
-            return {
-                'id': obj.exam.id,
-                'title': obj.exam.title,
-                'class_id': obj.exam.class_id.id if obj.exam.class_id else None,
-                'sub': obj.exam.sub.id if obj.exam.sub else None,
-                'sub_teacher_email': obj.exam.sub_teacher.email.email if obj.exam.sub_teacher and obj.exam.sub_teacher.email else None
-            }
+        if 'exam_details' in self.context:
+            return self.context['exam_details']
+        return exam_details(obj.exam)
+
+    def get_student_email(self, obj):
         return None
 
 
-class MCQAnswersCreateSerializer(serializers.ModelSerializer):
+class QuestionImportSerializer(serializers.ModelSerializer):
+    """Validates one imported question row."""
+
     class Meta:
-        model = MCQ_Answers
-        fields = ['id', 'exam', 'student', 'question', 'option_1', 'option_2', 'option_3', 'option_4', 'correct_option', 'student_answer']
-        read_only_fields = ('result',)
-    
+        model = Question
+        fields = list(QUESTION_FIELDS)
+
+
+class QuestionResponseSerializer(serializers.ModelSerializer):
+    """A student's answer, with the question it answers inlined."""
+    question = serializers.CharField(source='question.question', read_only=True)
+    option_1 = serializers.CharField(source='question.option_1', read_only=True)
+    option_2 = serializers.CharField(source='question.option_2', read_only=True)
+    option_3 = serializers.CharField(source='question.option_3', read_only=True)
+    option_4 = serializers.CharField(source='question.option_4', read_only=True)
+    correct_option = serializers.IntegerField(source='question.correct_option', read_only=True)
+    student_answer = serializers.IntegerField(source='answer', read_only=True)
+    exam_details = serializers.SerializerMethodField()
+    student_email = serializers.CharField(source='student_id', read_only=True)
+
+    class Meta:
+        model = QuestionResponse
+        fields = ['id', 'question', 'option_1', 'option_2', 'option_3', 'option_4', 'correct_option', 'student_answer', 'result', 'exam_details', 'student_email']
+
+    def get_exam_details(self, obj):
+        return exam_details(obj.exam)
+
+
+def serialize_mcq_rows(rows):
+    """Serialize a mixed list of Question and QuestionResponse objects."""
+    return [
+        (QuestionResponseSerializer if isinstance(row, QuestionResponse) else QuestionSerializer)(row).data
+        for row in rows
+    ]
+
+
+class MCQAnswersCreateSerializer(serializers.Serializer):
+    """
+    Legacy single-row MCQ write. Without a student it adds a question to the
+    exam; with a student it records (or updates) that student's answer to the
+    exam question with the same text, which must exist.
+    """
+    id = serializers.IntegerField(read_only=True)
+    exam = serializers.PrimaryKeyRelatedField(queryset=Exam.objects.all())
+    student = serializers.PrimaryKeyRelatedField(queryset=Student.objects.all(), required=False, allow_null=True)
+    question = serializers.CharField()
+    option_1 = serializers.CharField()
+    option_2 = serializers.CharField()
+    option_3 = serializers.CharField()
+    option_4 = serializers.CharField()
+    correct_option = serializers.ChoiceField(choices=[1, 2, 3, 4])
+    student_answer = serializers.ChoiceField(choices=[1, 2, 3, 4], required=False, allow_null=True)
+
     def to_representation(self, instance):
-        # Use the regular serializer for output to include nested data
-        return MCQAnswersSerializer(instance).data
-    
-    def validate(self, attrs):
-        # Auto-set result field based on student_answer and correct_option comparison
-        student_answer = attrs.get('student_answer')
-        
-        # For partial updates, we might not have correct_option in attrs
-        if 'correct_option' in attrs:
-            correct_option = attrs.get('correct_option')
-        elif hasattr(self, 'instance') and self.instance:
-            correct_option = self.instance.correct_option  # pyright: ignore[reportAttributeAccessIssue]
-        else:
-            correct_option = None
-        
-        if student_answer is not None and correct_option is not None:
-            attrs['result'] = (student_answer == correct_option)
-        else:
-            attrs['result'] = False
-            
-        return attrs
+        # Use the read serializers for output to include nested data
+        if isinstance(instance, QuestionResponse):
+            return QuestionResponseSerializer(instance).data
+        return QuestionSerializer(instance).data
+
+    def create(self, validated_data):
+        exam = validated_data['exam']
+        student = validated_data.get('student')
+        question = Question.objects.filter(exam=exam, question=validated_data['question']).first()
+        if student is None:
+            if question is None:
+                with transaction.atomic():
+                    question = Question.objects.create(exam=exam, **_question_fields(validated_data))
+                    refresh_exam_question_counts(exam.id)
+            return question
+        if question is None:
+            # Students answer the exam's questions; they do not add to them
+            raise serializers.ValidationError({'question': 'No such question in this exam.'})
+        student_answer = validated_data.get('student_answer')
+        response = QuestionResponse.objects.filter(student=student, question=question).first()
+        if response is None:
+            response = QuestionResponse(exam=exam, student=student, question=question)
+        previous_answer, previous_result = response.answer, response.result
+        response.answer = student_answer
+        response.result = student_answer is not None and student_answer == question.correct_option
+        with transaction.atomic():
+            response.save()
+            apply_exam_result_delta(
+                exam.id, student.pk,
+                correct=int(response.result) - int(previous_result),
+                answered=int(student_answer is not None) - int(previous_answer is not None),
+            )
+        return response
 
 
 # ------------------- PASSWORD RESET SERIALIZERS -------------------
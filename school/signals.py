@@ -1,9 +1,10 @@
-from django.db.models.signals import post_save, post_delete, pre_delete
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
 from django.db import transaction
 from .models import (
-    User, Student, Teacher, Principal, Management, Admin, Parent, FormerMember
+    User, Student, Teacher, Principal, Management, Admin, Parent, FormerMember, Grade
 )
+from .rankings import mark_grade_dirty, mark_student_moved
 
 
 # ===============================================================
@@ -324,3 +325,50 @@ def handle_user_approval_change(sender, instance, created, update_fields, **kwar
             # User approval was revoked, clean up role records
             with transaction.atomic():
                 _cleanup_role_records(instance.email)
+
+
+# ===============================================================
+# CLASS RANKINGS
+# ===============================================================
+# Any change to a grade invalidates the ranking slice it belongs to
+# (and the one it moved out of, if exam_type or term changed). A student
+# changing class invalidates their slices in both grade levels.
+
+@receiver(pre_save, sender=Grade)
+def remember_grade_ranking_slice(sender, instance, **kwargs):
+    instance._previous_slice = None
+    if instance.pk:
+        instance._previous_slice = Grade.objects.filter(pk=instance.pk).values_list(
+            'exam_type', 'term'
+        ).first()
+
+
+@receiver(post_save, sender=Grade)
+def refresh_rankings_on_grade_save(sender, instance, **kwargs):
+    mark_grade_dirty(instance)
+    previous = getattr(instance, '_previous_slice', None)
+    if previous and previous != (instance.exam_type, instance.term):
+        mark_grade_dirty(instance, exam_type=previous[0], term=previous[1])
+
+
+@receiver(post_delete, sender=Grade)
+def refresh_rankings_on_grade_delete(sender, instance, **kwargs):
+    mark_grade_dirty(instance)
+
+
+@receiver(pre_save, sender=Student)
+def remember_student_class(sender, instance, **kwargs):
+    instance._previous_class = None
+    if instance.pk:
+        instance._previous_class = Student.objects.filter(pk=instance.pk).values_list(
+            'class_id', 'class_id__class_name'
+        ).first()
+
+
+@receiver(post_save, sender=Student)
+def refresh_rankings_on_class_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_class', None)
+    if created or previous is None or previous[0] == instance.class_id_id:
+        return
+    class_name = instance.class_id.class_name if instance.class_id_id else None
+    mark_student_moved(instance.pk, previous[1], class_name)
@@ -0,0 +1,499 @@
+"""
+Object storage for uploaded media.
+
+Every upload, delete and listing goes through one process-wide storage
+backend returned by ``get_storage()``:
+
+- ``MinioStorage``: a single MinIO client per process on a tuned urllib3
+  connection pool, with transport-level retries and exponential backoff.
+  Reusing the client also reuses its TLS connections and its cached
+  bucket region. It also issues presigned PUT URLs, so clients can upload
+  large files straight to the bucket.
+- ``LocalStorage`` / ``MemoryStorage``: the same API on a local directory
+  or a dict, selected with MEDIA_STORAGE_BACKEND, so uploads can be
+  benchmarked and exercised without a live MinIO.
+
+All backends build public URLs from BASE_BUCKET_URL and record per
+operation timing metrics. Bulk deletes go out in batches of up to 1,000
+keys (one multi-object delete request each on MinIO), optionally from a
+background thread.
+"""
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+
+try:
+    import certifi
+    import urllib3
+    from minio import Minio
+    from minio.deleteobjects import DeleteObject
+    from minio.error import S3Error
+except ImportError:  # pragma: no cover
+    certifi = None
+    urllib3 = None
+    Minio = None
+    DeleteObject = None
+    S3Error = None
+
+
+StoredObject = namedtuple('StoredObject', ['name', 'size', 'last_modified'])
+
+# Most keys S3 / MinIO accept in one multi-object delete request
+REMOVE_BATCH_SIZE = 1000
+
+
+# ------------------- METRICS -------------------
+class StorageMetrics:
+    """Thread-safe per-operation counters: calls, errors, bytes and latency."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops = {}
+
+    def record(self, op, seconds, nbytes=0, error=False):
+        with self._lock:
+            stats = self._ops.setdefault(op, {'count': 0, 'errors': 0, 'bytes': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            stats['count'] += 1
+            stats['errors'] += int(error)
+            stats['bytes'] += nbytes
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+    @contextmanager
+    def timed(self, op, nbytes=0):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record(op, time.perf_counter() - start, nbytes, error=True)
+            raise
+        self.record(op, time.perf_counter() - start, nbytes)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                op: {
+                    'count': stats['count'],
+                    'errors': stats['errors'],
+                    'bytes': stats['bytes'],
+                    'avg_ms': round(stats['total_seconds'] * 1000 / stats['count'], 2) if stats['count'] else 0.0,
+                    'max_ms': round(stats['max_seconds'] * 1000, 2),
+                }
+                for op, stats in self._ops.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._ops.clear()
+
+
+# ------------------- BACKENDS -------------------
+class BaseStorage:
+    """URL handling and metrics shared by every backend."""
+
+    name = 'base'
+
+    def __init__(self, base_url):
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.metrics = StorageMetrics()
+        # Send delete_urls() to a background thread instead of waiting on storage
+        self.background_deletes = False
+        self._deleter = None
+        self._deleter_lock = threading.Lock()
+
+    def url_for(self, object_name):
+        return f"{self.base_url}{object_name}"
+
+    def object_name_for_url(self, url):
+        """Object name behind one of our public URLs, or None for foreign URLs."""
+        if not url or not url.startswith(self.base_url):
+            return None
+        return url[len(self.base_url):] or None
+
+    def delete_url(self, url):
+        """Best-effort delete of the object behind ``url``; ignores foreign URLs and errors."""
+        object_name = self.object_name_for_url(url)
+        if object_name is None:
+            return False
+        try:
+            self.remove(object_name)
+        except Exception:
+            return False
+        return True
+
+    def delete_urls(self, urls, prefixes=(), background=None):
+        """
+        Best-effort delete of the objects behind ``urls`` and of everything
+        under ``prefixes``, in batches of REMOVE_BATCH_SIZE. Foreign URLs are
+        ignored. With ``background`` (default: the backend's
+        ``background_deletes``) the work is queued and this returns at once.
+        """
+        names = [name for name in (self.object_name_for_url(url) for url in urls if url) if name is not None]
+        prefixes = list(prefixes)
+        if not names and not prefixes:
+            return
+        if self.background_deletes if background is None else background:
+            self._background_deleter().submit(names, prefixes)
+            return
+        try:
+            self.remove_many(self._expand(names, prefixes))
+        except Exception:
+            pass
+
+    def _expand(self, names, prefixes):
+        """``names`` plus every object under ``prefixes``, without duplicates."""
+        names = list(names)
+        for prefix in prefixes:
+            names.extend(obj.name for obj in self.list(prefix))
+        return list(dict.fromkeys(names))
+
+    def remove_many(self, object_names):
+        """Delete objects in batches; returns the names that could not be deleted."""
+        failed = []
+        object_names = list(object_names)
+        for start in range(0, len(object_names), REMOVE_BATCH_SIZE):
+            batch = object_names[start:start + REMOVE_BATCH_SIZE]
+            try:
+                failed.extend(self._remove_batch(batch))
+            except Exception:
+                failed.extend(batch)
+        return failed
+
+    def _remove_batch(self, object_names):
+        failed = []
+        for object_name in object_names:
+            try:
+                self.remove(object_name)
+            except Exception:
+                failed.append(object_name)
+        return failed
+
+    def wait_for_deletes(self):
+        """Block until queued background deletes are done (management commands, tests)."""
+        if self._deleter is not None:
+            self._deleter.join()
+
+    def _background_deleter(self):
+        with self._deleter_lock:
+            if self._deleter is None:
+                self._deleter = _BackgroundDeleter(self)
+            return self._deleter
+
+    def put_file(self, object_name, file):
+        """Upload a Django UploadedFile and return its public URL."""
+        return self.put(object_name, file.file, file.size,
+                        content_type=getattr(file, 'content_type', None) or 'application/octet-stream')
+
+    def put(self, object_name, data, length, content_type='application/octet-stream'):
+        raise NotImplementedError
+
+    def remove(self, object_name):
+        raise NotImplementedError
+
+    def list(self, prefix='', recursive=True):
+        raise NotImplementedError
+
+    def get(self, object_name):
+        """Object bytes; raises if it does not exist."""
+        raise NotImplementedError
+
+    def iter_chunks(self, object_name, chunk_size=256 * 1024):
+        """Object bytes as a stream of chunks, for objects too large to hold in memory."""
+        content = self.get(object_name)
+        for start in range(0, len(content), chunk_size):
+            yield content[start:start + chunk_size]
+
+    def stat(self, object_name):
+        """StoredObject for ``object_name``, or None if it does not exist."""
+        raise NotImplementedError
+
+    def presign_put(self, object_name, expires):
+        """URL a client can PUT the object to directly for ``expires`` seconds."""
+        raise NotImplementedError
+
+
+class MinioStorage(BaseStorage):
+    name = 'minio'
+
+    def __init__(self, cfg, base_url):
+        super().__init__(base_url)
+        self.bucket = cfg['BUCKET_NAME']
+        retries = urllib3.Retry(
+            total=cfg.get('RETRIES', 3),
+            backoff_factor=cfg.get('RETRY_BACKOFF', 0.2),
+            status_forcelist=[500, 502, 503, 504],
+        )
+        http_client = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=cfg.get('POOL_MAXSIZE', 32),
+            block=False,
+            timeout=urllib3.Timeout(connect=cfg.get('CONNECT_TIMEOUT', 5), read=cfg.get('READ_TIMEOUT', 120)),
+            retries=retries,
+            cert_reqs='CERT_REQUIRED',
+            ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where(),
+        )
+        self.client = Minio(
+            cfg['ENDPOINT'],
+            access_key=cfg['ACCESS_KEY'],
+            secret_key=cfg['SECRET_KEY'],
+            secure=cfg.get('USE_SSL', True),
+            region=cfg.get('REGION') or None,
+            http_client=http_client,
+        )
+
+    def put(self, object_name, data, length, content_type='application/octet-stream'):
+        with self.metrics.timed('put', length):
+            self.client.put_object(self.bucket, object_name, data, length, content_type=content_type)
+        return self.url_for(object_name)
+
+    def remove(self, object_name):
+        with self.metrics.timed('remove'):
+            self.client.remove_object(self.bucket, object_name)
+
+    def _remove_batch(self, object_names):
+        # One multi-object delete request; the error iterator is lazy and
+        # must be consumed for the request to be sent
+        with self.metrics.timed('remove_batch'):
+            errors = list(self.client.remove_objects(self.bucket, [DeleteObject(name) for name in object_names]))
+        return [error.name for error in errors]
+
+    def list(self, prefix='', recursive=True):
+        # list_objects is lazy and pages while it is consumed, so time the
+        # whole listing rather than the call that creates the iterator
+        with self.metrics.timed('list'):
+            objects = list(self.client.list_objects(self.bucket, prefix=prefix or None, recursive=recursive))
+        for obj in objects:
+            if not obj.is_dir:
+                yield StoredObject(obj.object_name, obj.size, obj.last_modified)
+
+    def get(self, object_name):
+        with self.metrics.timed('get'):
+            response = self.client.get_object(self.bucket, object_name)
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
+
+    def iter_chunks(self, object_name, chunk_size=256 * 1024):
+        with self.metrics.timed('get_stream'):
+            response = self.client.get_object(self.bucket, object_name)
+        try:
+            yield from response.stream(chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
+
+    def stat(self, object_name):
+        with self.metrics.timed('stat'):
+            try:
+                obj = self.client.stat_object(self.bucket, object_name)
+            except S3Error as e:
+                if e.code in ('NoSuchKey', 'NoSuchObject', 'NotFound'):
+                    return None
+                raise
+        return StoredObject(obj.object_name, obj.size, obj.last_modified)
+
+    def presign_put(self, object_name, expires):
+        with self.metrics.timed('presign'):
+            return self.client.presigned_put_object(self.bucket, object_name, expires=timedelta(seconds=expires))
+
+
+class MemoryStorage(BaseStorage):
+    """Objects kept in a dict; for benchmarks and tests."""
+
+    name = 'memory'
+
+    def __init__(self, base_url):
+        super().__init__(base_url)
+        self._lock = threading.Lock()
+        self.objects = {}  # name -> (bytes, content_type, last_modified)
+
+    def put(self, object_name, data, length, content_type='application/octet-stream'):
+        with self.metrics.timed('put', length):
+            content = data.read(length)
+            with self._lock:
+                self.objects[object_name] = (content, content_type, datetime.now(dt_timezone.utc))
+        return self.url_for(object_name)
+
+    def remove(self, object_name):
+        with self.metrics.timed('remove'):
+            with self._lock:
+                self.objects.pop(object_name, None)
+
+    def list(self, prefix='', recursive=True):
+        with self._lock:
+            items = sorted((name, value) for name, value in self.objects.items() if name.startswith(prefix))
+        for name, (content, _, last_modified) in items:
+            if recursive or '/' not in name[len(prefix):]:
+                yield StoredObject(name, len(content), last_modified)
+
+    def get(self, object_name):
+        with self._lock:
+            return self.objects[object_name][0]
+
+    def stat(self, object_name):
+        with self._lock:
+            value = self.objects.get(object_name)
+        if value is None:
+            return None
+        return StoredObject(object_name, len(value[0]), value[2])
+
+    def presign_put(self, object_name, expires):
+        # Nothing serves this URL; tests write the object with put() instead
+        return f"{self.url_for(object_name)}?expires={expires}"
+
+
+class LocalStorage(BaseStorage):
+    """Objects stored as files under a local directory."""
+
+    name = 'local'
+
+    def __init__(self, root, base_url):
+        super().__init__(base_url)
+        self.root = os.path.abspath(str(root))
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, object_name):
+        path = os.path.abspath(os.path.join(self.root, object_name))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f'Invalid object name: {object_name}')
+        return path
+
+    def put(self, object_name, data, length, content_type='application/octet-stream'):
+        with self.metrics.timed('put', length):
+            path = self._path(object_name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as out:
+                remaining = length
+                while remaining > 0:
+                    chunk = data.read(min(remaining, 1024 * 1024))
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    remaining -= len(chunk)
+        return self.url_for(object_name)
+
+    def remove(self, object_name):
+        with self.metrics.timed('remove'):
+            try:
+                os.remove(self._path(object_name))
+            except FileNotFoundError:
+                pass
+
+    def list(self, prefix='', recursive=True):
+        for directory, dirs, files in os.walk(self.root):
+            dirs.sort()
+            relative = os.path.relpath(directory, self.root)
+            relative = '' if relative == '.' else relative.replace(os.sep, '/') + '/'
+            for filename in sorted(files):
+                name = relative + filename
+                if not name.startswith(prefix) or (not recursive and '/' in name[len(prefix):]):
+                    continue
+                stat = os.stat(os.path.join(directory, filename))
+                yield StoredObject(name, stat.st_size, datetime.fromtimestamp(stat.st_mtime, dt_timezone.utc))
+
+    def get(self, object_name):
+        with self.metrics.timed('get'):
+            with open(self._path(object_name), 'rb') as stored:
+                return stored.read()
+
+    def iter_chunks(self, object_name, chunk_size=256 * 1024):
+        with open(self._path(object_name), 'rb') as stored:
+            while True:
+                chunk = stored.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def stat(self, object_name):
+        try:
+            stat = os.stat(self._path(object_name))
+        except FileNotFoundError:
+            return None
+        return StoredObject(object_name, stat.st_size, datetime.fromtimestamp(stat.st_mtime, dt_timezone.utc))
+
+    def presign_put(self, object_name, expires):
+        # Nothing serves this URL; tests write the object with put() instead
+        return f"{self.url_for(object_name)}?expires={expires}"
+
+
+class _BackgroundDeleter:
+    """
+    Daemon thread that drains queued deletes through remove_many(),
+    combining queued requests into batches of up to REMOVE_BATCH_SIZE keys.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._queue = queue.Queue()
+        thread = threading.Thread(target=self._run, name='storage-deleter', daemon=True)
+        thread.start()
+
+    def submit(self, names, prefixes=()):
+        self._queue.put((list(names), list(prefixes)))
+
+    def join(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            while sum(len(names) for names, _ in jobs) < REMOVE_BATCH_SIZE:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                names = [name for job_names, _ in jobs for name in job_names]
+                prefixes = [prefix for _, job_prefixes in jobs for prefix in job_prefixes]
+                # Failures are counted in the backend metrics
+                self.storage.remove_many(self.storage._expand(names, prefixes))
+            except Exception:
+                pass
+            finally:
+                for _ in jobs:
+                    self._queue.task_done()
+
+
+# ------------------- PROCESS-WIDE INSTANCE -------------------
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def _build_storage():
+    backend = getattr(settings, 'MEDIA_STORAGE_BACKEND', 'minio')
+    base_url = settings.BASE_BUCKET_URL
+    if backend == 'memory':
+        storage = MemoryStorage(base_url)
+    elif backend == 'local':
+        storage = LocalStorage(settings.MEDIA_STORAGE_LOCAL_ROOT, base_url)
+    elif Minio is None:
+        return None
+    else:
+        storage = MinioStorage(settings.MINIO_STORAGE, base_url)
+    storage.background_deletes = getattr(settings, 'MEDIA_BACKGROUND_DELETES', False)
+    return storage
+
+
+def get_storage():
+    """The process-wide storage backend, or None if MinIO is selected but not installed."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = _build_storage()
+    return _storage
+
+
+def set_storage(storage):
+    """Replace the process-wide backend (benchmarks, maintenance scripts)."""
+    global _storage
+    with _storage_lock:
+        _storage = storage
@@ -0,0 +1,26 @@
+"""Small factories shared by the school test modules."""
+from school.models import Class, Student, Subject, Teacher, User
+
+
+def make_user(email, role):
+    # Unapproved, so the role signals do not create a profile of their own
+    return User.objects.create_user(email=email, role=role)
+
+
+def make_student(email, class_obj=None, student_id=None, fullname=''):
+    return Student.objects.create(
+        email=make_user(email, 'Student'), fullname=fullname or email.split('@')[0],
+        student_id=student_id, class_id=class_obj,
+    )
+
+
+def make_teacher(email):
+    return Teacher.objects.create(email=make_user(email, 'Teacher'), fullname=email.split('@')[0])
+
+
+def make_class(class_name='10', sec='A'):
+    return Class.objects.create(class_name=class_name, sec=sec)
+
+
+def make_subject(code='MATH', name='Mathematics'):
+    return Subject.objects.create(subject_code=code, subject_name=name)
@@ -0,0 +1,112 @@
+import io
+import zipfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from school import archives
+from school.archives import stream_zip, unique_arcname
+from school.storage import MemoryStorage, get_storage, set_storage
+from school.views import _zip_download_response_global
+
+BASE_URL = 'https://media.example.com/school-media/'
+
+
+class BrokenStorage(MemoryStorage):
+    """Memory storage whose reads of ``broken`` fail."""
+
+    broken = 'docs/broken.pdf'
+
+    def get(self, object_name):
+        if object_name == self.broken:
+            raise OSError('read timed out')
+        return super().get(object_name)
+
+
+class StreamZipTests(SimpleTestCase):
+    def setUp(self):
+        self.storage = BrokenStorage(BASE_URL)
+        for name, content in (('docs/a.pdf', b'A' * 100), ('docs/b.jpg', b'B' * 50), (BrokenStorage.broken, b'x')):
+            self.storage.put(name, io.BytesIO(content), len(content))
+
+    def _unzip(self, chunks):
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+        self.assertIsNone(archive.testzip())
+        return archive
+
+    def test_archive_holds_every_object_in_order(self):
+        archive = self._unzip(stream_zip(self.storage, [('first.pdf', 'docs/a.pdf'), ('second.jpg', 'docs/b.jpg')]))
+
+        self.assertEqual(archive.namelist(), ['first.pdf', 'second.jpg'])
+        self.assertEqual(archive.read('first.pdf'), b'A' * 100)
+        self.assertEqual(archive.getinfo('second.jpg').compress_type, zipfile.ZIP_STORED)
+
+    def test_missing_and_unreadable_objects_are_listed(self):
+        entries = [('a.pdf', 'docs/a.pdf'), ('gone.pdf', 'docs/gone.pdf'), ('broken.pdf', BrokenStorage.broken)]
+
+        archive = self._unzip(stream_zip(self.storage, entries))
+
+        self.assertEqual(archive.namelist(), ['a.pdf', 'MISSING.txt'])
+        self.assertEqual(archive.read('MISSING.txt').decode(), 'gone.pdf: not found\nbroken.pdf: read timed out\n')
+
+    def test_large_objects_are_streamed_in_chunks(self):
+        content = bytes(range(256)) * 40
+        self.storage.put('docs/large.bin', io.BytesIO(content), len(content))
+
+        with mock.patch.object(archives, 'ZIP_PREFETCH_MAX_BYTES', 1024), \
+                mock.patch.object(archives, 'ZIP_CHUNK_SIZE', 1024):
+            chunks = list(stream_zip(self.storage, [('large.bin', 'docs/large.bin'), ('a.pdf', 'docs/a.pdf')]))
+
+        # Output is produced while the object is read, not once at the end
+        self.assertGreaterEqual(len([chunk for chunk in chunks if chunk]), 10)
+        self.assertEqual(self._unzip(chunks).read('large.bin'), content)
+
+    def test_entries_are_read_as_the_archive_is_consumed(self):
+        consumed = []
+
+        def entries():
+            for i in range(4):
+                consumed.append(i)
+                yield f'{i}.pdf', 'docs/a.pdf'
+
+        stream = stream_zip(self.storage, entries(), window=1)
+        first = next(stream)
+
+        # The first object plus one prefetched, not the whole list
+        self.assertEqual(consumed, [0, 1])
+        archive = self._unzip([first] + list(stream))
+        self.assertEqual(archive.namelist(), ['0.pdf', '1.pdf', '2.pdf', '3.pdf'])
+
+    def test_unique_arcname_numbers_duplicates(self):
+        used = set()
+
+        names = [unique_arcname(name, used) for name in ('report.pdf', 'report.pdf', 'report.pdf', 'notes')]
+
+        self.assertEqual(names, ['report.pdf', 'report (2).pdf', 'report (3).pdf', 'notes'])
+
+
+class ZipDownloadResponseTests(SimpleTestCase):
+    def setUp(self):
+        previous = get_storage()
+        self.addCleanup(set_storage, previous)
+        self.storage = MemoryStorage(BASE_URL)
+        set_storage(self.storage)
+        self.storage.put('docs/a.pdf', io.BytesIO(b'A'), 1)
+        self.storage.put('docs/b.pdf', io.BytesIO(b'B'), 1)
+
+    def test_response_streams_stored_files(self):
+        response = _zip_download_response_global([
+            ('Report', BASE_URL + 'docs/a.pdf'),
+            ('Report', BASE_URL + 'docs/b.pdf'),
+            ('Elsewhere', 'https://other.example.com/c.pdf'),
+        ], 'documents.zip')
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="documents.zip"')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['Report.pdf', 'Report (2).pdf'])
+
+    def test_no_stored_files_is_a_404(self):
+        response = _zip_download_response_global([('Elsewhere', 'https://other.example.com/c.pdf')], 'documents.zip')
+
+        self.assertEqual(response.status_code, 404)
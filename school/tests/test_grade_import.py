@@ -0,0 +1,143 @@
+from datetime import date
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+
+from school.grading import import_grades, openpyxl, parse_grade_sheet
+from school.models import Grade, RankingRefresh
+
+from .helpers import make_class, make_student, make_subject, make_teacher
+
+
+class GradeUniqueConstraintTests(TestCase):
+    def setUp(self):
+        self.student = make_student('s1@example.com', make_class(), student_id='S1')
+        self.subject = make_subject()
+
+    def _grade(self, **kwargs):
+        fields = dict(student=self.student, subject=self.subject, exam_type='Midterm',
+                      marks_obtained=40, total_marks=50, exam_date=date(2026, 9, 1))
+        fields.update(kwargs)
+        return Grade.objects.create(**fields)
+
+    def test_second_grade_for_the_same_sitting_is_rejected(self):
+        self._grade()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self._grade(marks_obtained=45)
+
+    def test_other_dates_and_exam_types_are_separate_sittings(self):
+        self._grade()
+        self._grade(exam_date=date(2026, 10, 1))
+        self._grade(exam_type='Final')
+        self.assertEqual(Grade.objects.count(), 3)
+
+
+class ImportGradesTests(TestCase):
+    def setUp(self):
+        self.class_obj = make_class()
+        self.s1 = make_student('s1@example.com', self.class_obj, student_id='S1')
+        self.s2 = make_student('s2@example.com', self.class_obj, student_id='S2')
+        self.subject = make_subject()
+        self.teacher = make_teacher('t1@example.com')
+
+    def _row(self, student_id='S1', **kwargs):
+        row = {'student_id': student_id, 'subject_code': 'MATH', 'exam_type': 'Midterm',
+               'marks_obtained': '40', 'total_marks': '50', 'exam_date': '2026-09-01', 'remarks': ''}
+        row.update(kwargs)
+        return row
+
+    def test_rows_are_inserted(self):
+        imported, errors = import_grades([self._row('S1'), self._row('S2', marks_obtained='35.5')])
+
+        self.assertEqual((imported, errors), (2, []))
+        grade = Grade.objects.get(student=self.s2)
+        self.assertEqual(grade.marks_obtained, Decimal('35.50'))
+        self.assertEqual(grade.term, '2026-2027')
+
+    def test_reimport_updates_existing_marks(self):
+        import_grades([self._row('S1')])
+        imported, errors = import_grades([self._row('S1', marks_obtained='48', remarks='Rechecked')])
+
+        self.assertEqual((imported, errors), (1, []))
+        grade = Grade.objects.get()
+        self.assertEqual(grade.marks_obtained, Decimal('48.00'))
+        self.assertEqual(grade.remarks, 'Rechecked')
+
+    def test_defaults_fill_missing_columns(self):
+        rows = [{'student_id': 'S1', 'marks_obtained': '30'}, {'student_id': 'S2', 'marks_obtained': '20'}]
+        defaults = {'subject_code': 'MATH', 'exam_type': 'Final', 'total_marks': '50',
+                    'exam_date': '2026-09-01', 'teacher': 't1@example.com'}
+
+        imported, errors = import_grades(rows, defaults)
+
+        self.assertEqual((imported, errors), (2, []))
+        self.assertEqual(set(Grade.objects.values_list('exam_type', 'teacher')), {('Final', 't1@example.com')})
+
+    def test_any_invalid_row_saves_nothing(self):
+        rows = [
+            self._row('S1'),
+            self._row('NOPE'),
+            self._row('S2', marks_obtained='60'),
+            self._row('S1'),
+        ]
+
+        imported, errors = import_grades(rows)
+
+        self.assertEqual(imported, 0)
+        self.assertEqual([error['row'] for error in errors], [3, 4, 5])
+        self.assertIn('Unknown student_id "NOPE"', errors[0]['errors'])
+        self.assertIn('marks_obtained must be between 0 and total_marks', errors[1]['errors'])
+        self.assertIn('Duplicate of row 2', errors[2]['errors'])
+        self.assertFalse(Grade.objects.exists())
+
+    def test_unknown_teacher_is_rejected(self):
+        imported, errors = import_grades([self._row()], {'teacher': 'missing@example.com'})
+
+        self.assertEqual(imported, 0)
+        self.assertEqual(errors, [{'row': None, 'errors': ['Teacher missing@example.com not found']}])
+
+    def test_import_queues_a_ranking_refresh(self):
+        import_grades([self._row('S1'), self._row('S2')])
+
+        self.assertEqual(
+            list(RankingRefresh.objects.values_list('class_name', 'exam_type', 'term')),
+            [('10', 'Midterm', '2026-2027')],
+        )
+
+
+class ParseGradeSheetTests(TestCase):
+    def test_csv_headers_are_normalized_and_blank_lines_skipped(self):
+        upload = SimpleUploadedFile(
+            'marks.csv',
+            b'\xef\xbb\xbfStudent ID,Subject Code,Marks Obtained\nS1,MATH,40\n,,\nS2,MATH,35\n',
+        )
+
+        rows = parse_grade_sheet(upload)
+
+        self.assertEqual(rows, [
+            {'student_id': 'S1', 'subject_code': 'MATH', 'marks_obtained': '40'},
+            {'student_id': 'S2', 'subject_code': 'MATH', 'marks_obtained': '35'},
+        ])
+
+    def test_xlsx_rows_keep_cell_types(self):
+        if openpyxl is None:
+            self.skipTest('openpyxl is not installed')
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['Student ID', 'Marks Obtained', 'Exam Date'])
+        workbook.active.append(['S1', 40, date(2026, 9, 1)])
+        buffer = BytesIO()
+        workbook.save(buffer)
+
+        rows = parse_grade_sheet(SimpleUploadedFile('marks.xlsx', buffer.getvalue()))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['student_id'], 'S1')
+        self.assertEqual(rows[0]['marks_obtained'], 40)
+        self.assertEqual(rows[0]['exam_date'].date(), date(2026, 9, 1))
+
+    def test_unreadable_csv_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            parse_grade_sheet(SimpleUploadedFile('marks.csv', b'\xff\xfe\x00bad'))
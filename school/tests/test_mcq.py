@@ -0,0 +1,164 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from rest_framework.test import APIClient, APIRequestFactory
+
+from school.models import Exam, ExamResult, Grade, Question, QuestionResponse
+from school.views import MCQAnswersViewSet, _parse_mcq_answer_global
+
+from .helpers import make_class, make_student, make_subject, make_teacher
+
+
+class ParseMCQAnswerTests(TestCase):
+    def test_accepts_ints_and_numeric_strings(self):
+        self.assertEqual(_parse_mcq_answer_global(2), 2)
+        self.assertEqual(_parse_mcq_answer_global(' 4 '), 4)
+
+    def test_blank_means_no_answer(self):
+        self.assertIsNone(_parse_mcq_answer_global(None))
+        self.assertIsNone(_parse_mcq_answer_global(''))
+
+    def test_rejects_out_of_range_and_non_numeric_values(self):
+        for value in (0, 5, '7', 'b', True):
+            with self.assertRaises(ValueError):
+                _parse_mcq_answer_global(value)
+
+
+class MCQTestCase(TestCase):
+    def setUp(self):
+        class_obj = make_class()
+        self.teacher = make_teacher('t1@example.com')
+        self.student = make_student('s1@example.com', class_obj)
+        self.exam = Exam.objects.create(title='Unit test', class_id=class_obj, sub=make_subject(), sub_teacher=self.teacher)
+        self.questions = [
+            Question.objects.create(exam=self.exam, question=f'Q{i}', option_1='a', option_2='b',
+                                    option_3='c', option_4='d', correct_option=correct)
+            for i, correct in enumerate((1, 2, 3, 4), start=1)
+        ]
+        self.client = APIClient()
+
+
+class SubmitMultipleMCQTests(MCQTestCase):
+    def _submit(self, answers):
+        return self.client.patch('/api/submit_multiple_mcq/', {
+            'exam_id': self.exam.id, 'student_email': self.student.pk, 'answers': answers,
+        }, format='json')
+
+    def test_answers_are_scored_and_graded(self):
+        q1, q2, q3, _ = self.questions
+        response = self._submit([
+            {'id': q1.id, 'student_answer': 1},
+            {'id': q2.id, 'student_answer': '2'},
+            {'id': q3.id, 'student_answer': 1},
+        ])
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([row['result'] for row in response.data['updated_answers']], [True, True, False])
+        result = ExamResult.objects.get(exam=self.exam, student=self.student)
+        self.assertEqual((result.correct, result.answered, result.total_questions), (2, 3, 4))
+        grade = Grade.objects.get(student=self.student)
+        self.assertEqual((grade.exam_type, grade.marks_obtained, grade.total_marks),
+                         ('Quiz', Decimal('50.00'), Decimal('100.00')))
+
+    def test_resubmitting_an_answer_moves_the_score(self):
+        q1 = self.questions[0]
+        self._submit([{'id': q1.id, 'student_answer': 2}])
+        self._submit([{'id': q1.id, 'student_answer': 1}])
+
+        result = ExamResult.objects.get(exam=self.exam, student=self.student)
+        self.assertEqual((result.correct, result.answered), (1, 1))
+        self.assertEqual(QuestionResponse.objects.get().answer, 1)
+
+    def test_invalid_answer_is_rejected_without_writing(self):
+        response = self._submit([
+            {'id': self.questions[0].id, 'student_answer': 1},
+            {'id': self.questions[1].id, 'student_answer': 5},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(QuestionResponse.objects.exists())
+        self.assertFalse(ExamResult.objects.exists())
+
+    def test_completed_exam_cannot_be_resubmitted(self):
+        self._submit([{'id': q.id, 'student_answer': 1} for q in self.questions])
+
+        response = self._submit([{'id': self.questions[0].id, 'student_answer': 2}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(QuestionResponse.objects.get(question=self.questions[0]).answer, 1)
+
+
+class MCQAnswersViewSetTests(MCQTestCase):
+    def test_update_rescores_the_answer(self):
+        answer = QuestionResponse.objects.create(exam=self.exam, student=self.student, question=self.questions[1], answer=1)
+        ExamResult.objects.create(exam=self.exam, student=self.student, answered=1, total_questions=4)
+        view = MCQAnswersViewSet.as_view({'patch': 'partial_update'})
+
+        response = view(APIRequestFactory().patch('/', {'student_answer': '2'}, format='json'), pk=answer.pk)
+
+        self.assertEqual(response.status_code, 200, response.data)
+        answer.refresh_from_db()
+        self.assertEqual((answer.answer, answer.result), (2, True))
+        self.assertEqual(ExamResult.objects.get().correct, 1)
+
+        response = view(APIRequestFactory().patch('/', {'student_answer': 'x'}, format='json'), pk=answer.pk)
+        self.assertEqual(response.status_code, 400)
+
+
+class LegacyMCQEndpointTests(MCQTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.teacher.email)
+
+    def _legacy_row(self, **kwargs):
+        row = {'exam': self.exam.id, 'question': 'Q1', 'option_1': 'a', 'option_2': 'b',
+               'option_3': 'c', 'option_4': 'd', 'correct_option': 1}
+        row.update(kwargs)
+        return row
+
+    def test_submit_without_student_adds_a_question(self):
+        response = self.client.post('/api/submit_mcq/', self._legacy_row(question='Q5'), format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertIsNone(response.data['student_email'])
+        self.assertTrue(Question.objects.filter(exam=self.exam, question='Q5').exists())
+
+    def test_submit_with_student_records_an_answer(self):
+        response = self.client.post(
+            '/api/submit_mcq/', self._legacy_row(student=self.student.pk, student_answer=1), format='json'
+        )
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data['student_email'], response.data['result']), (self.student.pk, True))
+        self.assertEqual(ExamResult.objects.get().correct, 1)
+
+    def test_student_cannot_answer_a_question_that_does_not_exist(self):
+        response = self.client.post(
+            '/api/submit_mcq/', self._legacy_row(question='Q9', student=self.student.pk, student_answer=1), format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(QuestionResponse.objects.exists())
+
+    def test_get_mcq_resolves_questions_and_responses_by_id(self):
+        question = self.questions[0]
+        answer = QuestionResponse.objects.create(exam=self.exam, student=self.student, question=question, answer=2)
+
+        # Responses are numbered from a range of their own
+        self.assertGreaterEqual(answer.id, 10 ** 12)
+        as_question = self.client.get(f'/api/get_mcq/{question.id}/')
+        as_response = self.client.get(f'/api/get_mcq/{answer.id}/')
+
+        self.assertEqual((as_question.data['id'], as_question.data['student_email']), (question.id, None))
+        self.assertEqual((as_response.data['id'], as_response.data['student_email']), (answer.id, self.student.pk))
+        self.assertEqual(as_response.data['question'], 'Q1')
+        self.assertEqual(self.client.get('/api/get_mcq/999999/').status_code, 404)
+
+    def test_get_all_mcq_lists_questions_then_responses(self):
+        answer = QuestionResponse.objects.create(exam=self.exam, student=self.student, question=self.questions[0], answer=1)
+
+        rows = self.client.get('/api/get_all_mcq/').data['mcq_answers']
+        page = self.client.get('/api/get_all_mcq/', {'page': 2, 'page_size': 3}).data
+
+        self.assertEqual([row['id'] for row in rows], [q.id for q in self.questions] + [answer.id])
+        self.assertEqual([row['id'] for row in page['results']['mcq_answers']], [self.questions[3].id, answer.id])
@@ -0,0 +1,141 @@
+import smtplib
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from school.models import OutboxMessage
+from school.outbox import (
+    RateLimiter, claim_due_messages, deliver, lease_batch_size, prune_outbox, queue_email, retry_delay,
+)
+
+
+class FailingConnection:
+    """Mail connection whose every send raises ``error``."""
+
+    def __init__(self, error):
+        self.error = error
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise self.error
+
+
+@override_settings(OUTBOX_LEASE_SECONDS=300, OUTBOX_MAX_ATTEMPTS=3,
+                   OUTBOX_RETRY_BASE_SECONDS=60, OUTBOX_RETRY_MAX_SECONDS=3600)
+class OutboxTests(TestCase):
+    def _queue(self, subject='Hello', **kwargs):
+        return queue_email(subject, 'Reset link: https://example.com/reset/abc', ['p1@example.com'], **kwargs)
+
+    def test_claim_leases_due_messages(self):
+        first, second, third = self._queue('one'), self._queue('two'), self._queue('three')
+        OutboxMessage.objects.filter(id=third.id).update(next_attempt_at=timezone.now() + timedelta(hours=1))
+
+        claimed = claim_due_messages(10)
+
+        self.assertEqual([message.id for message in claimed], [first.id, second.id])
+        self.assertGreater(claimed[0].next_attempt_at, timezone.now() + timedelta(seconds=290))
+        # Leased rows are not handed to a second worker
+        self.assertEqual(claim_due_messages(10), [])
+
+    def test_claim_respects_the_limit(self):
+        for i in range(3):
+            self._queue(f'message {i}')
+
+        self.assertEqual(len(claim_due_messages(2)), 2)
+        self.assertEqual(len(claim_due_messages(2)), 1)
+
+    def test_delivered_message_is_sent_and_blanked(self):
+        self._queue(html_body='<p>Reset</p>', attachments=[('card.pdf', b'%PDF-1.4', 'application/pdf')])
+
+        sent, failed = deliver(claim_due_messages(10), get_connection(), RateLimiter(0))
+
+        self.assertEqual((sent, failed), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('https://example.com/reset/abc', mail.outbox[0].body)
+        self.assertEqual(mail.outbox[0].attachments[0][:2], ('card.pdf', b'%PDF-1.4'))
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), ('Sent', 1))
+        self.assertIsNotNone(message.sent_at)
+        self.assertEqual((message.body, message.html_body, message.attachments), ('', '', []))
+        self.assertEqual((message.subject, message.to), ('Hello', ['p1@example.com']))
+
+    def test_failed_message_is_retried_with_backoff(self):
+        self._queue()
+
+        before = timezone.now()
+        sent, failed = deliver(claim_due_messages(10), FailingConnection(smtplib.SMTPServerDisconnected('gone')),
+                               RateLimiter(0))
+
+        self.assertEqual((sent, failed), (0, 1))
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), ('Pending', 1))
+        self.assertIn('SMTPServerDisconnected', message.last_error)
+        self.assertGreaterEqual(message.next_attempt_at, before + timedelta(seconds=retry_delay(1)))
+        # The payload is kept for the retry
+        self.assertIn('reset/abc', message.body)
+
+    def test_message_fails_for_good_after_max_attempts(self):
+        message = self._queue()
+        OutboxMessage.objects.filter(id=message.id).update(attempts=2)
+
+        deliver(claim_due_messages(10), FailingConnection(smtplib.SMTPServerDisconnected('gone')), RateLimiter(0))
+
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.body), ('Failed', 3, ''))
+
+    def test_refused_recipient_is_not_retried(self):
+        self._queue()
+
+        deliver(claim_due_messages(10),
+                FailingConnection(smtplib.SMTPRecipientsRefused({'p1@example.com': (550, b'No such user')})),
+                RateLimiter(0))
+
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts, message.body), ('Failed', 1, ''))
+
+    def test_delivery_stops_when_the_lease_runs_out(self):
+        self._queue()
+
+        sent, failed = deliver(claim_due_messages(10), get_connection(), RateLimiter(0), lease_deadline=0)
+
+        self.assertEqual((sent, failed), (0, 0))
+        self.assertEqual(OutboxMessage.objects.get().status, 'Pending')
+
+    def test_retry_delay_doubles_up_to_the_cap(self):
+        self.assertEqual([retry_delay(n) for n in (1, 2, 3)], [60, 120, 240])
+        self.assertEqual(retry_delay(20), 3600)
+
+    def test_lease_batch_size_fits_the_lease(self):
+        self.assertEqual(lease_batch_size(100, 0), 100)
+        self.assertEqual(lease_batch_size(1000, 2), 300)
+        self.assertEqual(lease_batch_size(100, 0.001), 1)
+
+    def test_prune_deletes_only_old_finished_messages(self):
+        old_sent, old_failed, old_pending, new_sent = (self._queue(str(i)) for i in range(4))
+        OutboxMessage.objects.filter(id__in=[old_sent.id, new_sent.id]).update(status='Sent')
+        OutboxMessage.objects.filter(id=old_failed.id).update(status='Failed')
+        OutboxMessage.objects.filter(id__in=[old_sent.id, old_failed.id, old_pending.id]).update(
+            created_at=timezone.now() - timedelta(days=40)
+        )
+
+        self.assertEqual(prune_outbox(30, chunk_size=1), 2)
+        self.assertEqual(set(OutboxMessage.objects.values_list('id', flat=True)), {old_pending.id, new_sent.id})
+
+    def test_drain_outbox_once_sends_everything_due(self):
+        for i in range(3):
+            self._queue(f'message {i}')
+
+        call_command('drain_outbox', '--once', '--rate', '0', '--batch-size', '2', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboxMessage.objects.exclude(status='Sent').exists())
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from school.photo_cache import PhotoCache, _sha256
+
+URL = 'https://media.example.com/school-media/profile/s1.jpg'
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class PhotoCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='photo-cache-test-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        patcher = mock.patch('school.photo_cache.requests.get')
+        self.get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _cache(self, **kwargs):
+        options = {'max_disk_bytes': 10_000, 'max_memory_bytes': 10_000, 'max_age': 300}
+        options.update(kwargs)
+        return PhotoCache(self.directory, **options)
+
+    def _expire(self, cache, url=URL):
+        cache._memory[url]['validated_at'] = time.time() - 3600
+
+    def test_fresh_entries_are_served_from_memory(self):
+        self.get.return_value = FakeResponse(200, b'photo', {'ETag': '"v1"'})
+        cache = self._cache()
+
+        self.assertEqual(cache.get(URL), b'photo')
+        self.assertEqual(cache.get(URL), b'photo')
+
+        self.assertEqual(self.get.call_count, 1)
+        self.assertEqual((cache.counters['misses'], cache.counters['memory_hits']), (1, 1))
+
+    def test_placeholders_are_not_fetched(self):
+        cache = self._cache()
+
+        self.assertIsNone(cache.get('profile.jpg'))
+        self.assertIsNone(cache.get(''))
+        self.get.assert_not_called()
+
+    def test_stale_entry_is_revalidated_with_its_etag(self):
+        self.get.return_value = FakeResponse(200, b'photo', {'ETag': '"v1"', 'Last-Modified': 'Mon, 19 Oct 2026 09:00:00 GMT'})
+        cache = self._cache()
+        cache.get(URL)
+        self._expire(cache)
+        self.get.return_value = FakeResponse(304)
+
+        self.assertEqual(cache.get(URL), b'photo')
+
+        headers = self.get.call_args.kwargs['headers']
+        self.assertEqual(headers['If-None-Match'], '"v1"')
+        self.assertEqual(headers['If-Modified-Since'], 'Mon, 19 Oct 2026 09:00:00 GMT')
+        self.assertEqual(cache.counters['revalidated'], 1)
+        # Revalidated entries are fresh again
+        cache.get(URL)
+        self.assertEqual(self.get.call_count, 2)
+
+    def test_changed_photo_replaces_the_cached_copy(self):
+        self.get.return_value = FakeResponse(200, b'old', {'ETag': '"v1"'})
+        cache = self._cache()
+        cache.get(URL)
+        self._expire(cache)
+        self.get.return_value = FakeResponse(200, b'new', {'ETag': '"v2"'})
+
+        self.assertEqual(cache.get(URL), b'new')
+        self.assertEqual(cache.counters['changed'], 1)
+        self.assertEqual(self._cache().get(URL), b'new')
+
+    def test_cached_copy_is_served_when_storage_is_unreachable(self):
+        self.get.return_value = FakeResponse(200, b'photo')
+        cache = self._cache()
+        cache.get(URL)
+        self._expire(cache)
+        self.get.side_effect = requests.ConnectionError('down')
+
+        self.assertEqual(cache.get(URL), b'photo')
+        self.assertEqual(cache.counters['stale_hits'], 1)
+        self.assertIsNone(cache.get(URL.replace('s1', 's2')))
+        self.assertEqual(cache.counters['errors'], 1)
+
+    def test_disk_entries_are_shared_and_revalidated(self):
+        self.get.return_value = FakeResponse(200, b'photo', {'ETag': '"v1"'})
+        self._cache().get(URL)
+        self.get.return_value = FakeResponse(304)
+        other_process = self._cache()
+
+        self.assertEqual(other_process.get(URL), b'photo')
+        self.assertEqual(other_process.counters['disk_hits'], 1)
+        self.assertEqual(self.get.call_args.kwargs['headers'], {'If-None-Match': '"v1"'})
+
+    def test_identical_photos_share_one_blob(self):
+        self.get.return_value = FakeResponse(200, b'same photo')
+        cache = self._cache()
+        cache.get(URL)
+        cache.get(URL.replace('s1', 's2'))
+
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'blobs')), [_sha256(b'same photo')])
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, 'urls'))), 2)
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        self.get.side_effect = lambda url, **kwargs: FakeResponse(200, url[-6:].encode() * 10)
+        cache = self._cache(max_memory_bytes=150)
+        urls = [URL.replace('s1', name) for name in ('s1', 's2', 's3')]
+
+        cache.get(urls[0])
+        cache.get(urls[1])
+        cache.get(urls[0])
+        cache.get(urls[2])
+
+        self.assertEqual(list(cache._memory), [urls[0], urls[2]])
+        self.assertEqual(cache.stats()['memory_bytes'], 120)
+        self.assertEqual(cache.counters['memory_evictions'], 1)
+
+    def test_disk_tier_evicts_least_recently_used_blobs(self):
+        self.get.side_effect = lambda url, **kwargs: FakeResponse(200, url[-6:].encode() * 20)
+        cache = self._cache(max_disk_bytes=300)
+        urls = [URL.replace('s1', name) for name in ('s1', 's2', 's3')]
+        cache.get(urls[0])
+        cache.get(urls[1])
+        now = time.time()
+        for age, url in ((200, urls[0]), (100, urls[1])):
+            blob = cache._blob_path(_sha256(url[-6:].encode() * 20))
+            os.utime(blob, (now - age, now - age))
+
+        cache.get(urls[2])
+
+        self.assertEqual(cache.counters['disk_evictions'], 1)
+        self.assertEqual(cache.counters['index_evictions'], 1)
+        self.assertEqual(cache.stats()['disk_bytes'], 240)
+        self.assertFalse(os.path.exists(cache._index_path(urls[0])))
+        self.assertTrue(os.path.exists(cache._index_path(urls[1])))
+        # The evicted photo is downloaded again by a process without it in memory
+        fresh = self._cache(max_disk_bytes=300)
+        fresh.get(urls[0])
+        self.assertEqual(fresh.counters['misses'], 1)
@@ -0,0 +1,147 @@
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from school.models import ClassRanking, Grade, RankingRefresh
+from school.rankings import drain_ranking_queue, recompute_level_rankings
+
+from .helpers import make_class, make_student, make_subject
+
+EXAM_DATE = date(2026, 9, 1)
+TERM = '2026-2027'
+
+
+@override_settings(RANKING_REFRESH_INLINE=False)
+class RankingRefreshTests(TestCase):
+    def setUp(self):
+        self.section_a = make_class('10', 'A')
+        self.section_b = make_class('10', 'B')
+        self.s1 = make_student('s1@example.com', self.section_a)
+        self.s2 = make_student('s2@example.com', self.section_a)
+        self.s3 = make_student('s3@example.com', self.section_b)
+        self.subject = make_subject()
+
+    def _grade(self, student, marks, exam_type='Midterm'):
+        return Grade.objects.create(student=student, subject=self.subject, exam_type=exam_type,
+                                    marks_obtained=marks, total_marks=100, exam_date=EXAM_DATE)
+
+    def _rankings(self, class_name='10'):
+        return {
+            student: (rank, level_rank)
+            for student, rank, level_rank in ClassRanking.objects.filter(
+                class_name=class_name, exam_type='Midterm', term=TERM
+            ).values_list('student', 'rank', 'level_rank')
+        }
+
+    def _assert_matches_rebuild(self, class_name='10'):
+        refreshed = self._rankings(class_name)
+        recompute_level_rankings(class_name, 'Midterm', TERM)
+        self.assertEqual(refreshed, self._rankings(class_name))
+
+    def test_grade_changes_are_queued_until_drained(self):
+        self._grade(self.s1, 70)
+        self._grade(self.s2, 90)
+        self._grade(self.s3, 80)
+
+        self.assertEqual(RankingRefresh.objects.count(), 3)
+        self.assertFalse(ClassRanking.objects.exists())
+
+        # The three queue rows share one slice
+        self.assertEqual(drain_ranking_queue(), (1, 0))
+        self.assertFalse(RankingRefresh.objects.exists())
+        self.assertEqual(self._rankings(), {
+            's1@example.com': (2, 3),
+            's2@example.com': (1, 1),
+            's3@example.com': (1, 2),
+        })
+
+    def test_grade_edit_re_ranks_the_slice(self):
+        grade = self._grade(self.s1, 70)
+        self._grade(self.s2, 90)
+        self._grade(self.s3, 80)
+        drain_ranking_queue()
+
+        grade.marks_obtained = 95
+        grade.save()
+        drain_ranking_queue()
+
+        self.assertEqual(self._rankings()['s1@example.com'], (1, 1))
+        self.assertEqual(self._rankings()['s2@example.com'], (2, 2))
+        self._assert_matches_rebuild()
+
+    def test_grade_delete_drops_the_student(self):
+        grade = self._grade(self.s1, 70)
+        self._grade(self.s2, 90)
+        drain_ranking_queue()
+
+        grade.delete()
+        drain_ranking_queue()
+
+        self.assertEqual(self._rankings(), {'s2@example.com': (1, 1)})
+
+    def test_exam_type_change_refreshes_both_slices(self):
+        grade = self._grade(self.s1, 70)
+        self._grade(self.s2, 90)
+        drain_ranking_queue()
+
+        grade.exam_type = 'Final'
+        grade.save()
+        drain_ranking_queue()
+
+        self.assertEqual(self._rankings(), {'s2@example.com': (1, 1)})
+        self.assertEqual(
+            list(ClassRanking.objects.filter(exam_type='Final').values_list('student', 'level_rank')),
+            [('s1@example.com', 1)],
+        )
+
+    def test_student_moving_class_is_re_ranked_in_both_levels(self):
+        self._grade(self.s1, 70)
+        self._grade(self.s2, 90)
+        self._grade(self.s3, 80)
+        drain_ranking_queue()
+
+        self.s2.class_id = make_class('11', 'A')
+        self.s2.save()
+        drain_ranking_queue()
+
+        self.assertEqual(self._rankings(), {'s1@example.com': (1, 2), 's3@example.com': (1, 1)})
+        self.assertEqual(self._rankings('11'), {'s2@example.com': (1, 1)})
+        self._assert_matches_rebuild()
+
+    def test_failed_refresh_stays_queued_for_a_retry(self):
+        self._grade(self.s1, 70)
+
+        with mock.patch('school.rankings._refresh_slice', side_effect=RuntimeError('database went away')), \
+                self.assertLogs('school.rankings', 'ERROR'):
+            self.assertEqual(drain_ranking_queue(), (0, 1))
+
+        row = RankingRefresh.objects.get()
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        # Not due yet, so a second drain leaves it alone
+        self.assertEqual(drain_ranking_queue(), (0, 0))
+
+        RankingRefresh.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(drain_ranking_queue(), (1, 0))
+        self.assertEqual(self._rankings(), {'s1@example.com': (1, 1)})
+
+    def test_refresh_rankings_command_drains_the_queue(self):
+        self._grade(self.s1, 70)
+        out = StringIO()
+
+        call_command('refresh_rankings', '--once', stdout=out)
+
+        self.assertIn('Refreshed 1 slices', out.getvalue())
+        self.assertFalse(RankingRefresh.objects.exists())
+        self.assertEqual(self._rankings(), {'s1@example.com': (1, 1)})
+
+    @override_settings(RANKING_REFRESH_INLINE=True)
+    def test_inline_refresh_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._grade(self.s1, 70)
+
+        self.assertFalse(RankingRefresh.objects.exists())
+        self.assertEqual(self._rankings(), {'s1@example.com': (1, 1)})
@@ -41,6 +41,8 @@ urlpatterns = [
     path('students/', views.StudentViewSet.as_view({'get': 'list', 'post': 'create'}), name='student-list'),
     path('students/<str:pk>/', views.StudentViewSet.as_view({'get': 'retrieve', 'patch': 'partial_update', 'delete': 'destroy'}), name='student-detail'),
     path('students/by_class/', views.StudentViewSet.as_view({'get': 'by_class'}), name='student-by-class'),
+    path('students/<str:pk>/presign_profile_picture/', views.StudentViewSet.as_view({'post': 'presign_profile_picture'}), name='student-presign-profile-picture'),
+    path('students/<str:pk>/confirm_profile_picture/', views.StudentViewSet.as_view({'post': 'confirm_profile_picture'}), name='student-confirm-profile-picture'),
     
     # Teachers
     path('teachers/', views.TeacherViewSet.as_view({'get': 'list', 'post': 'create'}), name='teacher-list'),
@@ -81,7 +83,14 @@ urlpatterns = [
 
     # Grades
     path('grades/', views.GradeViewSet.as_view({'get': 'list', 'post': 'create'}), name='grade-list'),
+    path('grades/analytics/', views.GradeViewSet.as_view({'get': 'analytics'}), name='grade-analytics'),
+    path('grades/matrix/', views.GradeViewSet.as_view({'get': 'matrix'}), name='grade-matrix'),
+    path('grades/bulk_import/', views.GradeViewSet.as_view({'post': 'bulk_import'}), name='grade-bulk-import'),
     path('grades/<int:pk>/', views.GradeViewSet.as_view({'get': 'retrieve', 'patch': 'partial_update', 'delete': 'destroy'}), name='grade-detail'),
+
+    # Class Rankings
+    path('class_rankings/', views.ClassRankingViewSet.as_view({'get': 'list'}), name='class-ranking-list'),
+    path('class_rankings/<int:pk>/', views.ClassRankingViewSet.as_view({'get': 'retrieve'}), name='class-ranking-detail'),
     
     # Fee Structures
     path('fee_structures/', views.FeeStructureViewSet.as_view({'get': 'list', 'post': 'create'}), name='fee-structure-list'),
@@ -103,7 +112,10 @@ urlpatterns = [
     path('documents/', views.DocumentViewSet.as_view({'get': 'list', 'post': 'create'}), name='document-list'),
     path('documents/bulk_upsert/', views.DocumentViewSet.as_view({'post': 'bulk_upsert'}), name='document-bulk-upsert'),
     path('documents/upload/', views.DocumentViewSet.as_view({'post': 'upload'}), name='document-upload'),
+    path('documents/presign_upload/', views.DocumentViewSet.as_view({'post': 'presign_upload'}), name='document-presign-upload'),
+    path('documents/confirm_upload/', views.DocumentViewSet.as_view({'post': 'confirm_upload'}), name='document-confirm-upload'),
     path('documents/<str:email>/', views.DocumentViewSet.as_view({'get': 'retrieve', 'patch': 'partial_update', 'delete': 'destroy'}), name='document-detail'),
+    path('documents/<str:email>/download/', views.DocumentViewSet.as_view({'get': 'download'}), name='document-download'),
 
     # Notices
     path('notices/', views.NoticeViewSet.as_view({'get': 'list', 'post': 'create'}), name='notice-list'),
@@ -129,6 +141,9 @@ urlpatterns = [
     path('assignments/', views.AssignmentViewSet.as_view({'get': 'list', 'post': 'create'}), name='assignment-list'),
     path('assignments/<int:pk>/', views.AssignmentViewSet.as_view({'get': 'retrieve', 'patch': 'partial_update', 'delete': 'destroy'}), name='assignment-detail'),
     path('assignments/<int:pk>/submit/', views.AssignmentViewSet.as_view({'post': 'submit'}), name='assignment-submit'),
+    path('assignments/<int:pk>/presign_submission/', views.AssignmentViewSet.as_view({'post': 'presign_submission'}), name='assignment-presign-submission'),
+    path('assignments/<int:pk>/confirm_submission/', views.AssignmentViewSet.as_view({'post': 'confirm_submission'}), name='assignment-confirm-submission'),
+    path('assignments/<int:pk>/download_submissions/', views.AssignmentViewSet.as_view({'get': 'download_submissions'}), name='assignment-download-submissions'),
 
     # Leaves
     path('leaves/', views.LeaveViewSet.as_view({'get': 'list', 'post': 'create'}), name='leave-list'),
@@ -167,6 +182,8 @@ urlpatterns = [
 
     # Submitted Assignments
     path('submitted_assignments/', views.SubmittedAssignmentViewSet.as_view({'get': 'list', 'post': 'create'}), name='submitted-assignment-list'),
+    path('submitted_assignments/presign/', views.SubmittedAssignmentViewSet.as_view({'post': 'presign'}), name='submitted-assignment-presign'),
+    path('submitted_assignments/confirm/', views.SubmittedAssignmentViewSet.as_view({'post': 'confirm'}), name='submitted-assignment-confirm'),
     path('submitted_assignments/<int:pk>/', views.SubmittedAssignmentViewSet.as_view({'get': 'retrieve', 'patch': 'partial_update', 'delete': 'destroy'}), name='submitted-assignment-detail'),
     path('submitted_assignments/<int:pk>/grade/', views.SubmittedAssignmentViewSet.as_view({'post': 'grade'}), name='submitted-assignment-grade'),
     
@@ -175,6 +192,9 @@ urlpatterns = [
     path('id_cards/<int:pk>/', views.IDCardViewSet.as_view({'get': 'retrieve', 'patch': 'partial_update', 'delete': 'destroy'}), name='id-card-detail'),
     path('id_cards/check_by_email/', views.IDCardViewSet.as_view({'get': 'check_by_email'}), name='id-card-check-by-email'),
     path('id_cards/generate/', views.IDCardViewSet.as_view({'post': 'generate_id_card'}), name='id-card-generate'),
+    path('id_cards/sheet/', views.IDCardViewSet.as_view({'get': 'sheet'}), name='id-card-sheet'),
+    path('photo_cache/stats/', views.photo_cache_stats, name='photo-cache-stats'),
+    path('storage/stats/', views.storage_stats, name='storage-stats'),
     
     # Marks Card
     path('marks_card/', views.send_marks_card, name='send-marks-card'),
@@ -182,6 +202,7 @@ urlpatterns = [
     # Exams
     path('exams/', views.ExamViewSet.as_view({'get': 'list', 'post': 'create', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='exam-list'),
     path('exams/<int:pk>/', views.ExamViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}), name='exam-detail'),
+    path('exams/<int:pk>/import_questions/', views.ExamViewSet.as_view({'post': 'import_questions'}), name='exam-import-questions'),
     
     # MCQ Answers
     # path('mcq_answers/', views.MCQAnswersViewSet.as_view({'post': 'create'}), name='mcq-answers-list'),
@@ -7,16 +7,17 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model
 from django.conf import settings
-from minio import Minio
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.shortcuts import get_object_or_404
 
-from django.core.mail import send_mail
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
 from decimal import Decimal
-import os, tempfile, requests, pytz
+import os, tempfile, pytz, hashlib, uuid
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from geopy.distance import geodesic
 from datetime import datetime, date, timedelta
 try:
@@ -24,14 +25,6 @@ try:
 except Exception:  # pragma: no cover
     face_recognition = None
 
-# Import barcode library
-try:
-    import barcode
-    from barcode.writer import ImageWriter
-except Exception:  # pragma: no cover
-    barcode = None
-    ImageWriter = None
-
 # Simple test view for debugging
 from django.http import HttpResponse
 def test_view(request):
@@ -44,7 +37,7 @@ from .models import (
     User, Student, Teacher, Principal, Management, Admin, Parent,
     Department, Subject, Attendance, StudentAttendance, Grade, FeeStructure,
     FeePayment, Timetable, FormerMember, Document, Notice, Issue, Holiday, Award, Assignment, SubmittedAssignment, Leave, Task,
-    Project, Program, Activity, Report, FinanceTransaction, TransportDetails, Class, IDCard, Exam, MCQ_Answers,
+    Project, Program, Activity, Report, FinanceTransaction, TransportDetails, Class, IDCard, Exam, Question, QuestionResponse, ExamResult, ClassRanking,
 )
 from .serializers import (
     UserSerializer, UserRegistrationSerializer,
@@ -61,21 +54,30 @@ from .serializers import (
     AssignmentSerializer, SubmittedAssignmentSerializer, SubmittedAssignmentCreateSerializer, LeaveSerializer, TaskSerializer,
     ProjectSerializer, ProgramSerializer, ActivitySerializer, ActivityCreateSerializer, ReportSerializer,
     FinanceTransactionSerializer, TransportDetailsSerializer, IDCardSerializer,
-    ExamSerializer, ExamCreateSerializer, MCQAnswersSerializer, MCQAnswersCreateSerializer,
+    ExamSerializer, ExamCreateSerializer, QuestionSerializer, QuestionResponseSerializer, MCQAnswersCreateSerializer,
+    QuestionImportSerializer, serialize_mcq_rows, create_questions,
+    ClassRankingSerializer,
+)
+from .pdf_templates import (
+    id_card_data, render_id_card, render_id_card_sheets, render_marks_card, SHEET_COLUMNS, SHEET_ROWS,
+)
+from .photo_cache import get_photo_cache
+from .storage import get_storage
+from .images import (
+    delete_previous_profile_pictures, fetch_profile_picture, store_profile_picture, upload_object_name,
+)
+from .archives import stream_zip, unique_arcname
+from .outbox import outbox_message, queue_email, queue_emails
+from .id_cards import (
+    id_card_fingerprint, id_card_object_name, id_card_users, load_card_photo, photo_missing, sheet_cards,
+)
+from .pagination import CustomPageNumberPagination
+from .grading import (
+    load_marks_card_contexts, grade_analytics, ANALYTICS_CACHE_TIMEOUT, parse_grade_sheet, import_grades,
+    record_exam_grade, apply_exam_result_delta,
 )
 
 
-def _minio_client_global():
-    if Minio is None:
-        return None
-    cfg = settings.MINIO_STORAGE
-    return Minio(
-        cfg['ENDPOINT'],
-        access_key=cfg['ACCESS_KEY'],
-        secret_key=cfg['SECRET_KEY'],
-        secure=cfg.get('USE_SSL', True),
-    )
-
 def _object_name_for_member_global(member, fallback_email: str | None = None, fallback_id: str | None = None) -> str:
     identifier = None
     for attr in ('student_id', 'teacher_id'):
@@ -91,17 +93,130 @@ def _object_name_for_member_global(member, fallback_email: str | None = None, fa
         identifier = (fallback_id or (fallback_email.split('@')[0] if fallback_email else 'unknown'))
     return f"images/{identifier}/profile.jpg"
 
-def _upload_file_to_minio_global(member, file, fallback_email: str | None = None, fallback_id: str | None = None):
-    client = _minio_client_global()
-    if client is None:
+def _upload_profile_picture_global(object_name: str, file):
+    """
+    Store an uploaded profile picture with its resized variants; None if
+    storage is unavailable. The previous picture is kept until the row is
+    saved; then call _delete_replaced_profile_pictures_global.
+    """
+    storage = get_storage()
+    if storage is None:
         return None
-    bucket = settings.MINIO_STORAGE['BUCKET_NAME']
+    return store_profile_picture(storage, object_name, file.read(), getattr(file, 'content_type', None),
+                                 keep_previous=True)
+
+def _delete_replaced_profile_pictures_global(url: str):
+    """After the commit that points a row at ``url``, remove the pictures it replaced."""
+    storage = get_storage()
+    if storage is None or not url:
+        return
+    object_name = storage.object_name_for_url(url)
+    if object_name:
+        transaction.on_commit(
+            lambda: delete_previous_profile_pictures(storage, upload_object_name(object_name), url), robust=True
+        )
+
+def _upload_file_to_minio_global(member, file, fallback_email: str | None = None, fallback_id: str | None = None):
     object_name = _object_name_for_member_global(member, fallback_email, fallback_id)
-    client.put_object(bucket, object_name, file.file, file.size, content_type=getattr(file, 'content_type', 'application/octet-stream'))
-    base = settings.BASE_BUCKET_URL
-    if not base.endswith('/'):
-        base += '/'
-    return f"{base}{object_name}"
+    return _upload_profile_picture_global(object_name, file)
+
+def _delete_minio_object_by_url_global(url: str):
+    """Delete a MinIO object if the URL points to our BASE_BUCKET_URL (best effort)."""
+    storage = get_storage()
+    if storage is not None and url:
+        storage.delete_url(url)
+
+def _delete_minio_objects_by_url_global(urls, prefixes=()):
+    """
+    Batched best-effort delete of our objects behind ``urls`` and under
+    ``prefixes``; runs in the background when MEDIA_BACKGROUND_DELETES is set.
+    """
+    storage = get_storage()
+    if storage is not None:
+        storage.delete_urls(urls, prefixes)
+
+def _file_extension_global(filename: str | None) -> str:
+    _, ext = os.path.splitext(filename or '')
+    return ext or '.bin'
+
+def _unique_object_name_global(object_name: str) -> str:
+    """``dir/name.<uuid>.ext``: a fresh name next to ``object_name``, so an upload never overwrites a stored file."""
+    root, ext = os.path.splitext(object_name)
+    return f"{root}.{uuid.uuid4().hex}{ext}"
+
+def _is_unique_object_name_global(object_name: str) -> bool:
+    root, _ = os.path.splitext(object_name)
+    token = root.rsplit('.', 1)[-1] if '.' in root else ''
+    return len(token) == 32 and all(c in '0123456789abcdef' for c in token)
+
+def _presigned_upload_response_global(object_name: str, content_type: str | None = None):
+    """
+    Presigned PUT URL for a fresh name next to ``object_name``, so the
+    stored file is untouched until the upload is confirmed. The client
+    uploads directly to storage, then calls the matching confirm endpoint
+    with the returned ``object_name``.
+    """
+    storage = get_storage()
+    if storage is None:
+        return Response({'error': 'Storage backend not available'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    object_name = _unique_object_name_global(object_name)
+    expires = settings.MEDIA_PRESIGNED_UPLOAD_EXPIRY
+    try:
+        upload_url = storage.presign_put(object_name, expires)
+    except Exception as e:
+        return Response({'error': f'Could not create upload URL: {str(e)}'}, status=status.HTTP_502_BAD_GATEWAY)
+    return Response({
+        'object_name': object_name,
+        'upload_url': upload_url,
+        'method': 'PUT',
+        'headers': {'Content-Type': content_type} if content_type else {},
+        'expires_in': expires,
+        'max_bytes': settings.MEDIA_UPLOAD_MAX_BYTES,
+    })
+
+def _zip_download_response_global(entries, filename: str):
+    """
+    Stream a ZIP of ``(arcname, url)`` entries straight from storage; the
+    extension of each stored object is appended to its arcname.
+    """
+    storage = get_storage()
+    if storage is None:
+        return Response({'error': 'Storage backend not available'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    objects, used = [], set()
+    for arcname, url in entries:
+        object_name = storage.object_name_for_url(url)
+        if object_name is None:
+            continue
+        _, ext = os.path.splitext(object_name)
+        objects.append((unique_arcname(f"{arcname}{ext}", used), object_name))
+    if not objects:
+        return Response({'error': 'No stored files to download'}, status=status.HTTP_404_NOT_FOUND)
+    response = StreamingHttpResponse(stream_zip(storage, objects), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def _confirm_uploaded_object_global(object_name: str | None, prefix: str):
+    """
+    Verify a directly uploaded object: it must be a name handed out by
+    _presigned_upload_response_global under ``prefix``, exist and fit MEDIA_UPLOAD_MAX_BYTES (oversized objects are
+    removed). Returns ``(url, None)`` or ``(None, error_response)``.
+    """
+    if (not object_name or not object_name.startswith(prefix) or '..' in object_name
+            or not _is_unique_object_name_global(object_name)):
+        return None, Response({'error': 'object_name does not belong to this upload'}, status=status.HTTP_400_BAD_REQUEST)
+    storage = get_storage()
+    if storage is None:
+        return None, Response({'error': 'Storage backend not available'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    try:
+        stored = storage.stat(object_name)
+    except Exception as e:
+        return None, Response({'error': f'Could not verify upload: {str(e)}'}, status=status.HTTP_502_BAD_GATEWAY)
+    if stored is None:
+        return None, Response({'error': 'Uploaded object not found'}, status=status.HTTP_404_NOT_FOUND)
+    if stored.size > settings.MEDIA_UPLOAD_MAX_BYTES:
+        storage.delete_url(storage.url_for(object_name))
+        return None, Response({'error': f'File exceeds {settings.MEDIA_UPLOAD_MAX_BYTES} bytes'}, status=status.HTTP_400_BAD_REQUEST)
+    return storage.url_for(object_name), None
 
 # ------------------- USER REGISTRATION -------------------
 @api_view(['POST'])
@@ -347,7 +462,7 @@ def id_card_view(request):
             if created or not id_card.id_card_url:
                 # Generate ID card using IDCardViewSet methods
                 id_card_viewset = IDCardViewSet()
-                pdf_content = id_card_viewset._generate_id_card_pdf(user)
+                pdf_content, _ = id_card_viewset._generate_id_card_pdf(user)
                 url = id_card_viewset._upload_file_to_minio(user, pdf_content, user.email)
                 if url:
                     id_card.id_card_url = url
@@ -548,17 +663,6 @@ class StudentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
-    def _minio_client(self):
-        if Minio is None:
-            return None
-        cfg = settings.MINIO_STORAGE
-        return Minio(
-            cfg['ENDPOINT'],
-            access_key=cfg['ACCESS_KEY'],
-            secret_key=cfg['SECRET_KEY'],
-            secure=cfg.get('USE_SSL', True),
-        )
-
     def _object_name_for_student(self, student, fallback_email: str | None = None, fallback_student_id: str | None = None) -> str:
         identifier = None
         if hasattr(student, 'student_id') and student.student_id:
@@ -570,16 +674,8 @@ class StudentViewSet(viewsets.ModelViewSet):
         return f"images/{identifier}/profile.jpg"
 
     def _upload_file_to_minio(self, student, file, fallback_email: str | None = None, fallback_student_id: str | None = None):
-        client = self._minio_client()
-        if client is None:
-            return None
-        bucket = settings.MINIO_STORAGE['BUCKET_NAME']
         object_name = self._object_name_for_student(student, fallback_email, fallback_student_id)
-        client.put_object(bucket, object_name, file.file, file.size, content_type=getattr(file, 'content_type', 'application/octet-stream'))
-        base = settings.BASE_BUCKET_URL
-        if not base.endswith('/'):
-            base += '/'
-        return f"{base}{object_name}"
+        return _upload_profile_picture_global(object_name, file)
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -594,6 +690,9 @@ class StudentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        if file:
+            # The row now points at the new picture; drop the one it replaced
+            _delete_replaced_profile_pictures_global(url)
         return Response(serializer.data)
 
     def partial_update(self, request, *args, **kwargs):
@@ -615,6 +714,9 @@ class StudentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
+        if file:
+            # The row now points at the new picture; drop the one it replaced
+            _delete_replaced_profile_pictures_global(url)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
@@ -628,6 +730,37 @@ class StudentViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response({'error': 'class_id parameter required'}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['post'])
+    def presign_profile_picture(self, request, pk=None):
+        """Presigned PUT URL for uploading this student's profile picture directly to storage."""
+        student = self.get_object()
+        return _presigned_upload_response_global(self._object_name_for_student(student), request.data.get('content_type'))
+
+    @action(detail=True, methods=['post'])
+    def confirm_profile_picture(self, request, pk=None):
+        """Record the profile picture uploaded through presign_profile_picture. Body: object_name."""
+        student = self.get_object()
+        object_name = self._object_name_for_student(student)
+        staged_name = request.data.get('object_name')
+        root, _ = os.path.splitext(object_name)
+        _, error = _confirm_uploaded_object_global(staged_name, f"{root}.")
+        if error is not None:
+            return error
+        storage = get_storage()
+        if storage is None:
+            return Response({'error': 'Storage backend not available'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        # Uploaded straight to storage, so the picture and its variants are
+        # processed here and stored under the profile picture's own name
+        try:
+            url = store_profile_picture(storage, object_name, storage.get(staged_name), keep_previous=True)
+        except Exception as e:
+            return Response({'error': f'Could not process profile picture: {str(e)}'}, status=status.HTTP_502_BAD_GATEWAY)
+        storage.delete_url(storage.url_for(staged_name))
+        student.profile_picture = url
+        student.save(update_fields=['profile_picture'])
+        _delete_replaced_profile_pictures_global(url)
+        return Response(self.get_serializer(student).data)
+
 
 # ------------------- AWARD VIEWSET -------------------
 class AwardViewSet(viewsets.ModelViewSet):
@@ -752,350 +885,27 @@ class IDCardViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
-    def _minio_client(self):
-        if Minio is None:
-            return None
-        cfg = settings.MINIO_STORAGE
-        return Minio(
-            cfg['ENDPOINT'],
-            access_key=cfg['ACCESS_KEY'],
-            secret_key=cfg['SECRET_KEY'],
-            secure=cfg.get('USE_SSL', True),
-        )
-
     def _object_name_for_idcard(self, user, fallback_email: str | None = None) -> str:
-        identifier = None
-        if hasattr(user, 'email'):
-            identifier = user.email.replace('@', '_').replace('.', '_')
-        if not identifier and fallback_email:
-            identifier = fallback_email.replace('@', '_').replace('.', '_')
-        if not identifier:
-            identifier = 'unknown'
-        return f"id_cards/{identifier}.pdf"
+        return id_card_object_name(getattr(user, 'email', None) or fallback_email)
 
     def _upload_file_to_minio(self, user, pdf_content, fallback_email: str | None = None):
-        client = self._minio_client()
-        if client is None:
+        storage = get_storage()
+        if storage is None:
             return None
-        bucket = settings.MINIO_STORAGE['BUCKET_NAME']
         object_name = self._object_name_for_idcard(user, fallback_email)
         
         # Upload PDF content directly
-        client.put_object(bucket, object_name, pdf_content, len(pdf_content.getvalue()), content_type='application/pdf')
-        base = settings.BASE_BUCKET_URL
-        if not base.endswith('/'):
-            base += '/'
-        return f"{base}{object_name}"
-
-    def _generate_id_card_pdf(self, user):
-        """Generate PDF for the ID card using the theme from index.html."""
-        try:
-            # Import ReportLab modules for PDF generation
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.pagesizes import letter
-            from reportlab.lib.colors import Color
-            from reportlab.lib.utils import ImageReader
-            import requests
-            from io import BytesIO
-            
-            # Get user details based on role
-            user_name = getattr(user, 'email', 'Unknown User')
-            position = getattr(user, 'role', 'Unknown Role')
-            phone = ''
-            id_no = ''
-            profile_picture_url = ''
-            dob = ''
-            company_name = 'SCHOOL NAME'
-            
-            if hasattr(user, 'student') and user.student:
-                student = user.student
-                user_name = student.fullname
-                dob = student.date_of_birth.strftime('%m/%d/%Y') if student.date_of_birth else 'MM/DD/YEAR'
-                phone = student.phone or '+91 9876543210'
-                id_no = student.student_id or 'RST-0012'
-                profile_picture_url = student.profile_picture or 'profile.jpg'
-                if student.class_id:
-                    position = f"Student - {student.class_id.class_name} {student.class_id.sec}"
-                    
-            elif hasattr(user, 'teacher') and user.teacher:
-                teacher = user.teacher
-                user_name = teacher.fullname
-                dob = teacher.date_of_birth.strftime('%m/%d/%Y') if teacher.date_of_birth else 'MM/DD/YEAR'
-                phone = teacher.phone or '+91 9876543210'
-                id_no = teacher.teacher_id or 'RST-0012'
-                profile_picture_url = teacher.profile_picture or 'profile.jpg'
-                if teacher.department:
-                    position = f"Teacher - {teacher.department.department_name}"
-                    
-            elif hasattr(user, 'principal') and user.principal:
-                principal = user.principal
-                user_name = principal.fullname
-                dob = principal.date_of_birth.strftime('%m/%d/%Y') if principal.date_of_birth else 'MM/DD/YEAR'
-                phone = principal.phone or '+91 9876543210'
-                id_no = 'PRN-001'
-                profile_picture_url = principal.profile_picture or 'profile.jpg'
-                position = 'Principal'
-                
-            elif hasattr(user, 'management') and user.management:
-                management = user.management
-                user_name = management.fullname
-                dob = management.date_of_birth.strftime('%m/%d/%Y') if management.date_of_birth else 'MM/DD/YEAR'
-                phone = management.phone or '+91 9876543210'
-                id_no = 'MGT-001'
-                profile_picture_url = management.profile_picture or 'profile.jpg'
-                if management.designation:
-                    position = f"Management - {management.designation}"
-                    
-            elif hasattr(user, 'admin') and user.admin:
-                admin = user.admin
-                user_name = admin.fullname
-                phone = admin.phone or '+91 9876543210'
-                id_no = 'ADM-001'
-                profile_picture_url = admin.profile_picture or 'profile.jpg'
-                position = 'Admin'
-                
-            elif hasattr(user, 'parent') and user.parent:
-                parent = user.parent
-                user_name = parent.fullname
-                dob = parent.date_of_birth.strftime('%m/%d/%Y') if parent.date_of_birth else 'MM/DD/YEAR'
-                phone = parent.phone or '+91 9876543210'
-                id_no = 'PRT-001'
-                profile_picture_url = parent.profile_picture or 'profile.jpg'
-                position = 'Parent'
-
-            # Create PDF with dimensions matching the HTML template (330px width)
-            # Convert pixels to points (1 pixel = 0.75 points)
-            # Increase height from 400 to 450 pixels to add more space below barcode
-            width_points = 330 * 0.75
-            height_points = 450 * 0.75
-            
-            # Create a BytesIO buffer for the PDF
-            pdf_buffer = BytesIO()
-            
-            # Create canvas
-            c = canvas.Canvas(pdf_buffer, pagesize=(width_points, height_points))
-            
-            # Define colors
-            background_color = Color(0.913, 0.929, 0.945)  # #e9edf1
-            header_color = Color(0.027, 0.153, 0.235)     # #07273C
-            text_color = Color(0, 0, 0)                    # #000000
-            gray_text = Color(0.467, 0.467, 0.467)        # #777777
-            light_gray = Color(0.867, 0.867, 0.867)       # #dddddd
-            
-            # Draw background
-            c.setFillColor(background_color)
-            c.rect(0, 0, width_points, height_points, fill=1)
-            
-            # Draw header area (dark blue background)
-            header_height = 120 * 0.75
-            c.setFillColor(header_color)
-            c.rect(0, height_points - header_height, width_points, header_height, fill=1)
-            
-            # Add company name in header
-            c.setFillColor(Color(1, 1, 1))  # White text
-            c.setFont("Helvetica-Bold", 15)
-            c.drawCentredString(width_points/2, height_points - 35*0.75, company_name)
-            
-            # Removed skewed header effect to eliminate empty box lines
-            
-            # Draw profile picture area (110x110px)
-            profile_size = 110 * 0.75
-            profile_x = width_points // 2 - profile_size // 2
-            # Move profile picture to -20px from top (partially cut off)
-            profile_y = height_points - 60*0.75 - profile_size
-            
-            # Add white border around profile picture
-            border_width = 5 * 0.75
-            c.setFillColor(Color(1, 1, 1))  # White border
-            c.rect(profile_x - border_width, profile_y - border_width, 
-                   profile_size + 2*border_width, profile_size + 2*border_width, fill=1)
-            
-            # Load profile picture if available
-            if profile_picture_url and profile_picture_url.strip() and profile_picture_url != 'profile.jpg':
-                try:
-                    # Add scheme if missing
-                    if not profile_picture_url.startswith(('http://', 'https://')):
-                        profile_picture_url = 'https://' + profile_picture_url
-                    response = requests.get(profile_picture_url, timeout=10)
-                    if response.status_code == 200:
-                        profile_image_buffer = BytesIO(response.content)
-                        # Draw profile picture
-                        c.drawImage(ImageReader(profile_image_buffer), 
-                                   profile_x, profile_y, 
-                                   profile_size, profile_size)
-                except Exception as e:
-                    # If profile picture fails to load, continue without it
-                    pass
-            
-            # Add user name and position (shifted upward)
-            name_y = profile_y - 40*0.75  # Increased gap from 30*0.75 to 40*0.75 (10px more)
-            
-            # Handle long names by wrapping to multiple lines
-            c.setFillColor(text_color)
-            c.setFont("Helvetica-Bold", 15)
-            
-            # Split long names into multiple lines if needed
-            max_name_width = width_points - 40  # Leave some margin on both sides
-            name_lines = []
-            
-            # If the name is too long, split it into multiple lines
-            if c.stringWidth(user_name, "Helvetica-Bold", 15) > max_name_width:
-                words = user_name.split(' ')
-                current_line = ""
-                
-                for word in words:
-                    # Check if adding this word would exceed the width
-                    test_line = current_line + " " + word if current_line else word
-                    if c.stringWidth(test_line, "Helvetica-Bold", 15) <= max_name_width:
-                        current_line = test_line
-                    else:
-                        # If current_line is not empty, add it to lines
-                        if current_line:
-                            name_lines.append(current_line)
-                            current_line = word
-                        else:
-                            # If the single word is too long, we'll have to break it
-                            name_lines.append(word)
-                
-                # Add the last line
-                if current_line:
-                    name_lines.append(current_line)
-            else:
-                # Name fits in one line
-                name_lines = [user_name]
-            
-            # Draw the name lines
-            line_height = 18  # Height between lines
-            total_name_height = len(name_lines) * line_height
-            
-            # Adjust position based on number of lines
-            current_name_y = name_y + (total_name_height - line_height) / 2
-            
-            for i, line in enumerate(name_lines):
-                c.drawCentredString(width_points/2, current_name_y - i * line_height, line)
-            
-            position_y = name_y - (total_name_height - line_height) / 2 - 15*0.75  # Increased spacing from 22 to 15
-            c.setFillColor(gray_text)
-            c.setFont("Helvetica", 12)
-            c.drawCentredString(width_points/2, position_y, position)
-            
-            # Add info section (shifted downward)
-            info_start_y = position_y - 18*0.75  # Moved down by 10px from 28*0.75
-            info_padding = 35 * 0.75
-            info_x_start = info_padding
-            info_x_end = width_points - info_padding
-            
-            # Draw info items (without email and horizontal lines)
-            c.setFont("Helvetica-Bold", 10)
-            c.setFillColor(text_color)
-            
-            info_items = [
-                ('DOB:', dob),
-                ('Phone:', phone),
-                ('ID No:', id_no)
-            ]
-            
-            current_y = info_start_y
-            for label, value in info_items:
-                # Draw label in bold
-                c.setFont("Helvetica-Bold", 10)
-                c.drawString(info_x_start, current_y, label)
-                # Draw value aligned to the right
-                c.setFont("Helvetica", 10)
-                c.drawRightString(info_x_end, current_y, value)
-                # Skip drawing horizontal lines
-                # Increased line spacing from 18*0.75 to 25*0.75 for better readability
-                current_y -= 25*0.75
-            
-            # Generate barcode
-            try:
-                # Import barcode modules if not already imported
-                import barcode
-                from barcode.writer import ImageWriter
-                
-                if barcode is not None and ImageWriter is not None:
-                    code128 = barcode.get_barcode_class('code128')
-                    barcode_instance = code128(user.email, writer=ImageWriter())
-                    
-                    # Generate the barcode image in memory without text
-                    barcode_buffer = BytesIO()
-                    barcode_instance.write(barcode_buffer, options={'write_text': False})
-                    barcode_buffer.seek(0)
-                    
-                    # NOTE: We no longer upload barcode to MinIO separately
-                    # The barcode is only embedded in the ID card PDF
-                    
-                    # Add barcode to PDF if available (centered)
-                    # Move barcode upward (closer to info section)
-                    barcode_y = current_y - 45*0.75  # Moved up from 55 to 45 pixels
-                    barcode_width = 160 * 0.75
-                    barcode_height = 45 * 0.75
-                    barcode_x = width_points // 2 - barcode_width // 2
-                    
-                    # Draw barcode image
-                    c.drawImage(ImageReader(barcode_buffer), 
-                               barcode_x, barcode_y, 
-                               barcode_width, barcode_height)
-                    
-                    # Add more space below the barcode (move footer down)
-                    space_below_barcode = 40 * 0.75  # Moved up from 50 to 40 pixels
-            except Exception as e:
-                # If barcode generation fails, continue without it
-                pass
-                space_below_barcode = 0
-            
-            # Draw footer at the bottom of the card
-            footer_height = 45 * 0.75
-            footer_y = 0  # Position at the very bottom
-            c.setFillColor(header_color)
-            c.rect(0, footer_y, width_points, footer_height, fill=1)
-            
-            # Removed footer skewed effect to eliminate empty box lines
-            
-            # Save the PDF
-            c.save()
-            pdf_buffer.seek(0)
-            
-            return pdf_buffer
-        except Exception as e:
-            # If anything fails, return a simple placeholder PDF
-            try:
-                from reportlab.pdfgen import canvas
-                from io import BytesIO
-                
-                width_points = 330 * 0.75
-                height_points = 400 * 0.75
-                
-                pdf_buffer = BytesIO()
-                c = canvas.Canvas(pdf_buffer, pagesize=(width_points, height_points))
-                
-                # Draw background
-                c.setFillColor(Color(0.913, 0.929, 0.945))
-                c.rect(0, 0, width_points, height_points, fill=1)
-                
-                # Add error message
-                c.setFillColor(Color(0, 0, 0))
-                c.setFont("Helvetica", 12)
-                c.drawCentredString(width_points/2, height_points/2, 'ID Card Generation Failed')
-                
-                c.save()
-                pdf_buffer.seek(0)
-                
-                return pdf_buffer
-            except Exception:
-                # If even the fallback fails, return a minimal PDF
-                from reportlab.pdfgen import canvas
-                from io import BytesIO
-                
-                width_points = 330 * 0.75
-                height_points = 400 * 0.75
-                
-                pdf_buffer = BytesIO()
-                c = canvas.Canvas(pdf_buffer, pagesize=(width_points, height_points))
-                c.save()
-                pdf_buffer.seek(0)
-                
-                return pdf_buffer
+        return storage.put(object_name, pdf_content, len(pdf_content.getvalue()), content_type='application/pdf')
+
+    def _generate_id_card_pdf(self, user, data=None):
+        """
+        Render the ID card using the shared card template. Returns
+        ``(pdf_buffer, complete)``; ``complete`` is False when the profile
+        picture could not be drawn. Render errors propagate.
+        """
+        data = data or id_card_data(user)
+        photo = load_card_photo(data['photo_url'])
+        return render_id_card(data, photo), not photo_missing(data, photo)
 
     @action(detail=False, methods=['get'])
     def check_by_email(self, request):
@@ -1132,70 +942,82 @@ class IDCardViewSet(viewsets.ModelViewSet):
         # Check if ID card already exists
         id_card, created = IDCard.objects.get_or_create(user=user)
         
-        # Always regenerate the ID card to ensure it's a PDF
-        # Generate PDF content for ID card
-        pdf_content = self._generate_id_card_pdf(user)
-        
-        # Upload to MinIO
-        url = self._upload_file_to_minio(user, pdf_content, email)
-        if url is None:
-            return Response({'error': 'Failed to upload ID card to storage'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        # Save URL to database
-        id_card.id_card_url = url
-        id_card.save()
+        # Reuse the stored card when nothing printed on it has changed,
+        # unless the caller forces a rebuild with ?force=1
+        data = id_card_data(user)
+        fingerprint = id_card_fingerprint(data)
+        force = str(request.query_params.get('force') or request.data.get('force') or '').lower() in ('1', 'true', 'yes')
+        if not force and id_card.id_card_url and id_card.fingerprint == fingerprint:
+            serializer = self.get_serializer(id_card)
+            return Response(serializer.data, status=status.HTTP_200_OK)
         
-        serializer = self.get_serializer(id_card)
-        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
-            
         # Generate PDF content for ID card
-        pdf_content = self._generate_id_card_pdf(user)
+        try:
+            pdf_content, complete = self._generate_id_card_pdf(user, data)
+        except Exception as e:
+            return Response({'error': f'Failed to generate ID card: {str(e)}'},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         # Upload to MinIO
         url = self._upload_file_to_minio(user, pdf_content, email)
         if url is None:
             return Response({'error': 'Failed to upload ID card to storage'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-        # Save URL to database
+        
+        # Save URL to database; a card drawn without its picture keeps no
+        # fingerprint so the next request renders it again
         id_card.id_card_url = url
+        id_card.fingerprint = fingerprint if complete else ''
         id_card.save()
         
         serializer = self.get_serializer(id_card)
         return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
-def _generate_barcode_for_user(user):
-    """Generate a barcode for a user and return the MinIO URL without uploading."""
-    # Check if barcode library is available
-    if barcode is None or ImageWriter is None:
-        raise Exception('Barcode generation library not installed. Please install python-barcode.')
-    
-    try:
-        # Create a Code128 barcode using the user's email as the data
-        code128 = barcode.get_barcode_class('code128')
-        if code128 is None:
-            raise Exception('Failed to get barcode class')
-        barcode_instance = code128(user.email, writer=ImageWriter())
-        
-        # Generate the barcode image in memory without text
-        from io import BytesIO
-        buffer = BytesIO()
-        # Write the barcode without text
-        barcode_instance.write(buffer, options={'write_text': False})
-        buffer.seek(0)
-        
-        # NOTE: We no longer upload barcode to MinIO separately
-        # The barcode is only embedded in the ID card PDF
-        # Return None to indicate no separate storage
-        return None
-    except Exception as e:
-        # Re-raise the exception with more details
-        raise Exception(f'Failed to generate barcode: {str(e)}')
+    @action(detail=False, methods=['get'])
+    def sheet(self, request):
+        """
+        GET /api/id_cards/sheet/?class_id=<id>&role=<role>&columns=3&rows=3
+        Print-ready A4 sheets with several cards per page, as one PDF. Cards
+        are drawn with the same layout as single cards; the PDF is spooled
+        to a temporary file and streamed from there.
+        """
+        class_id = request.query_params.get('class_id')
+        role = request.query_params.get('role')
+        if not class_id and not role:
+            return Response({'error': 'class_id or role is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            columns = min(max(int(request.query_params.get('columns', SHEET_COLUMNS)), 1), 5)
+            rows = min(max(int(request.query_params.get('rows', SHEET_ROWS)), 1), 6)
+        except ValueError:
+            return Response({'error': 'columns and rows must be integers'}, status=status.HTTP_400_BAD_REQUEST)
 
+        users = id_card_users(role=role, class_id=class_id)
+        if not users.exists():
+            return Response({'error': 'No users found'}, status=status.HTTP_404_NOT_FOUND)
 
-def _object_name_for_barcode_global(user) -> str:
-    """Generate object name for user barcode."""
-    # This function is no longer used since we don't store barcodes separately
-    return ""
+        pdf_file = tempfile.TemporaryFile()
+        render_id_card_sheets(sheet_cards(users.iterator(chunk_size=500)), pdf_file, columns, rows)
+        pdf_file.seek(0)
+        filename = f"id_cards_{f'class_{class_id}' if class_id else role}.pdf"
+        return FileResponse(pdf_file, as_attachment=True, filename=filename, content_type='application/pdf')
+
+
+# ------------------- PHOTO CACHE -------------------
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def photo_cache_stats(request):
+    """Hit/miss counters of the profile photo cache in this worker process."""
+    return Response(get_photo_cache().stats())
+
+
+# ------------------- MEDIA STORAGE -------------------
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def storage_stats(request):
+    """Per-operation timing metrics of the media storage backend in this worker process."""
+    storage = get_storage()
+    if storage is None:
+        return Response({'error': 'Storage backend not available'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response({'backend': storage.name, 'operations': storage.metrics.snapshot()})
 
 
 # ------------------- USER REGISTRATION -------------------
@@ -1275,17 +1097,6 @@ class TimetableViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(student)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    def _minio_client(self):
-        if Minio is None:
-            return None
-        cfg = settings.MINIO_STORAGE
-        return Minio(
-            cfg['ENDPOINT'],
-            access_key=cfg['ACCESS_KEY'],
-            secret_key=cfg['SECRET_KEY'],
-            secure=cfg.get('USE_SSL', True),
-        )
-
     def _object_name_for_student(self, student, fallback_email: str | None = None, fallback_student_id: str | None = None) -> str:
         identifier = None
         if hasattr(student, 'student_id') and student.student_id:
@@ -1297,16 +1108,8 @@ class TimetableViewSet(viewsets.ModelViewSet):
         return f"images/{identifier}/profile.jpg"
 
     def _upload_file_to_minio(self, student, file, fallback_email: str | None = None, fallback_student_id: str | None = None):
-        client = self._minio_client()
-        if client is None:
-            return None
-        bucket = settings.MINIO_STORAGE['BUCKET_NAME']
         object_name = self._object_name_for_student(student, fallback_email, fallback_student_id)
-        client.put_object(bucket, object_name, file.file, file.size, content_type=getattr(file, 'content_type', 'application/octet-stream'))
-        base = settings.BASE_BUCKET_URL
-        if not base.endswith('/'):
-            base += '/'
-        return f"{base}{object_name}"
+        return _upload_profile_picture_global(object_name, file)
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -1321,6 +1124,9 @@ class TimetableViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        if file:
+            # The row now points at the new picture; drop the one it replaced
+            _delete_replaced_profile_pictures_global(url)
         return Response(serializer.data)
 
     def partial_update(self, request, *args, **kwargs):
@@ -1342,6 +1148,9 @@ class TimetableViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
+        if file:
+            # The row now points at the new picture; drop the one it replaced
+            _delete_replaced_profile_pictures_global(url)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
@@ -1418,6 +1227,9 @@ class TeacherViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        if file:
+            # The row now points at the new picture; drop the one it replaced
+            _delete_replaced_profile_pictures_global(url)
         return Response(serializer.data)
 
     def partial_update(self, request, *args, **kwargs):
@@ -1481,6 +1293,9 @@ class PrincipalViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        if file:
+            # The row now points at the new picture; drop the one it replaced
+            _delete_replaced_profile_pictures_global(url)
         return Response(serializer.data)
 
     def partial_update(self, request, *args, **kwargs):
@@ -1545,6 +1360,9 @@ class ManagementViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        if file:
+            # The row now points at the new picture; drop the one it replaced
+            _delete_replaced_profile_pictures_global(url)
         return Response(serializer.data)
 
     def partial_update(self, request, *args, **kwargs):
@@ -1608,6 +1426,9 @@ class AdminViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        if file:
+            # The row now points at the new picture; drop the one it replaced
+            _delete_replaced_profile_pictures_global(url)
         return Response(serializer.data)
 
     def partial_update(self, request, *args, **kwargs):
@@ -1671,6 +1492,9 @@ class ParentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
+        if file:
+            # The row now points at the new picture; drop the one it replaced
+            _delete_replaced_profile_pictures_global(url)
         return Response(serializer.data)
 
     def partial_update(self, request, *args, **kwargs):
@@ -2199,6 +2023,148 @@ class GradeViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response({'error': 'student_email parameter required'}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """
+        GET /api/grades/analytics/
+        Score statistics (mean, median, std, percentiles, pass rate, histogram)
+        overall and per class, subject and exam type. Accepts the usual grade
+        filters plus class_id. Results are cached per slice and invalidated
+        whenever a grade in the slice is added, changed or removed.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        class_id = request.query_params.get('class_id')
+        if class_id:
+            queryset = queryset.filter(student__class_id=class_id)  # type: ignore[union-attr]
+
+        # Slice version: latest change plus row count (so deletions count too)
+        version = queryset.order_by().aggregate(latest=models.Max('updated_at'), rows=models.Count('id'))  # type: ignore[union-attr]
+        params = sorted((k, v) for k, v in request.query_params.items() if k not in ('page', 'page_size'))
+        raw_key = f"{params}|{version['latest']}|{version['rows']}"
+        cache_key = 'grade_analytics:' + hashlib.md5(raw_key.encode()).hexdigest()
+
+        data = cache.get(cache_key)
+        if data is None:
+            data = grade_analytics(queryset)
+            cache.set(cache_key, data, ANALYTICS_CACHE_TIMEOUT)
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def matrix(self, request):
+        """
+        GET /api/grades/matrix/?class_id=&exam_type=&term=
+        Grade book for one class as a students x subjects pivot, built from a
+        single joined query. ``marks[i][j]`` is ``[grade_id, marks_obtained,
+        total_marks]`` for students[i] and subjects[j], or null. Every student
+        in the class gets a row, graded or not. When a student has several
+        grades for a subject in the slice, the latest one is used.
+        """
+        class_id = request.query_params.get('class_id')
+        if not class_id:
+            return Response({'error': 'class_id parameter required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            class_id = int(class_id)
+            subject = int(request.query_params['subject']) if request.query_params.get('subject') else None
+        except ValueError:
+            return Response({'error': 'class_id and subject must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        grades = Grade.objects.filter(student__class_id=class_id)
+        for param in ('exam_type', 'term'):
+            value = request.query_params.get(param)
+            if value:
+                grades = grades.filter(**{param: value})
+        if subject is not None:
+            grades = grades.filter(subject=subject)
+
+        # Rows come from the class roster, so ungraded students are listed too
+        roster = Student.objects.filter(class_id=class_id).values_list('email', 'student_id', 'fullname').order_by('fullname', 'email')
+        students = {
+            email: (row, {'email': email, 'student_id': student_id, 'name': fullname})
+            for row, (email, student_id, fullname) in enumerate(roster)
+        }
+
+        rows = grades.values_list(
+            'id', 'student', 'subject', 'subject__subject_code', 'subject__subject_name',
+            'marks_obtained', 'total_marks',
+        ).order_by('exam_date', 'id')
+
+        subjects = {}
+        cells = {}
+        for grade_id, email, subject_id, code, subject_name, obtained, total in rows:
+            row = students[email][0]
+            col = subjects.setdefault(subject_id, (len(subjects), {'id': subject_id, 'code': code, 'name': subject_name}))[0]
+            cells[(row, col)] = [grade_id, str(obtained), str(total)]
+
+        # Subject columns in name order; rows follow the roster, sorted by name
+        ordered_subjects = sorted(subjects.values(), key=lambda item: item[1]['name'])
+        column_of = {old: new for new, (old, _) in enumerate(ordered_subjects)}
+        marks = [[None] * len(subjects) for _ in range(len(students))]
+        for (row, col), cell in cells.items():
+            marks[row][column_of[col]] = cell
+
+        return Response({
+            'class_id': class_id,
+            'exam_type': request.query_params.get('exam_type'),
+            'term': request.query_params.get('term'),
+            'students': [info for _, info in students.values()],
+            'subjects': [info for _, info in ordered_subjects],
+            'marks': marks,
+        })
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser, JSONParser])
+    def bulk_import(self, request):
+        """
+        POST /api/grades/bulk_import/
+        Import a marks sheet in one request. Send either a CSV/XLSX ``file``
+        or a JSON ``rows`` list with columns student_id, subject_code,
+        exam_type, marks_obtained, total_marks, exam_date and remarks.
+        exam_type, exam_date, total_marks, subject_code and teacher may also be
+        given once as request fields and apply to every row that omits them.
+        Existing marks for the same student, subject, exam type and date are
+        updated. Nothing is saved if any row is invalid.
+        """
+        uploaded = request.FILES.get('file')
+        first_row = 2  # sheet row numbers, after the header line
+        if uploaded is not None:
+            try:
+                rows = parse_grade_sheet(uploaded)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            rows = request.data.get('rows')
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                return Response({'error': 'Provide a CSV/XLSX file or a "rows" list'}, status=status.HTTP_400_BAD_REQUEST)
+            first_row = 1
+
+        defaults = {key: request.data.get(key) for key in ('exam_type', 'exam_date', 'total_marks', 'subject_code', 'teacher')}
+        imported, errors = import_grades(rows, defaults, first_row=first_row)
+        if errors:
+            return Response({'error': 'Import failed, no marks were saved', 'rows': errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'message': f'{imported} marks imported', 'imported': imported}, status=status.HTTP_200_OK)
+
+
+
+# ------------------- CLASS RANKING VIEWSET -------------------
+class ClassRankingViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Precomputed leaderboards. Filter by class_id for a section, or by
+    class_name for a whole grade level, together with exam_type and term.
+    """
+    queryset = ClassRanking.objects.select_related('student', 'class_id')
+    serializer_class = ClassRankingSerializer
+    permission_classes = [AllowAny]
+    pagination_class = CustomPageNumberPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]  # type: ignore[assignment]
+    filterset_fields = ['class_id', 'class_name', 'exam_type', 'term', 'student']
+    ordering_fields = ['rank', 'level_rank', 'percentage']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Sections read the section index, levels the level index
+        if self.request.query_params.get('class_id'):
+            return queryset.order_by('rank', 'student')
+        return queryset.order_by('level_rank', 'student')
+
 
 # ------------------- FEE STRUCTURE VIEWSET -------------------
 class FeeStructureViewSet(viewsets.ModelViewSet):
@@ -2436,6 +2402,7 @@ class FormerMemberViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({'error': 'minio Python package is not installed. Please install dependencies from requirements.txt.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         member.profile_picture = url
         member.save()
+        _delete_replaced_profile_pictures_global(url)
         serializer = self.get_serializer(member)
         return Response(serializer.data, status=status.HTTP_200_OK)
 # =================== FACE + LOCATION ATTENDANCE (ALL USERS) ===================
@@ -2651,33 +2618,19 @@ def school_attendance_view(request):
                     if not profile_obj or not profile_obj.profile_picture:
                         continue
                         
-                    resp = requests.get(profile_obj.profile_picture, timeout=10)
-                    if resp.status_code != 200:
+                    # Cached per URL and revalidated by ETag, so unchanged
+                    # pictures are not downloaded again on every check; the
+                    # 512 px variant is plenty for face matching
+                    photo = fetch_profile_picture(profile_obj.profile_picture, 512)
+                    if photo is None:
                         continue
-                    # Determine file extension from content type or default to .jpg
-                    file_extension = '.jpg'  # default
-                    content_type = resp.headers.get('content-type', '')
-                    if 'png' in content_type:
-                        file_extension = '.png'
-                    elif 'jpeg' in content_type:
-                        file_extension = '.jpeg'
-                    elif 'jpg' in content_type:
-                        file_extension = '.jpg'
-                    
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as s_tmp:
-                        s_tmp.write(resp.content)
-                        s_path = s_tmp.name
                     try:
                         fr = face_recognition
                         if fr is None:
                             # Skip face recognition if library is not available
-                            if os.path.exists(s_path):
-                                os.remove(s_path)
                             continue
-                        s_img = fr.load_image_file(s_path)
+                        s_img = fr.load_image_file(BytesIO(photo))
                         s_encs = fr.face_encodings(s_img)
-                        if os.path.exists(s_path):
-                            os.remove(s_path)
                         if not s_encs:
                             continue
                         # Validate uploaded encoding before computing distance
@@ -2716,8 +2669,6 @@ def school_attendance_view(request):
                             pass
                     except Exception:
                         # If there's an error processing this user's image, continue with others
-                        if os.path.exists(s_path):
-                            os.remove(s_path)
                         continue
                 except Exception:
                     continue
@@ -2749,26 +2700,16 @@ def school_attendance_view(request):
                         debug_entry = {'email': user.email, 'url': profile_obj.profile_picture, 'status': 'Checking'}
                         
                         try:
-                            resp = requests.get(profile_obj.profile_picture, timeout=5)
-                            if resp.status_code != 200:
-                                debug_entry['status'] = f'Download Failed: {resp.status_code}'
+                            photo = fetch_profile_picture(profile_obj.profile_picture, 512)
+                            if photo is None:
+                                debug_entry['status'] = 'Download Failed'
                                 debug_info.append(debug_entry)
                                 continue
-                            
-                            # Determine extension
-                            file_extension = '.jpg'
-                            content_type = resp.headers.get('content-type', '')
-                            if 'png' in content_type: file_extension = '.png'
-                            elif 'jpeg' in content_type: file_extension = '.jpeg'
-                            
-                            with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as s_tmp:
-                                s_tmp.write(resp.content)
-                                s_path = s_tmp.name
                                 
                             try:
                                 # Check if face_recognition is available before calling its methods
                                 if face_recognition is not None:
-                                    s_img = face_recognition.load_image_file(s_path)
+                                    s_img = face_recognition.load_image_file(BytesIO(photo))
                                     s_encs = face_recognition.face_encodings(s_img)
                                     if not s_encs:
                                         debug_entry['status'] = 'No face found in profile pic'
@@ -2788,8 +2729,6 @@ def school_attendance_view(request):
                                     debug_entry['status'] = 'Face recognition library not available'
                             except Exception as e:
                                 debug_entry['status'] = f'Processing Error: {str(e)}'
-                            finally:
-                                if os.path.exists(s_path): os.remove(s_path)
                         except Exception as e:
                             debug_entry['status'] = f'Connection Error: {str(e)}'
                         
@@ -2920,6 +2859,15 @@ def school_attendance_view(request):
 
 
 # ------------------- DOCUMENT VIEWSET -------------------
+DOCUMENT_FILE_FIELDS = {
+    'tenth','twelth','degree','masters','marks_card','certificates','award','resume','id_proof',
+    'transfer_certificate','study_certificate','conduct_certificate','student_id_card','admit_card',
+    'fee_receipt','achievement_crt','bonafide_crt'
+}
+# Concurrent uploads per multi-file document request
+DOCUMENT_UPLOAD_WORKERS = 6
+
+
 class DocumentViewSet(viewsets.ModelViewSet):
     queryset = Document.objects.all()
     serializer_class = DocumentSerializer
@@ -2998,26 +2946,17 @@ class DocumentViewSet(viewsets.ModelViewSet):
                 errors.append({'index': idx, 'error': str(e), 'item': item})
         return Response({'created': created, 'updated': updated, 'errors': errors})
 
+    def _document_object_name(self, member, field_name: str, filename: str | None) -> str:
+        return f"documents/{self._member_identifier(member)}/{field_name}{_file_extension_global(filename)}"
+
     def _upload_doc_to_minio(self, member, file, field_name: str):
-        client = _minio_client_global()
-        if client is None:
+        # Each upload gets its own name; the file it replaces is deleted
+        # only once the new URL is saved
+        storage = get_storage()
+        if storage is None:
             return None
-        bucket = settings.MINIO_STORAGE['BUCKET_NAME']
-        base = settings.BASE_BUCKET_URL
-        if not base.endswith('/'):
-            base += '/'
-        identifier_path = _object_name_for_member_global(member, getattr(member, 'email', None))
-        if identifier_path.startswith('images/'):
-            identifier = identifier_path.split('/', 1)[1].split('/')[0]
-        else:
-            identifier = 'unknown'
-        import os as _os
-        _, ext = _os.path.splitext(getattr(file, 'name', '') or '')
-        if not ext:
-            ext = '.bin'
-        object_name = f"documents/{identifier}/{field_name}{ext}"
-        client.put_object(bucket, object_name, file.file, file.size, content_type=getattr(file, 'content_type', 'application/octet-stream'))
-        return f"{base}{object_name}"
+        object_name = self._document_object_name(member, field_name, getattr(file, 'name', None))
+        return storage.put_file(_unique_object_name_global(object_name), file)
 
     def _member_identifier(self, member) -> str:
         """Extract a stable identifier for the member used in object paths."""
@@ -3026,26 +2965,6 @@ class DocumentViewSet(viewsets.ModelViewSet):
             return identifier_path.split('/', 1)[1].split('/')[0]
         return 'unknown'
 
-    def _delete_minio_object_by_url(self, url: str):
-        """Delete a MinIO object if the URL points to our BASE_BUCKET_URL."""
-        if not url:
-            return
-        base = settings.BASE_BUCKET_URL
-        if not base.endswith('/'):
-            base += '/'
-        if not url.startswith(base):
-            return  # Not our bucket/path
-        object_name = url[len(base):]
-        client = _minio_client_global()
-        if client is None:
-            return
-        bucket = settings.MINIO_STORAGE['BUCKET_NAME']
-        try:
-            client.remove_object(bucket, object_name)
-        except Exception:
-            # Best effort delete; ignore errors
-            pass
-
     @action(detail=False, methods=['post'])
     def upload(self, request):
         email = request.POST.get('email')
@@ -3056,39 +2975,45 @@ class DocumentViewSet(viewsets.ModelViewSet):
         except User.DoesNotExist:
             return Response({'error': f'User not found: {email}'}, status=status.HTTP_404_NOT_FOUND)
 
-        allowed_fields = {
-            'tenth','twelth','degree','masters','marks_card','certificates','award','resume','id_proof',
-            'transfer_certificate','study_certificate','conduct_certificate','student_id_card','admit_card',
-            'fee_receipt','achievement_crt','bonafide_crt'
-        }
+        files = {field_name: file for field_name, file in request.FILES.items() if field_name in DOCUMENT_FILE_FIELDS}
+        if not files:
+            return Response({'error': 'No valid document files provided'}, status=status.HTTP_400_BAD_REQUEST)
+        storage = get_storage()
+        if storage is None:
+            return Response({'error': 'minio Python package is not installed. Please install dependencies from requirements.txt.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # Load existing document to support replace-delete
-        existing = None
-        try:
-            existing = Document.objects.get(email=user)
-        except Document.DoesNotExist:
-            existing = None
+        # Previous objects are only deleted once every new file is stored
+        existing = Document.objects.filter(email=user).first()
+        previous = {field_name: getattr(existing, field_name, None) for field_name in files} if existing else {}
 
-        updates = {}
-        for field_name, file in request.FILES.items():
-            if field_name not in allowed_fields:
-                continue
-            # Delete previous object if present
-            if existing is not None:
-                prev_url = getattr(existing, field_name, None)
-                if prev_url:
-                    self._delete_minio_object_by_url(prev_url)
-            url = self._upload_doc_to_minio(user, file, field_name)
-            if url is None:
-                return Response({'error': 'minio Python package is not installed. Please install dependencies from requirements.txt.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            updates[field_name] = url
+        updates, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=min(len(files), DOCUMENT_UPLOAD_WORKERS)) as pool:
+            futures = {
+                pool.submit(self._upload_doc_to_minio, user, file, field_name): field_name
+                for field_name, file in files.items()
+            }
+            for future in as_completed(futures):
+                field_name = futures[future]
+                try:
+                    updates[field_name] = future.result()
+                except Exception as e:
+                    errors[field_name] = str(e)
 
-        if not updates:
-            return Response({'error': 'No valid document files provided'}, status=status.HTTP_400_BAD_REQUEST)
+        if errors:
+            # Roll back: every new object has its own name, so all of them go
+            _delete_minio_objects_by_url_global(updates.values())
+            return Response({'error': 'Document upload failed', 'fields': errors}, status=status.HTTP_502_BAD_GATEWAY)
 
-        obj, _ = Document.objects.update_or_create(
-            email=user,
-            defaults=updates
+        try:
+            obj, _ = Document.objects.update_or_create(
+                email=user,
+                defaults=updates
+            )
+        except Exception:
+            _delete_minio_objects_by_url_global(updates.values())
+            raise
+        _delete_minio_objects_by_url_global(
+            prev_url for field_name, prev_url in previous.items() if prev_url and prev_url != updates[field_name]
         )
         return Response(DocumentSerializer(obj).data, status=status.HTTP_200_OK)
 
@@ -3105,24 +3030,19 @@ class DocumentViewSet(viewsets.ModelViewSet):
         instance, _ = Document.objects.get_or_create(email=user)
         data = request.data.copy()
 
-        allowed_fields = {
-            'tenth','twelth','degree','masters','marks_card','certificates','award','resume','id_proof',
-            'transfer_certificate','study_certificate','conduct_certificate','student_id_card','admit_card',
-            'fee_receipt','achievement_crt','bonafide_crt'
-        }
-
-        # Handle single or multiple file uploads via PATCH
+        # Handle single or multiple file uploads via PATCH; replaced objects
+        # are deleted in one batch once the update is saved
         file_updates = {}
+        stale_urls = []
         for field_name, file in request.FILES.items():
-            if field_name not in allowed_fields:
+            if field_name not in DOCUMENT_FILE_FIELDS:
                 continue
-            # Delete previous object if present
-            prev_url = getattr(instance, field_name, None)
-            if prev_url:
-                self._delete_minio_object_by_url(prev_url)
             url = self._upload_doc_to_minio(instance.email, file, field_name)
             if url is None:
                 return Response({'error': 'minio Python package is not installed. Please install dependencies from requirements.txt.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            prev_url = getattr(instance, field_name, None)
+            if prev_url and prev_url != url:
+                stale_urls.append(prev_url)
             file_updates[field_name] = url
 
         # Merge uploaded URLs into data
@@ -3130,47 +3050,80 @@ class DocumentViewSet(viewsets.ModelViewSet):
             data[k] = v
 
         # Handle clearing fields via PATCH (set to empty string or explicit null)
-        for fname in allowed_fields:
+        for fname in DOCUMENT_FILE_FIELDS:
             if fname in data and (data.get(fname) in ['', None, 'null', 'None']):
                 prev_url = getattr(instance, fname, None)
                 if prev_url:
-                    self._delete_minio_object_by_url(prev_url)
+                    stale_urls.append(prev_url)
                 data[fname] = None
 
         serializer = self.get_serializer(instance, data=data, partial=True)
-        serializer.is_valid(raise_exception=True)
+        if not serializer.is_valid():
+            _delete_minio_objects_by_url_global(file_updates.values())
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         self.perform_update(serializer)
+        _delete_minio_objects_by_url_global(stale_urls)
         return Response(serializer.data)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        allowed_fields = {
-            'tenth','twelth','degree','masters','marks_card','certificates','award','resume','id_proof',
-            'transfer_certificate','study_certificate','conduct_certificate','student_id_card','admit_card',
-            'fee_receipt','achievement_crt','bonafide_crt'
-        }
-        # Best-effort delete of all stored objects
-        for fname in allowed_fields:
-            url = getattr(instance, fname, None)
-            if url:
-                self._delete_minio_object_by_url(url)
-        # Also delete any remaining objects under documents/{identifier}/ prefix
+        urls = [getattr(instance, fname, None) for fname in DOCUMENT_FILE_FIELDS]
+        prefix = f"documents/{self._member_identifier(instance.email)}/"
+        response = super().destroy(request, *args, **kwargs)
+        # Best-effort batched delete of all stored objects, including any
+        # remaining ones under the documents/{identifier}/ prefix
+        _delete_minio_objects_by_url_global(urls, [prefix])
+        return response
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, *args, **kwargs):
+        """All of a member's stored documents as one streamed ZIP."""
+        instance = self.get_object()
+        entries = [(fname, getattr(instance, fname)) for fname in sorted(DOCUMENT_FILE_FIELDS) if getattr(instance, fname)]
+        return _zip_download_response_global(entries, f"{self._member_identifier(instance.email)}_documents.zip")
+
+    @action(detail=False, methods=['post'])
+    def presign_upload(self, request):
+        """
+        Presigned PUT URL for one document. Body: email, field (a document
+        field), filename and optional content_type.
+        """
+        email, field_name = request.data.get('email'), request.data.get('field')
+        if not email or not field_name:
+            return Response({'error': 'email and field are required'}, status=status.HTTP_400_BAD_REQUEST)
+        if field_name not in DOCUMENT_FILE_FIELDS:
+            return Response({'error': f'Invalid document field: {field_name}'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            client = _minio_client_global()
-            if client is not None:
-                bucket = settings.MINIO_STORAGE['BUCKET_NAME']
-                identifier = self._member_identifier(instance.email)
-                prefix = f"documents/{identifier}/"
-                for obj in client.list_objects(bucket, prefix=prefix, recursive=True):
-                    try:
-                        object_name = getattr(obj, 'object_name', None)
-                        if object_name:
-                            client.remove_object(bucket, object_name)
-                    except Exception:
-                        pass
-        except Exception:
-            pass
-        return super().destroy(request, *args, **kwargs)
+            user = User.objects.get(email=email)
+        except User.DoesNotExist:
+            return Response({'error': f'User not found: {email}'}, status=status.HTTP_404_NOT_FOUND)
+        object_name = self._document_object_name(user, field_name, request.data.get('filename'))
+        return _presigned_upload_response_global(object_name, request.data.get('content_type'))
+
+    @action(detail=False, methods=['post'])
+    def confirm_upload(self, request):
+        """Record a document uploaded through presign_upload. Body: email, field, object_name."""
+        email, field_name = request.data.get('email'), request.data.get('field')
+        if not email or not field_name:
+            return Response({'error': 'email and field are required'}, status=status.HTTP_400_BAD_REQUEST)
+        if field_name not in DOCUMENT_FILE_FIELDS:
+            return Response({'error': f'Invalid document field: {field_name}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            user = User.objects.get(email=email)
+        except User.DoesNotExist:
+            return Response({'error': f'User not found: {email}'}, status=status.HTTP_404_NOT_FOUND)
+        prefix = f"documents/{self._member_identifier(user)}/{field_name}."
+        url, error = _confirm_uploaded_object_global(request.data.get('object_name'), prefix)
+        if error is not None:
+            return error
+        document, _ = Document.objects.get_or_create(email=user)
+        prev_url = getattr(document, field_name, None)
+        setattr(document, field_name, url)
+        document.save(update_fields=[field_name])
+        # The upload has its own name; the replaced file goes once recorded
+        if prev_url and prev_url != url:
+            _delete_minio_object_by_url_global(prev_url)
+        return Response(DocumentSerializer(document).data)
 
 
 # ------------------- ASSIGNMENT VIEWSET -------------------
@@ -3219,74 +3172,56 @@ class AssignmentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    def _submission_object_name(self, assignment, filename: str | None) -> str:
+        # Object name based on assignment ID and class info
+        ext = _file_extension_global(filename)
+        return f"assignments/{assignment.id}/submissions/{assignment.class_id.class_name}_{assignment.class_id.sec}_{assignment.title.replace(' ', '_')}_{timezone.now().strftime('%Y%m%d_%H%M%S')}{ext}"
+
     def _upload_student_submission_to_minio(self, assignment, file):
         """Upload student submission file to MinIO and return URL."""
-        client = _minio_client_global()
-        if client is None:
+        storage = get_storage()
+        if storage is None:
             return None
-        bucket = settings.MINIO_STORAGE['BUCKET_NAME']
-        base = settings.BASE_BUCKET_URL
-        if not base.endswith('/'):
-            base += '/'
-        
-        # Create a unique identifier for the assignment submission
-        import os as _os
-        _, ext = _os.path.splitext(getattr(file, 'name', '') or '')
-        if not ext:
-            ext = '.bin'
-        
-        # Generate object name based on assignment ID and student info
-        object_name = f"assignments/{assignment.id}/submissions/{assignment.class_id.class_name}_{assignment.class_id.sec}_{assignment.title.replace(' ', '_')}_{timezone.now().strftime('%Y%m%d_%H%M%S')}{ext}"
-        
-        client.put_object(bucket, object_name, file.file, file.size, content_type=getattr(file, 'content_type', 'application/octet-stream'))
-        return f"{base}{object_name}"
-
-    def _delete_minio_object_by_url(self, url: str):
-        """Delete a MinIO object if the URL points to our BASE_BUCKET_URL."""
-        if not url:
-            return
-        base = settings.BASE_BUCKET_URL
-        if not base.endswith('/'):
-            base += '/'
-        if not url.startswith(base):
-            return  # Not our bucket/path
-        object_name = url[len(base):]
-        client = _minio_client_global()
-        if client is None:
-            return
-        bucket = settings.MINIO_STORAGE['BUCKET_NAME']
+        object_name = self._submission_object_name(assignment, getattr(file, 'name', None))
+        return storage.put_file(object_name, file)
+
+    def _enrolled_student(self, assignment, student_email):
+        """``(student, None)`` if the student is in the assignment's class, else ``(None, error_response)``."""
+        if not student_email:
+            return None, Response({'error': 'student_email is required'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            client.remove_object(bucket, object_name)
-        except Exception:
-            # Best effort delete; ignore errors
-            pass
+            student = Student.objects.get(email=student_email)
+        except Student.DoesNotExist:
+            return None, Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
+        if student.class_id != assignment.class_id:
+            return None, Response({'error': 'Student is not enrolled in this class'}, status=status.HTTP_403_FORBIDDEN)
+        return student, None
 
     def create(self, request, *args, **kwargs):
-        response = super().create(request, *args, **kwargs)
-        assignment = Assignment.objects.get(pk=response.data['id'])
-        # Send emails to students and parents
-        try:
-            students = Student.objects.filter(class_id=assignment.class_id)
-        except Class.DoesNotExist:
+        # Emails to students and parents are queued with the assignment and
+        # delivered by the drain_outbox worker
+        with transaction.atomic():
+            response = super().create(request, *args, **kwargs)
+            assignment = Assignment.objects.select_related('subject').get(pk=response.data['id'])
             students = Student.objects.none()
-        for student in students:
-            # Email to student
-            send_mail(
-                subject=f'New Assignment: {assignment.title}',
-                message=f'Dear {student.fullname},\n\nA new assignment has been assigned to you.\n\nTitle: {assignment.title}\nSubject: {assignment.subject.subject_name}\nDescription: {assignment.description or ""}\nDue Date: {assignment.due_date or "N/A"}\n\nRegards,\nSchool Administration',
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[student.email.email],
-                fail_silently=True,
-            )
-            # Email to parent if available
-            if student.parent:
-                send_mail(
-                    subject=f'New Assignment for Your Child: {assignment.title}',
-                    message=f'Dear Parent,\n\nA new assignment has been assigned to your child {student.fullname}.\n\nTitle: {assignment.title}\nSubject: {assignment.subject.subject_name}\nDescription: {assignment.description or ""}\nDue Date: {assignment.due_date or "N/A"}\n\nRegards,\nSchool Administration',
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[student.parent.email.email],
-                    fail_silently=True,
-                )
+            if assignment.class_id_id:
+                students = Student.objects.filter(class_id=assignment.class_id_id).select_related('parent')
+            messages = []
+            for student in students:
+                # Email to student
+                messages.append(outbox_message(
+                    subject=f'New Assignment: {assignment.title}',
+                    body=f'Dear {student.fullname},\n\nA new assignment has been assigned to you.\n\nTitle: {assignment.title}\nSubject: {assignment.subject.subject_name}\nDescription: {assignment.description or ""}\nDue Date: {assignment.due_date or "N/A"}\n\nRegards,\nSchool Administration',
+                    to=[student.email_id],
+                ))
+                # Email to parent if available
+                if student.parent:
+                    messages.append(outbox_message(
+                        subject=f'New Assignment for Your Child: {assignment.title}',
+                        body=f'Dear Parent,\n\nA new assignment has been assigned to your child {student.fullname}.\n\nTitle: {assignment.title}\nSubject: {assignment.subject.subject_name}\nDescription: {assignment.description or ""}\nDue Date: {assignment.due_date or "N/A"}\n\nRegards,\nSchool Administration',
+                        to=[student.parent.email_id],
+                    ))
+            queue_emails(messages)
         return response
 
     def update(self, request, *args, **kwargs):
@@ -3299,7 +3234,7 @@ class AssignmentViewSet(viewsets.ModelViewSet):
             
             # Delete previous submission if it exists
             if instance.student_submission:
-                self._delete_minio_object_by_url(instance.student_submission)
+                _delete_minio_object_by_url_global(instance.student_submission)
             
             # Upload new file to MinIO
             url = self._upload_student_submission_to_minio(instance, file)
@@ -3345,7 +3280,7 @@ class AssignmentViewSet(viewsets.ModelViewSet):
         
         # Delete previous submission if it exists
         if assignment.student_submission:
-            self._delete_minio_object_by_url(assignment.student_submission)
+            _delete_minio_object_by_url_global(assignment.student_submission)
         
         # Upload new file to MinIO
         url = self._upload_student_submission_to_minio(assignment, file)
@@ -3363,6 +3298,57 @@ class AssignmentViewSet(viewsets.ModelViewSet):
             'status': assignment.status
         })
 
+    @action(detail=True, methods=['post'])
+    def presign_submission(self, request, pk=None):
+        """
+        Presigned PUT URL for submitting this assignment directly to storage.
+        Body: student_email, filename and optional content_type.
+        """
+        assignment = self.get_object()
+        _, error = self._enrolled_student(assignment, request.data.get('student_email'))
+        if error is not None:
+            return error
+        object_name = self._submission_object_name(assignment, request.data.get('filename'))
+        return _presigned_upload_response_global(object_name, request.data.get('content_type'))
+
+    @action(detail=True, methods=['post'])
+    def confirm_submission(self, request, pk=None):
+        """Record a submission uploaded through presign_submission. Body: student_email, object_name."""
+        assignment = self.get_object()
+        _, error = self._enrolled_student(assignment, request.data.get('student_email'))
+        if error is not None:
+            return error
+        url, error = _confirm_uploaded_object_global(
+            request.data.get('object_name'), f"assignments/{assignment.id}/submissions/"
+        )
+        if error is not None:
+            return error
+        prev_url = assignment.student_submission
+        assignment.student_submission = url
+        assignment.status = 'Submitted'
+        assignment.save()
+        if prev_url and prev_url != url:
+            _delete_minio_object_by_url_global(prev_url)
+        return Response({
+            'message': 'Assignment submitted successfully',
+            'student_submission': url,
+            'status': assignment.status
+        })
+
+    @action(detail=True, methods=['get'])
+    def download_submissions(self, request, pk=None):
+        """Every submitted file for this assignment as one streamed ZIP, named by student."""
+        assignment = self.get_object()
+        submissions = (
+            SubmittedAssignment.objects.filter(assignment=assignment)
+            .select_related('student').order_by('student__fullname')
+        )
+        entries = [
+            (submission.student.fullname.replace('/', '_'), submission.submission_file)
+            for submission in submissions if submission.submission_file
+        ]
+        return _zip_download_response_global(entries, f"assignment_{assignment.id}_submissions.zip")
+
 
 # ------------------- SUBMITTED ASSIGNMENT VIEWSET -------------------
 class SubmittedAssignmentViewSet(viewsets.ModelViewSet):
@@ -3410,78 +3396,53 @@ class SubmittedAssignmentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    def _submission_prefix(self, student) -> str:
+        # Object names are based on the student name only
+        if student:
+            return f"submissions/{student.fullname.replace(' ', '_')}_"
+        # Fallback naming if we don't have the student object
+        return "submissions/unknown_"
+
+    def _submission_object_name(self, student, filename: str | None) -> str:
+        return f"{self._submission_prefix(student)}{timezone.now().strftime('%Y%m%d_%H%M%S')}{_file_extension_global(filename)}"
+
     def _upload_student_submission_to_minio(self, submitted_assignment, file, assignment=None, student=None):
         """Upload student submission file to MinIO and return URL."""
-        client = _minio_client_global()
-        if client is None:
+        storage = get_storage()
+        if storage is None:
             return None
-        bucket = settings.MINIO_STORAGE['BUCKET_NAME']
-        base = settings.BASE_BUCKET_URL
-        if not base.endswith('/'):
-            base += '/'
-        
-        # Create a unique identifier for the assignment submission
-        import os as _os
-        _, ext = _os.path.splitext(getattr(file, 'name', '') or '')
-        if not ext:
-            ext = '.bin'
-        
-        # Get assignment and student objects
         if submitted_assignment:
-            assignment = submitted_assignment.assignment
             student = submitted_assignment.student
-        
-        # Generate object name based on student name only
-        if student:
-            student_name = student.fullname.replace(' ', '_')
-            object_name = f"submissions/{student_name}_{timezone.now().strftime('%Y%m%d_%H%M%S')}{ext}"
-        else:
-            # Fallback naming if we don't have the student object
-            object_name = f"submissions/unknown_{timezone.now().strftime('%Y%m%d_%H%M%S')}{ext}"
-        
-        client.put_object(bucket, object_name, file.file, file.size, content_type=getattr(file, 'content_type', 'application/octet-stream'))
-        return f"{base}{object_name}"
-
-    def _delete_minio_object_by_url(self, url: str):
-        """Delete a MinIO object if the URL points to our BASE_BUCKET_URL."""
-        if not url:
-            return
-        base = settings.BASE_BUCKET_URL
-        if not base.endswith('/'):
-            base += '/'
-        if not url.startswith(base):
-            return  # Not our bucket/path
-        object_name = url[len(base):]
-        client = _minio_client_global()
-        if client is None:
-            return
-        bucket = settings.MINIO_STORAGE['BUCKET_NAME']
-        try:
-            client.remove_object(bucket, object_name)
-        except Exception:
-            # Best effort delete; ignore errors
-            pass
+        object_name = self._submission_object_name(student, getattr(file, 'name', None))
+        return storage.put_file(object_name, file)
 
-    def create(self, request, *args, **kwargs):
-        # Handle file uploads for student submissions
-        student_email = request.data.get('student')
-        assignment_id = request.data.get('assignment')
+    def _submission_parties(self, data):
+        """Validated ``(student, assignment, None)`` from request data, or ``(None, None, error_response)``."""
+        student_email = data.get('student')
+        assignment_id = data.get('assignment')
         
         # Validate student and assignment
         if not student_email or not assignment_id:
-            return Response({'error': 'student and assignment are required'}, status=status.HTTP_400_BAD_REQUEST)
+            return None, None, Response({'error': 'student and assignment are required'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
             student = Student.objects.get(email=student_email)
             assignment = Assignment.objects.get(id=assignment_id)
         except Student.DoesNotExist:
-            return Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
+            return None, None, Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
         except Assignment.DoesNotExist:
-            return Response({'error': 'Assignment not found'}, status=status.HTTP_404_NOT_FOUND)
+            return None, None, Response({'error': 'Assignment not found'}, status=status.HTTP_404_NOT_FOUND)
         
         # Verify student is in the correct class
         if student.class_id != assignment.class_id:
-            return Response({'error': 'Student is not enrolled in this class'}, status=status.HTTP_403_FORBIDDEN)
+            return None, None, Response({'error': 'Student is not enrolled in this class'}, status=status.HTTP_403_FORBIDDEN)
+        return student, assignment, None
+
+    def create(self, request, *args, **kwargs):
+        # Handle file uploads for student submissions
+        student, assignment, error = self._submission_parties(request.data)
+        if error is not None:
+            return error
         
         # Handle file upload
         if 'file' not in request.FILES:
@@ -3493,7 +3454,32 @@ class SubmittedAssignmentViewSet(viewsets.ModelViewSet):
         url = self._upload_student_submission_to_minio(None, file, assignment, student)
         if url is None:
             return Response({'error': 'Failed to upload file to storage'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
+        return self._record_submission(assignment, student, url)
+
+    @action(detail=False, methods=['post'])
+    def presign(self, request):
+        """
+        Presigned PUT URL for a submission file. Body: student, assignment,
+        filename and optional content_type.
+        """
+        student, _, error = self._submission_parties(request.data)
+        if error is not None:
+            return error
+        object_name = self._submission_object_name(student, request.data.get('filename'))
+        return _presigned_upload_response_global(object_name, request.data.get('content_type'))
+
+    @action(detail=False, methods=['post'])
+    def confirm(self, request):
+        """Record a submission uploaded through presign. Body: student, assignment, object_name."""
+        student, assignment, error = self._submission_parties(request.data)
+        if error is not None:
+            return error
+        url, error = _confirm_uploaded_object_global(request.data.get('object_name'), self._submission_prefix(student))
+        if error is not None:
+            return error
+        return self._record_submission(assignment, student, url)
+
+    def _record_submission(self, assignment, student, url):
         # Check if submission already exists
         submitted_assignment, created = SubmittedAssignment.objects.get_or_create(
             assignment=assignment,
@@ -3506,15 +3492,17 @@ class SubmittedAssignmentViewSet(viewsets.ModelViewSet):
         
         if not created:
             # Update existing submission
-            # Delete previous file
-            if submitted_assignment.submission_file:
-                self._delete_minio_object_by_url(submitted_assignment.submission_file)
+            prev_url = submitted_assignment.submission_file
             
             # Update with new file
             submitted_assignment.submission_file = url
             submitted_assignment.is_late = assignment.due_date and date.today() > assignment.due_date
             submitted_assignment.save()
             
+            # Delete previous file once the new one is recorded
+            if prev_url and prev_url != url:
+                _delete_minio_object_by_url_global(prev_url)
+            
             # Update assignment status
             assignment.status = 'Submitted'
             assignment.save()
@@ -3943,16 +3931,11 @@ class NoticeViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     def create(self, request, *args, **kwargs):
-        response = super().create(request, *args, **kwargs)
-        notice = Notice.objects.get(pk=response.data['id'])
-        if notice.email:
-            send_mail(
-                subject=f'Notice: {notice.title}',
-                message=notice.message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[notice.email.email],
-                fail_silently=True,
-            )
+        with transaction.atomic():
+            response = super().create(request, *args, **kwargs)
+            notice = Notice.objects.get(pk=response.data['id'])
+            if notice.email_id:
+                queue_email(subject=f'Notice: {notice.title}', body=notice.message, to=[notice.email_id])
         return response
 
     @action(detail=False, methods=['post'])
@@ -3962,17 +3945,13 @@ class NoticeViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Expected a JSON array'}, status=status.HTTP_400_BAD_REQUEST)
         ser = self.get_serializer(data=request.data, many=True, context={'bulk_create': True})
         ser.is_valid(raise_exception=True)
-        notices = ser.save()
-        # Send emails after bulk creation
-        for notice in notices:
-            if notice.email:
-                send_mail(
-                    subject=f'Notice: {notice.title}',
-                    message=notice.message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[notice.email.email],
-                    fail_silently=True,
-                )
+        with transaction.atomic():
+            notices = ser.save()
+            # Queue emails with the notices
+            queue_emails(
+                outbox_message(subject=f'Notice: {notice.title}', body=notice.message, to=[notice.email_id])
+                for notice in notices if notice.email_id
+            )
         return Response({'created': len(ser.data)}, status=status.HTTP_201_CREATED)
 
 
@@ -4127,7 +4106,6 @@ from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.template.loader import render_to_string
-from django.core.mail import send_mail
 from django.conf import settings
 from .serializers import PasswordResetRequestSerializer, PasswordResetConfirmSerializer
 
@@ -4152,35 +4130,13 @@ def password_reset_request(request):
             # Create reset link
             reset_link = f"https://school.globaltechsoftwaresolutions.cloud/reset_password/{uid}/{token}"
             
-            # Send email
+            # Queue email; delivered by the drain_outbox worker
             subject = "Password Reset Request"
             message = render_to_string('password_reset_email.html', {
                 'user': user,
                 'reset_link': reset_link,
             })
-            
-            try:
-                import smtplib
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [email],
-                    fail_silently=False,
-                    html_message=message
-                )
-            except smtplib.SMTPAuthenticationError as e:
-                return Response({
-                    'error': 'SMTP Authentication Failed',
-                    'detail': 'The server refused the email credentials.',
-                    'debug_loaded_user': settings.EMAIL_HOST_USER,
-                    'server_response': str(e)
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            except Exception as e:
-                return Response({
-                    'error': 'Email Sending Failed',
-                    'detail': str(e)
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            queue_email(subject, message, [email], html_body=message)
             
             return Response({
                 'message': 'Password reset email sent successfully. Please check your inbox.'
@@ -4243,23 +4199,11 @@ School Management Team
 """
     
     try:
-        # Send email to admin
-        send_mail(
-            subject=email_subject,
-            message=email_body,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.DEFAULT_FROM_EMAIL],  # Send to admin
-            fail_silently=False,
-        )
-        
-        # Send confirmation email to sender
-        send_mail(
-            subject=confirmation_subject,
-            message=confirmation_body,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[from_email],  # Send to sender
-            fail_silently=False,
-        )
+        # Queue the email to admin and the confirmation to the sender
+        queue_emails([
+            outbox_message(email_subject, email_body, [settings.DEFAULT_FROM_EMAIL]),
+            outbox_message(confirmation_subject, confirmation_body, [from_email]),
+        ])
         
         return Response({
             'status': 'success',
@@ -4330,334 +4274,38 @@ def send_marks_card(request):
     except Student.DoesNotExist:
         return Response({'error': 'Student profile not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    # Initialize context with student data
-    context = {
-        'student_name': student.fullname,
-        'roll_no': '',  # Will be populated if available
-        'class_section': '',  # Will be populated if available
-        'academic_year': timezone.now().astimezone(IST).strftime('%Y-%Y'),  # Default to current year
-        'date_of_birth': student.date_of_birth.strftime('%d/%m/%Y') if student.date_of_birth else '',
-        'admission_no': student.student_id or '',
-    }
-    
-    # Add class information if available
-    if student.class_id:
-        context['class_section'] = f"{student.class_id.class_name} {student.class_id.sec}"
-        # Update academic year based on current date
-        current_year = timezone.now().astimezone(IST).year
-        context['academic_year'] = f"{current_year}-{current_year + 1}"
-    
-    # Get student grades
-    grades = Grade.objects.filter(student=student).select_related('subject')
-    
-    # Process grades for display
-    subject_marks = []
-    total_max_marks = 0
-    total_marks_obtained = 0
-    
-    for grade in grades:
-        max_marks = float(grade.total_marks) if grade.total_marks else 0
-        marks_obtained = float(grade.marks_obtained) if grade.marks_obtained else 0
-        
-        # Calculate grade based on percentage with float precision
-        percentage = (marks_obtained / max_marks) * 100 if max_marks > 0 else 0
-        if percentage >= 90:
-            grade_letter = 'A+'
-        elif percentage >= 80:
-            grade_letter = 'A'
-        elif percentage >= 70:
-            grade_letter = 'B+'
-        elif percentage >= 60:
-            grade_letter = 'B'
-        elif percentage >= 50:
-            grade_letter = 'C'
-        else:
-            grade_letter = 'F'
-        
-        # Determine pass/fail
-        result = 'Pass' if percentage >= 35 else 'Fail'
-        
-        subject_marks.append({
-            'subject': grade.subject.subject_name,
-            'max_marks': f"{max_marks:.0f}",  # Show as integer
-            'marks_obtained': f"{marks_obtained:.0f}",  # Show as integer
-            'percentage': f"{percentage:.2f}%",  # Show percentage with 2 decimal places
-            'grade': grade_letter,
-            'result': result
-        })
-        
-        total_max_marks += max_marks
-        total_marks_obtained += marks_obtained
-    
-    context['subject_marks'] = subject_marks
-    
-    # Calculate overall result with float precision
-    if total_max_marks > 0:
-        overall_percentage = (total_marks_obtained / total_max_marks) * 100
-        context['total_max_marks'] = f"{total_max_marks:.0f}"
-        context['total_marks_obtained'] = f"{total_marks_obtained:.0f}"
-        context['overall_percentage'] = f"{overall_percentage:.2f}%"
-        context['overall_result'] = 'PASS' if overall_percentage >= 35 else 'FAIL'
-    else:
-        context['total_max_marks'] = "0"
-        context['total_marks_obtained'] = "0"
-        context['overall_percentage'] = "0.00%"
-        context['overall_result'] = 'N/A'
+    # Marks card data comes from the same loader used for class-wide runs
+    context = load_marks_card_contexts(student_emails=[student.pk])[0]
     
-    # Generate PDF using ReportLab
+    # Generate PDF from the shared marks card template
     try:
-        from io import BytesIO
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
-        from reportlab.lib import colors
-        from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-        
-        # Create a buffer to store the PDF
-        buffer = BytesIO()
-        
-        # Create PDF document with custom margins
-        doc = SimpleDocTemplate(
-            buffer, 
-            pagesize=A4,
-            rightMargin=72,
-            leftMargin=72,
-            topMargin=72,
-            bottomMargin=72
-        )
-        elements = []
-        
-        # Define styles
-        styles = getSampleStyleSheet()
-        
-        # Title style
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=20,
-            spaceAfter=5,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#2C5AA0')
-        )
-        
-        # Subtitle style
-        subtitle_style = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Heading2'],
-            fontSize=16,
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#2C5AA0')
-        )
-        
-        # School info style
-        school_style = ParagraphStyle(
-            'SchoolInfo',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=5,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#555555')
-        )
-        
-        # Normal text style
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=5
-        )
-        
-        # Add a frame/border around the entire content
-        # Create a decorative frame at the beginning
-        elements.append(Spacer(1, 5))
-        
-        # Header
-        school_name = Paragraph("GREENWOOD PUBLIC SCHOOL", title_style)
-        school_address = Paragraph("123, MG Road, Bengaluru - 560001 | Ph: (080) 2345 6789", school_style)
-        exam_title = Paragraph("ANNUAL EXAMINATION MARKS CARD", subtitle_style)
-        
-        elements.append(school_name)
-        elements.append(school_address)
-        elements.append(exam_title)
-        elements.append(Spacer(1, 20))
-        
-        # Student information table with completely new design
-        student_data = [
-            ['Student Name:', context['student_name'], 'Roll No:', context['roll_no'] or 'N/A'],
-            ['Class & Section:', context['class_section'] or 'N/A', 'Academic Year:', context['academic_year']],
-            ['Date of Birth:', context['date_of_birth'] or 'N/A', 'Admission No:', context['admission_no'] or 'N/A']
-        ]
-        
-        student_table = Table(student_data, colWidths=[1.5*inch, 2*inch, 1.5*inch, 2*inch])
-        student_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#FFFFFF')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.3, colors.HexColor('#CCCCCC')),
-            ('BOX', (0, 0), (-1, -1), 0.3, colors.HexColor('#CCCCCC')),
-            ('INNERGRID', (0, 0), (-1, -1), 0.3, colors.HexColor('#CCCCCC')),
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F0F5FF')),
-            ('BACKGROUND', (2, 0), (2, -1), colors.HexColor('#F0F5FF')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#2C5AA0')),
-            ('TEXTCOLOR', (2, 0), (2, -1), colors.HexColor('#2C5AA0')),
-        ]))
-        
-        elements.append(student_table)
-        elements.append(Spacer(1, 20))
-        
-        # Marks table header
-        marks_header = Paragraph("Academic Performance", subtitle_style)
-        marks_header.style.alignment = TA_LEFT
-        marks_header.style.fontSize = 13
-        marks_header.style.textColor = colors.HexColor('#2C5AA0')
-        elements.append(marks_header)
-        
-        # Marks table with completely new styling
-        # Header row
-        marks_data = [
-            ['Subject', 'Max Marks', 'Marks Obtained', 'Percentage', 'Grade', 'Result']
-        ]
-        
-        # Add subject rows
-        for subject in context['subject_marks']:
-            marks_data.append([
-                subject['subject'],
-                subject['max_marks'],
-                subject['marks_obtained'],
-                subject['percentage'],
-                subject['grade'],
-                subject['result']
-            ])
-        
-        # Add total row
-        marks_data.append([
-            'Total',
-            context['total_max_marks'],
-            context['total_marks_obtained'],
-            context['overall_percentage'],
-            '',
-            context['overall_result']
-        ])
-        
-        marks_table = Table(marks_data, colWidths=[2*inch, 1*inch, 1*inch, 1*inch, 0.7*inch, 0.8*inch])
-        marks_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2C5AA0')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#FFFFFF')),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#FFFFFF')),
-            ('GRID', (0, 0), (-1, -1), 0.3, colors.HexColor('#CCCCCC')),
-            ('BOX', (0, 0), (-1, -1), 0.3, colors.HexColor('#CCCCCC')),
-            ('INNERGRID', (0, 0), (-1, -1), 0.3, colors.HexColor('#CCCCCC')),
-            ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
-            ('FONTNAME', (-1, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (0, -1), (0, -1), 'Helvetica-Bold'),
-            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#F0F5FF')),
-            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#2C5AA0')),
-        ]))
-        
-        elements.append(marks_table)
-        elements.append(Spacer(1, 25))
-        
-        # Performance summary with new styling
-        summary_text = f"Overall Percentage: {context['overall_percentage']}"
-        summary_para = Paragraph(summary_text, normal_style)
-        summary_para.style.textColor = colors.HexColor('#2C5AA0')
-        summary_para.style.fontSize = 11
-        elements.append(summary_para)
-        elements.append(Spacer(1, 10))
-        
-        # Footer with signatures and new borders
-        footer_data = [
-            ['Class Teacher', 'Principal'],
-            ['', '']
-        ]
-        
-        footer_table = Table(footer_data, colWidths=[3*inch, 3*inch])
-        footer_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, 0), 0.3, colors.HexColor('#CCCCCC')),
-            ('BOX', (0, 0), (-1, 0), 0.3, colors.HexColor('#CCCCCC')),
-            ('LINEBELOW', (0, 0), (-1, 0), 0.3, colors.HexColor('#CCCCCC')),
-            ('LINEAFTER', (0, 0), (0, 0), 0.3, colors.HexColor('#CCCCCC')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#666666')),
-        ]))
-        
-        elements.append(footer_table)
-        elements.append(Spacer(1, 20))
-        
-        # Final result display with new styling
-        result_color = '#32A852' if context['overall_result'] == 'PASS' else '#C70039'
-        result_text = f"Final Result: <font color='{result_color}'><b>{context['overall_result']}</b></font>"
-        result_para = Paragraph(result_text, subtitle_style)
-        result_para.style.alignment = TA_CENTER
-        result_para.style.fontSize = 16
-        result_para.style.textColor = colors.HexColor('#2C5AA0')
-        elements.append(result_para)
-        
-        # Build PDF
-        doc.build(elements)
-        
-        # Get PDF content
-        pdf_content = buffer.getvalue()
-        buffer.close()
-        
+        pdf_content = render_marks_card(context)
     except Exception as e:
         return Response({'error': f'Failed to generate PDF: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    # Send email to student with PDF attachment
+    # Queue emails to student and parent with the PDF attached
     student_subject = f"Marks Card for {student.fullname}"
+    attachment = (f'marks_card_{student.fullname}.pdf', pdf_content, 'application/pdf')
+    messages = []
     
-    # Send email to parent if parent exists
+    # Email to parent if parent exists
     parent_emails = []
-    if student.parent:
-        parent_emails.append(student.parent.email.email)
-        
+    if context['parent_email']:
+        parent_emails.append(context['parent_email'])
         parent_subject = f"Marks Card for your child {student.fullname}"
-        
-        try:
-            from django.core.mail import EmailMessage
-            # Send email to parent with PDF attachment
-            email = EmailMessage(
-                parent_subject,
-                'Please find attached the marks card for your child.',
-                settings.DEFAULT_FROM_EMAIL,
-                parent_emails,
-            )
-            email.attach(f'marks_card_{student.fullname}.pdf', pdf_content, 'application/pdf')
-            email.send()
-        except Exception as e:
-            return Response({'error': f'Failed to send email to parent: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        messages.append(outbox_message(
+            parent_subject, 'Please find attached the marks card for your child.', parent_emails,
+            attachments=[attachment],
+        ))
     
-    # Send email to student with PDF attachment
-    try:
-        from django.core.mail import EmailMessage
-        email = EmailMessage(
-            student_subject,
-            'Please find attached your marks card.',
-            settings.DEFAULT_FROM_EMAIL,
-            [student_email],
-        )
-        email.attach(f'marks_card_{student.fullname}.pdf', pdf_content, 'application/pdf')
-        email.send()
-    except Exception as e:
-        return Response({'error': f'Failed to send email to student: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # Email to student
+    messages.append(outbox_message(
+        student_subject, 'Please find attached your marks card.', [student_email], attachments=[attachment],
+    ))
+    queue_emails(messages)
     
     return Response({
-        'message': 'Marks card PDF sent successfully to student and parent',
+        'message': 'Marks card PDF queued for delivery to student and parent',
         'student_email': student_email,
         'parent_emails': parent_emails
     }, status=status.HTTP_200_OK)
@@ -4677,8 +4325,11 @@ class ExamViewSet(viewsets.ModelViewSet):
     ordering = ['class_id']
     
     def get_queryset(self):
-        # This ensures filtering still works
-        return super().get_queryset()
+        # Related rows and template questions are loaded in bulk, so listing
+        # any number of exams costs a fixed number of queries
+        return super().get_queryset().select_related('class_id', 'sub', 'sub_teacher').prefetch_related(
+            models.Prefetch('questions', queryset=Question.objects.order_by('id'))
+        )
     
     def list(self, request, *args, **kwargs):
         # Check if pagination parameters are provided
@@ -4705,25 +4356,78 @@ class ExamViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         # Save the exam - MCQ records are created in the serializer
         serializer.save()
+    
+    @action(detail=True, methods=['post'], parser_classes=[MultiPartParser, FormParser, JSONParser])
+    def import_questions(self, request, pk=None):
+        """
+        POST /api/exams/<id>/import_questions/
+        Add questions to an exam from a CSV/XLSX ``file`` or a JSON
+        ``questions`` list with question, option_1..option_4 and
+        correct_option. All rows are validated first and then inserted
+        together; nothing is saved if any row is invalid.
+        """
+        exam = get_object_or_404(Exam, pk=pk)
+        uploaded = request.FILES.get('file')
+        first_row = 2  # sheet row numbers, after the header line
+        if uploaded is not None:
+            try:
+                rows = parse_grade_sheet(uploaded)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            rows = request.data.get('questions')
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                return Response({'error': 'Provide a CSV/XLSX file or a "questions" list'}, status=status.HTTP_400_BAD_REQUEST)
+            first_row = 1
+        if not rows:
+            return Response({'error': 'No questions to import'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = QuestionImportSerializer(data=rows, many=True)
+        if not serializer.is_valid():
+            errors = [
+                {'row': first_row + index, 'errors': row_errors}
+                for index, row_errors in enumerate(serializer.errors) if row_errors
+            ]
+            return Response({'error': 'Import failed, no questions were saved', 'rows': errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        created = create_questions(exam, serializer.validated_data)
+        return Response({'message': f'{len(created)} questions imported', 'imported': len(created)}, status=status.HTTP_201_CREATED)
         
     # Pagination is handled by the base ViewSet with Django REST Framework's default pagination
 
 
 # ------------------- MCQ ANSWERS VIEWSET -------------------
+def _parse_mcq_answer_global(value):
+    """
+    A submitted student_answer as an int option 1-4; None or '' mean no
+    answer. Form and JSON strings such as "2" are accepted. Raises
+    ValueError for anything else.
+    """
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, bool):
+        raise ValueError(value)
+    answer = int(str(value).strip())
+    if answer not in (1, 2, 3, 4):
+        raise ValueError(value)
+    return answer
+
+
 class MCQAnswersViewSet(viewsets.ModelViewSet):
-    queryset = MCQ_Answers.objects.all()
-    serializer_class = MCQAnswersSerializer
+    """Student answers; responses use the legacy MCQ answer shape."""
+    queryset = QuestionResponse.objects.select_related('question', 'exam')
+    serializer_class = QuestionResponseSerializer
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]  # type: ignore[assignment]
     filterset_fields = ['exam', 'result']
-    search_fields = ['question']
+    search_fields = ['question__question']
     ordering_fields = ['exam', 'result']
     ordering = ['exam']
     
     def get_serializer_class(self):
-        if self.action == 'create' or self.action == 'update' or self.action == 'partial_update':
+        if self.action == 'create':
             return MCQAnswersCreateSerializer
-        return MCQAnswersSerializer
+        return QuestionResponseSerializer
     
     # Override create to only allow POST requests
     def list(self, request, *args, **kwargs):
@@ -4733,114 +4437,92 @@ class MCQAnswersViewSet(viewsets.ModelViewSet):
     def update(self, request, *args, **kwargs):
         # Allow updating student answers
         instance = self.get_object()
-        serializer = self.get_serializer(instance, data=request.data, partial=True)
-        serializer.is_valid(raise_exception=True)
-        updated_instance = serializer.save()
-        
-        # Automatically send results to grades table after updating student answers
-        print(f"[DEBUG] UPDATE: About to call _send_results_to_grades for instance {updated_instance.id}")
-        self._send_results_to_grades(updated_instance)
-        print(f"[DEBUG] UPDATE: Finished calling _send_results_to_grades")
+        try:
+            student_answer = _parse_mcq_answer_global(request.data.get('student_answer', instance.answer))
+        except ValueError:
+            return Response({'student_answer': ['Must be one of 1, 2, 3, 4.']}, status=status.HTTP_400_BAD_REQUEST)
+        previous_answer, previous_result = instance.answer, instance.result
+        instance.answer = student_answer
+        instance.result = student_answer is not None and student_answer == instance.question.correct_option
+        
+        # Save the answer, the running result and the grade together
+        with transaction.atomic():
+            instance.save(update_fields=['answer', 'result'])
+            apply_exam_result_delta(
+                instance.exam_id, instance.student_id,
+                correct=int(instance.result) - int(previous_result),
+                answered=int(student_answer is not None) - int(previous_answer is not None),
+            )
+            self._send_results_to_grades(instance)
         
-        return Response(serializer.data)
+        return Response(self.get_serializer(instance).data)
     
     def partial_update(self, request, *args, **kwargs):
         # Allow partial updating of student answers
-        instance = self.get_object()
-        serializer = self.get_serializer(instance, data=request.data, partial=True)
-        serializer.is_valid(raise_exception=True)
-        updated_instance = serializer.save()
-        
-        # Automatically send results to grades table after updating student answers
-        print(f"[DEBUG] About to call _send_results_to_grades for instance {updated_instance.id}")
-        self._send_results_to_grades(updated_instance)
-        print(f"[DEBUG] Finished calling _send_results_to_grades")
-        
-        return Response(serializer.data)
+        return self.update(request, *args, **kwargs)
     
-    def _send_results_to_grades(self, mcq_instance):
-        """Send MCQ results to grades table"""
-        print(f"[DEBUG] Starting _send_results_to_grades for MCQ instance {mcq_instance.id}")
-        print(f"[DEBUG] MCQ instance student: {mcq_instance.student}")
-        try:
-            # Calculate total marks for this exam
-            total_questions = MCQ_Answers.objects.filter(exam=mcq_instance.exam).count()
-            correct_answers = MCQ_Answers.objects.filter(exam=mcq_instance.exam, result=True).count()
-            
-            print(f"[DEBUG] Total questions: {total_questions}, Correct answers: {correct_answers}")
-            
-            # Calculate percentage
-            if total_questions > 0:
-                marks_obtained = (correct_answers / total_questions) * 100
-                total_marks = 100
-                
-                # Prepare grade data
-                if mcq_instance.student is None:
-                    print(f"[DEBUG] ERROR: MCQ instance has no student assigned!")
-                    return
-                student_email = str(mcq_instance.student.email.email)
-                
-                grade_data = {
-                    'student': student_email,
-                    'subject': mcq_instance.exam.sub.id,
-                    'teacher': mcq_instance.exam.sub_teacher.email.email,  # Get the actual email address
-                    'exam_type': 'Quiz',
-                    'marks_obtained': marks_obtained,
-                    'total_marks': total_marks,
-                    'exam_date': str(timezone.now().date()),  # Convert to string for JSON compatibility
-                    'remarks': f'MCQ Exam Results - {correct_answers}/{total_questions} correct'
-                }
-                
-                print(f"[DEBUG] Grade data prepared: {grade_data}")
-                
-                # Make actual POST request to grades API
-                import requests
-                from django.conf import settings
-                
-                # Send to the actual grades API
-                grades_api_url = 'https://school.globaltechsoftwaresolutions.cloud/api/grades/'
-                
-                # Prepare headers (in case authentication is needed)
-                headers = {
-                    'Content-Type': 'application/json',
-                }
-                
-                # Try to get authentication token from request if available
-                if hasattr(self, 'request') and hasattr(self.request, 'META'):
-                    auth_header = self.request.META.get('HTTP_AUTHORIZATION')
-                    if auth_header:
-                        headers['Authorization'] = auth_header
-                
-                print(f"[DEBUG] Making request to {grades_api_url}")
-                try:
-                    response = requests.post(grades_api_url, json=grade_data, headers=headers, timeout=30)
-                    if response.status_code == 201:
-                        print(f"✅ Successfully sent results to grades API: {response.status_code}")
-                        print(f"Response: {response.json()}")
-                    else:
-                        print(f"❌ Failed to send results to grades API. Status: {response.status_code}")
-                        print(f"Response: {response.text}")
-                        # Also print headers for debugging
-                        print(f"Response headers: {dict(response.headers)}")
-                except requests.RequestException as e:
-                    print(f"❌ Network error making request to grades API: {str(e)}")
-                except Exception as e:
-                    print(f"❌ Unexpected error sending to grades API: {str(e)}")
-                
-            else:
-                print("[DEBUG] No questions found for this exam")
-                
-        except Exception as e:
-            # Log error but don't fail the request
-            print(f"❌ Error sending results to grades: {str(e)}")
-            import traceback
-            traceback.print_exc()
+    def _send_results_to_grades(self, response):
+        """Write the student's MCQ result to the grades table (in-process)."""
+        return record_exam_grade(response.exam, response.student)
     
     def destroy(self, request, *args, **kwargs):
         # For MCQ, only allow creation, not deletion
         return Response({'detail': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
+class _MCQRows:
+    """
+    Read-only sequence over an exam's questions followed by its responses,
+    so the two tables can be listed (and paginated) as one legacy MCQ list
+    without loading either table up front.
+    """
+
+    def __init__(self, questions, responses):
+        self.questions = questions
+        self.responses = responses
+        self._question_count = None
+        self._response_count = None
+
+    def _counts(self):
+        if self._question_count is None:
+            self._question_count = self.questions.count()
+            self._response_count = self.responses.count()
+        return self._question_count, self._response_count
+
+    def count(self):
+        return sum(self._counts())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            rows = self[index:index + 1]
+            if not rows:
+                raise IndexError(index)
+            return rows[0]
+        question_count, _ = self._counts()
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+        rows = []
+        if start < question_count:
+            rows.extend(self.questions[start:min(stop, question_count)])
+        if stop > question_count:
+            rows.extend(self.responses[max(start - question_count, 0):stop - question_count])
+        return rows
+
+    def __iter__(self):
+        yield from self.questions
+        yield from self.responses
+
+
+def _mcq_rows(**filters):
+    return _MCQRows(
+        Question.objects.filter(**filters).select_related('exam').order_by('id'),
+        QuestionResponse.objects.filter(**filters).select_related('exam', 'question').order_by('id'),
+    )
+
+
 # Custom view for handling multiple MCQ answers
 
 @api_view(['GET', 'PATCH', 'DELETE'])
@@ -4859,17 +4541,16 @@ def submit_multiple_mcq_answers(request) -> Response:
     # Handle GET request - retrieve all MCQ answers for an exam
     if request.method == 'GET':
         try:
-            mcq_answers = MCQ_Answers.objects.filter(exam_id=exam_id)
-            if not mcq_answers.exists():
+            mcq_rows = list(_mcq_rows(exam_id=exam_id))
+            if not mcq_rows:
                 return Response(
                     {'message': 'No MCQ answers found for this exam'}, 
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            serializer = MCQAnswersSerializer(mcq_answers, many=True)
             return Response({
                 'exam_id': exam_id,
-                'mcq_answers': serializer.data
+                'mcq_answers': serialize_mcq_rows(mcq_rows)
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -4894,18 +4575,25 @@ def submit_multiple_mcq_answers(request) -> Response:
             
             # Validate that student exists
             try:
-                student = Student.objects.get(email=student_email)
+                student = Student.objects.only('email').get(email=student_email)
             except Student.DoesNotExist:
                 return Response(
                     {'error': 'Student not found'}, 
                     status=status.HTTP_404_NOT_FOUND
                 )
             
+            # Load the exam's questions and this student's responses once
+            questions = {
+                question.id: question
+                for question in Question.objects.filter(exam_id=exam_id).select_related('exam')
+            }
+            existing_responses = {
+                response.question_id: response
+                for response in QuestionResponse.objects.filter(exam_id=exam_id, student=student)
+            }
+            
             # Check if student has already completed this exam (answered all questions)
-            total_questions_in_exam = MCQ_Answers.objects.filter(exam_id=exam_id, student__isnull=True).count()
-            answered_questions = MCQ_Answers.objects.filter(exam_id=exam_id, student=student).count()
-
-            if answered_questions >= total_questions_in_exam and total_questions_in_exam > 0:
+            if len(existing_responses) >= len(questions) and len(questions) > 0:
                 return Response(
                     {'error': 'You have already completed this exam and cannot submit answers again'}, 
                     status=status.HTTP_400_BAD_REQUEST
@@ -4916,64 +4604,61 @@ def submit_multiple_mcq_answers(request) -> Response:
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Process each answer
-            updated_answers = []
+            # Score every answer in memory; later duplicates of a question win
+            answers = {}
             for answer_data in answers_data:
-                mcq_id = answer_data.get('id')
-                student_answer = answer_data.get('student_answer')
-                
-                if not mcq_id or student_answer is None:
+                try:
+                    question_id = int(answer_data.get('id'))
+                except (TypeError, ValueError):
                     continue
-                    
                 try:
-                    # Get the original MCQ instance (template)
-                    original_mcq = MCQ_Answers.objects.get(id=mcq_id, exam_id=exam_id)
-                    
-                    # Check if this specific student has already answered this question
-                    existing_answer = MCQ_Answers.objects.filter(
-                        exam_id=exam_id, 
-                        student=student, 
-                        question=original_mcq.question
-                    ).first()
-                    
-                    if existing_answer:
-                        # Update existing answer for this student
-                        mcq = existing_answer
-                        mcq.student_answer = student_answer
-                        mcq.result = (mcq.student_answer == original_mcq.correct_option)
-                        mcq.save()
-                    else:
-                        # For a new student attempt, always create new records
-                        mcq = MCQ_Answers.objects.create(
-                            exam=original_mcq.exam,
-                            student=student,
-                            question=original_mcq.question,
-                            option_1=original_mcq.option_1,
-                            option_2=original_mcq.option_2,
-                            option_3=original_mcq.option_3,
-                            option_4=original_mcq.option_4,
-                            correct_option=original_mcq.correct_option,
-                            student_answer=student_answer,
-                            result=(student_answer == original_mcq.correct_option)
-                        )                    
-                    print(f"[DEBUG] Created/updated MCQ with ID {mcq.id}, student: {mcq.student}")  # pyright: ignore[reportAttributeAccessIssue]
-                    updated_answers.append({
-                        'id': mcq.id,  # pyright: ignore[reportAttributeAccessIssue]
-                        'question': mcq.question[:50],
-                        'student_email': student_email,
-                        'student_answer': mcq.student_answer,
-                        'result': mcq.result
-                    })
-                    
-                except MCQ_Answers.DoesNotExist:
+                    student_answer = _parse_mcq_answer_global(answer_data.get('student_answer'))
+                except ValueError:
+                    return Response(
+                        {'error': f'student_answer for question {question_id} must be one of 1, 2, 3, 4'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                if student_answer is None or question_id not in questions:
                     continue
+                answers[question_id] = student_answer
+            
+            to_create, to_update, answered = [], [], []
+            correct_delta = answered_delta = 0
+            for question_id, student_answer in answers.items():
+                question = questions[question_id]
+                response = existing_responses.get(question_id)
+                if response is None:
+                    response = QuestionResponse(exam_id=question.exam_id, student=student, question=question)
+                    to_create.append(response)
+                else:
+                    response.question = question
+                    to_update.append(response)
+                # Track how this write moves the student's running score
+                correct_delta -= int(response.result)
+                answered_delta -= int(response.answer is not None)
+                response.answer = student_answer
+                response.result = (student_answer == question.correct_option)
+                correct_delta += int(response.result)
+                answered_delta += 1
+                answered.append(response)
             
-            # Send results to grades table after all answers are processed
-            if updated_answers:
-                # Get the first MCQ to use for grade submission (the student-specific one)
-                first_mcq = MCQ_Answers.objects.get(id=updated_answers[0]['id'])
-                viewset = MCQAnswersViewSet()
-                viewset._send_results_to_grades(first_mcq)
+            # Answers, the running result and the grade commit together
+            with transaction.atomic():
+                if to_create:
+                    QuestionResponse.objects.bulk_create(to_create)
+                if to_update:
+                    QuestionResponse.objects.bulk_update(to_update, ['answer', 'result'])
+                if answered:
+                    apply_exam_result_delta(exam_id, student.pk, correct_delta, answered_delta, len(questions))
+                    record_exam_grade(next(iter(questions.values())).exam, student)
+            
+            updated_answers = [{
+                'id': response.id,  # pyright: ignore[reportAttributeAccessIssue]
+                'question': response.question.question[:50],
+                'student_email': student_email,
+                'student_answer': response.answer,
+                'result': response.result
+            } for response in answered]
             
             return Response({
                 'message': f'Successfully updated {len(updated_answers)} answers',
@@ -4991,7 +4676,7 @@ def submit_multiple_mcq_answers(request) -> Response:
     elif request.method == 'DELETE':
         try:
             # Count how many records will be deleted
-            count = MCQ_Answers.objects.filter(exam_id=exam_id).count()
+            count = _mcq_rows(exam_id=exam_id).count()
             
             if count == 0:
                 return Response(
@@ -4999,8 +4684,11 @@ def submit_multiple_mcq_answers(request) -> Response:
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            # Delete all MCQ answers for this exam
-            MCQ_Answers.objects.filter(exam_id=exam_id).delete()
+            # Delete all questions of this exam (their responses cascade)
+            with transaction.atomic():
+                QuestionResponse.objects.filter(exam_id=exam_id).delete()
+                Question.objects.filter(exam_id=exam_id).delete()
+                ExamResult.objects.filter(exam_id=exam_id).delete()
             
             return Response({
                 'message': f'Successfully deleted {count} MCQ answers for exam {exam_id}'
@@ -5038,12 +4726,15 @@ def submit_mcq_answers(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_mcq_answers(request, pk):
-    try:
-        mcq_answer = MCQ_Answers.objects.get(pk=pk)
-        serializer = MCQAnswersSerializer(mcq_answer)
-        return Response(serializer.data)
-    except MCQ_Answers.DoesNotExist:
-        return Response({'detail': 'MCQ answer not found'}, status=status.HTTP_404_NOT_FOUND)
+    # Questions and responses never share an id (responses are numbered
+    # from a separate range), so at most one of the lookups matches
+    question = Question.objects.select_related('exam').filter(pk=pk).first()
+    if question is not None:
+        return Response(QuestionSerializer(question).data)
+    response = QuestionResponse.objects.select_related('exam', 'question').filter(pk=pk).first()
+    if response is not None:
+        return Response(QuestionResponseSerializer(response).data)
+    return Response({'detail': 'MCQ answer not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
 # Custom view for fetching all MCQ answers
@@ -5053,11 +4744,11 @@ def get_all_mcq_answers(request):
     """
     Fetch all MCQ answers from the database with conditional pagination.
     If pagination parameters (page, page_size) are provided, apply pagination;
-    otherwise, return all records.
+    otherwise, return all records. Questions are listed first, then responses.
     """
     try:
-        # Get all MCQ answers
-        mcq_answers = MCQ_Answers.objects.all().order_by('id')
+        # All questions and responses, read lazily
+        mcq_answers = _mcq_rows()
         
         # Check if pagination parameters are provided
         page = request.query_params.get('page', None)
@@ -5070,15 +4761,13 @@ def get_all_mcq_answers(request):
             paginator = CustomPageNumberPagination()
             paginator.page_size = int(page_size)
             paginated_mcq_answers = paginator.paginate_queryset(mcq_answers, request)
-            serializer = MCQAnswersSerializer(paginated_mcq_answers, many=True)
             return paginator.get_paginated_response({
-                'mcq_answers': serializer.data
+                'mcq_answers': serialize_mcq_rows(paginated_mcq_answers)
             })
         else:
             # Return all records without pagination
-            serializer = MCQAnswersSerializer(mcq_answers, many=True)
             return Response({
-                'mcq_answers': serializer.data
+                'mcq_answers': serialize_mcq_rows(mcq_answers)
             }, status=status.HTTP_200_OK)
             
     except Exception as e:
@@ -186,8 +186,26 @@ MINIO_STORAGE = {
     "SECRET_KEY": config('MINIO_SECRET_KEY'),
     "BUCKET_NAME": config('MINIO_BUCKET_NAME'),
     "USE_SSL": config('MINIO_USE_SSL', default=False, cast=bool),
+    "REGION": config('MINIO_REGION', default=''),
+    # Shared client connection pool and transport retries (school/storage.py)
+    "POOL_MAXSIZE": config('MINIO_POOL_MAXSIZE', default=32, cast=int),
+    "CONNECT_TIMEOUT": config('MINIO_CONNECT_TIMEOUT', default=5, cast=float),
+    "READ_TIMEOUT": config('MINIO_READ_TIMEOUT', default=120, cast=float),
+    "RETRIES": config('MINIO_RETRIES', default=3, cast=int),
+    "RETRY_BACKOFF": config('MINIO_RETRY_BACKOFF', default=0.2, cast=float),
 }
 BASE_BUCKET_URL = config('BASE_BUCKET_URL', default="https://minio.globaltechsoftwaresolutions.cloud/school-media/")
+# 'minio' in production; 'local' (files under MEDIA_STORAGE_LOCAL_ROOT) or
+# 'memory' to run uploads without a MinIO server
+MEDIA_STORAGE_BACKEND = config('MEDIA_STORAGE_BACKEND', default='minio')
+MEDIA_STORAGE_LOCAL_ROOT = config('MEDIA_STORAGE_LOCAL_ROOT', default=str(BASE_DIR / 'media_storage'))
+# Direct-to-storage uploads: lifetime of presigned PUT URLs (seconds) and
+# largest object accepted when an upload is confirmed
+MEDIA_PRESIGNED_UPLOAD_EXPIRY = config('MEDIA_PRESIGNED_UPLOAD_EXPIRY', default=900, cast=int)
+MEDIA_UPLOAD_MAX_BYTES = config('MEDIA_UPLOAD_MAX_BYTES', default=50 * 1024 * 1024, cast=int)
+# Queue replaced/deleted media objects on a background thread instead of
+# deleting them before the response is sent
+MEDIA_BACKGROUND_DELETES = config('MEDIA_BACKGROUND_DELETES', default=False, cast=bool)
 
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/chat/'
@@ -200,6 +218,30 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')
+# Email outbox (school/outbox.py, drain_outbox command): delivery rate,
+# attempts before a message is marked Failed, retry backoff, claim lease and
+# how long delivered or failed messages are kept
+OUTBOX_RATE_PER_SECOND = config('OUTBOX_RATE_PER_SECOND', default=5, cast=float)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+OUTBOX_RETRY_BASE_SECONDS = config('OUTBOX_RETRY_BASE_SECONDS', default=30, cast=int)
+OUTBOX_RETRY_MAX_SECONDS = config('OUTBOX_RETRY_MAX_SECONDS', default=3600, cast=int)
+OUTBOX_LEASE_SECONDS = config('OUTBOX_LEASE_SECONDS', default=300, cast=int)
+OUTBOX_RETENTION_DAYS = config('OUTBOX_RETENTION_DAYS', default=30, cast=int)
+
+# Academic calendar: month (1-12) in which a new academic year / term starts
+ACADEMIC_YEAR_START_MONTH = config('ACADEMIC_YEAR_START_MONTH', default=6, cast=int)
+# Class rankings (school/rankings.py): grade changes are queued and re-ranked
+# by the refresh_rankings worker; True re-ranks in the request instead,
+# right after its transaction commits (development, no worker running)
+RANKING_REFRESH_INLINE = config('RANKING_REFRESH_INLINE', default=False, cast=bool)
+
+# Profile photo cache (school/photo_cache.py): shared on-disk directory and
+# per-process memory tier, both size-bounded; entries younger than
+# PHOTO_CACHE_MAX_AGE seconds are served without revalidation
+PHOTO_CACHE_DIR = config('PHOTO_CACHE_DIR', default=str(BASE_DIR / 'photo_cache'))
+PHOTO_CACHE_MAX_BYTES = config('PHOTO_CACHE_MAX_BYTES', default=512 * 1024 * 1024, cast=int)
+PHOTO_CACHE_MEMORY_BYTES = config('PHOTO_CACHE_MEMORY_BYTES', default=64 * 1024 * 1024, cast=int)
+PHOTO_CACHE_MAX_AGE = config('PHOTO_CACHE_MAX_AGE', default=300, cast=int)
 
 
 